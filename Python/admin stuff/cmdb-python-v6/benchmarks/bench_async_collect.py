@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Async collection engine benchmark: hosts in flight and hosts/sec.
+
+Starts an asyncssh stand-in server in its own process, listening on every
+loopback address (Linux answers all of 127.0.0.0/8, so each "host" gets its
+own 127.x.y.z address), accepting any login and answering each command
+batch after --latency seconds with canned Linux output. The slow reply
+stands in for a remote host running its inventory commands.
+
+Collects --hosts hosts with the Linux collector, first through a thread
+pool of --threads workers (the threaded engine), then through
+AsyncCollector, and reports hosts/sec, the peak number of SSH sessions in
+flight and the process's peak RSS. Rows are checked to be identical.
+
+--collector real runs modules/collect/linux_collect.py as collect_one()
+would; AsyncCollector drives it through the replay session if it declares
+the session contract, else on its blocking pool. --collector standin uses
+the small session-contract collector below. The default (auto) takes the
+real one when it can be imported. Commands that are not batched get an
+empty reply from the stand-in server, so real-collector rows are mostly
+empty; only the timings matter there.
+
+Requires asyncssh (pip install asyncssh).
+
+Usage:
+  python benchmarks/bench_async_collect.py
+  python benchmarks/bench_async_collect.py --hosts 5000 --latency 3 --max-in-flight 2500
+  python benchmarks/bench_async_collect.py --collector real
+"""
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import re
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncssh
+
+from modules.collect.async_collect import AsyncCollector, raise_nofile_limit
+from modules.collect.session import HostSession, uses_session, _MARK
+
+COMMANDS = {
+    'os_release': "cat /etc/os-release",
+    'kernel': "uname -r",
+    'mem': "grep MemTotal /proc/meminfo",
+    'ips': "hostname -I",
+}
+CANNED = {
+    'os_release': 'NAME="Ubuntu"\nVERSION_ID="22.04"',
+    'kernel': "5.15.0-105-generic",
+    'mem': "MemTotal:       32823520 kB",
+}
+
+
+def lin_collect(host, cfg):
+    # Shape of the real collectors: one batch over the shared session, then parsing
+    out = cfg['__session__'].run_sh(COMMANDS)
+    os_name = dict(l.split('=', 1) for l in out.get('os_release', '').splitlines() if '=' in l).get('NAME', '').strip('"')
+    mem = re.search(r"(\d+)", out.get('mem', ''))
+    return {'OS': os_name, 'Version': out.get('kernel', ''), 'IPs': out.get('ips', '').split(),
+            'MemoryMB': int(mem.group(1)) // 1024 if mem else None}
+
+
+lin_collect.uses_session = True
+
+
+def load_collector(choice):
+    """(collect function, label) for --collector."""
+    if choice != 'standin':
+        try:
+            from modules.collect.linux_collect import collect
+            return collect, f"modules.collect.linux_collect ({'session' if uses_session(collect) else 'own connections'})"
+        except ImportError as e:
+            if choice == 'real':
+                sys.exit(f"--collector real: cannot import modules.collect.linux_collect: {e}")
+            print(f"modules.collect.linux_collect not importable ({e}); using the stand-in collector")
+    return lin_collect, "stand-in (session contract)"
+
+
+# --- stand-in SSH server ---------------------------------------------------
+
+class _NoAuth(asyncssh.SSHServer):
+    def begin_auth(self, username):
+        return False
+
+
+def _server_main(port_out, ready, latency):
+    raise_nofile_limit(65536)
+
+    async def handle(process):
+        names = re.findall(re.escape(_MARK) + r"(\w+)", process.command or '')
+        await asyncio.sleep(latency)
+        ip = process.get_extra_info('sockname')[0]
+        canned = dict(CANNED, ips=ip)
+        process.stdout.write("".join(f"{_MARK}{n}\n{canned.get(n, '')}\n" for n in names))
+        process.exit(0)
+
+    async def serve():
+        key = asyncssh.generate_private_key('ssh-ed25519')
+        server = await asyncssh.create_server(_NoAuth, '0.0.0.0', 0, server_host_keys=[key],
+                                              process_factory=handle, backlog=4096)
+        port_out.value = server.sockets[0].getsockname()[1]
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_server(latency):
+    ctx = mp.get_context('spawn')
+    port, ready = ctx.Value('i', 0), ctx.Event()
+    p = ctx.Process(target=_server_main, args=(port, ready, latency), daemon=True)
+    p.start()
+    ready.wait(60)
+    return p, port.value
+
+
+def _addr(i):
+    return f"127.{1 + i // 65025}.{(i // 255) % 255}.{1 + i % 255}"
+
+
+# --- engines ---------------------------------------------------------------
+
+def run_threads(collect, hosts, port, threads):
+    lcfg = {'port': port, 'username': 'bench', 'password': 'bench', 'timeout': 60}
+    peak = [0, 0]
+
+    def one(h):
+        peak[0] += 1; peak[1] = max(peak[1], peak[0])
+        # As collect_one(): a shared session only for collectors that use it
+        s = HostSession(h, None, lcfg) if uses_session(collect) else None
+        try:
+            return collect(h, dict(lcfg, __session__=s))
+        finally:
+            peak[0] -= 1
+            if s:
+                s.close()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        rows = list(ex.map(one, hosts))
+    return rows, time.perf_counter() - t0, peak[1]
+
+
+def run_async(collect, hosts, port, max_in_flight):
+    engine = AsyncCollector({'max_in_flight': max_in_flight}, {'linux': collect, 'windows': collect})
+    lcfg = {'port': port, 'username': 'bench', 'password': 'bench', 'timeout': 60}
+
+    async def main():
+        engine.open()
+        sem = asyncio.Semaphore(max_in_flight)
+
+        async def one(h):
+            async with sem:
+                data, _ = await engine.collect(h, h, 'linux', {}, dict(lcfg), {}, {})
+                return data
+        return await asyncio.gather(*(one(h) for h in hosts))
+
+    t0 = time.perf_counter()
+    try:
+        rows = asyncio.run(main())
+    finally:
+        engine.close()
+    return rows, time.perf_counter() - t0, engine.summary()['peak_limits']['ssh']
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    ap.add_argument("--hosts", type=int, default=2000)
+    ap.add_argument("--latency", type=float, default=2.0, help="Seconds each stand-in host takes to answer")
+    ap.add_argument("--threads", type=int, default=200, help="Thread pool size for the threaded engine")
+    ap.add_argument("--max-in-flight", type=int, default=2000)
+    ap.add_argument("--skip-threads", action="store_true")
+    ap.add_argument("--collector", choices=["auto", "real", "standin"], default="auto")
+    args = ap.parse_args()
+
+    collect, label = load_collector(args.collector)
+
+    raise_nofile_limit(args.max_in_flight * 2 + 256)
+    proc, port = start_server(args.latency)
+    hosts = [_addr(i) for i in range(args.hosts)]
+    print(f"hosts={args.hosts} latency={args.latency}s cores={os.cpu_count()} collector={label}")
+    try:
+        base = None
+        if not args.skip_threads:
+            base, elapsed, peak = run_threads(collect, hosts, port, args.threads)
+            print(f"{'threads':<8} {len(base) / elapsed:8.1f} hosts/s  ({elapsed:.2f}s, peak in flight {peak}, "
+                  f"errors {sum(1 for r in base if r.get('error'))})")
+        rows, elapsed, peak = run_async(collect, hosts, port, args.max_in_flight)
+        print(f"{'async':<8} {len(rows) / elapsed:8.1f} hosts/s  ({elapsed:.2f}s, peak in flight {peak}, "
+              f"errors {sum(1 for r in rows if r.get('error'))})")
+        if base is not None:
+            print("rows identical:", base == rows)
+        print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MB")
+    finally:
+        proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
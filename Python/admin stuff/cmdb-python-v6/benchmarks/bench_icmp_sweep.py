@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Loopback sweep benchmark: ICMP socket engine vs. per-IP ping subprocesses.
+
+Linux answers echo requests for all of 127.0.0.0/8, so a loopback range gives
+a reproducible "every host is up" sweep without touching the network.
+
+Usage:
+  python benchmarks/bench_icmp_sweep.py --cidr 127.0.0.0/22
+  python benchmarks/bench_icmp_sweep.py --cidr 127.0.0.0/20 --skip-ping
+"""
+
+import argparse
+import ipaddress
+import os
+import sys
+import time
+import concurrent.futures
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.discovery.icmp_sweep import sweep
+from modules.discovery.subnet_scan import _ping
+
+
+def run_icmp(ips, timeout_ms, rate_pps, batch_size):
+    return sweep(ips, timeout_ms, rate_pps, batch_size)
+
+
+def run_ping(ips, timeout_ms, threads):
+    alive = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as ex:
+        futs = {ex.submit(_ping, ip, timeout_ms): ip for ip in ips}
+        for fut in concurrent.futures.as_completed(futs):
+            if fut.result():
+                alive.append(futs[fut])
+    return alive
+
+
+def report(name, ips, fn):
+    t0 = time.perf_counter()
+    try:
+        alive = fn()
+    except OSError as e:
+        print(f"{name:>10}: unavailable ({e})")
+        return
+    dt = time.perf_counter() - t0
+    print(f"{name:>10}: {len(alive)}/{len(ips)} up in {dt:.2f}s  ->  {len(ips) / dt:,.0f} hosts/sec")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark subnet sweep engines on loopback")
+    ap.add_argument("--cidr", default="127.0.0.0/22", help="Loopback range to sweep")
+    ap.add_argument("--timeout-ms", type=int, default=500)
+    ap.add_argument("--rate-pps", type=int, default=20000)
+    ap.add_argument("--batch-size", type=int, default=256)
+    ap.add_argument("--threads", type=int, default=200, help="Thread pool size for the ping path")
+    ap.add_argument("--skip-ping", action="store_true", help="Only run the ICMP socket engine")
+    args = ap.parse_args()
+
+    ips = [str(ip) for ip in ipaddress.ip_network(args.cidr, strict=False).hosts()]
+    report("icmp", ips, lambda: run_icmp(ips, args.timeout_ms, args.rate_pps, args.batch_size))
+    if not args.skip_ping:
+        report("ping", ips, lambda: run_ping(ips, args.timeout_ms, args.threads))
+
+
+if __name__ == "__main__":
+    main()
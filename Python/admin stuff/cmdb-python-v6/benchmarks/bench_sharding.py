@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Process-sharded collection benchmark against local SSH stand-ins.
+
+Starts paramiko SSH servers on 127.0.0.1 (in their own processes, accepting
+any credentials and answering every command batch with canned Linux
+output), then collects N "hosts" through HostSession.run_sh(): a full key
+exchange, password auth, one exec channel and the section parsing per host,
+plus the compiled transforms. This is the CPU-heavy part of a real SSH
+collection, so it shows where a single process stops scaling.
+
+Runs an in-process thread pool (the default collect_hosts() model) and then
+ShardPool with 1..--max-processes processes of --threads threads each, and
+prints hosts/sec for each. Scaling needs spare cores: on a machine with C
+cores expect gains up to roughly C minus the cores the stand-in servers use.
+
+Usage:
+  python benchmarks/bench_sharding.py
+  python benchmarks/bench_sharding.py --hosts 2000 --threads 32 --max-processes 8 --servers 4
+"""
+
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import re
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import paramiko
+
+from modules.collect.session import HostSession, _MARK
+from modules.sharding import ShardPool
+from modules.transforms import compile_transforms
+
+COMMANDS = {
+    'os_release': "cat /etc/os-release",
+    'kernel': "uname -r",
+    'cpu': "nproc",
+    'mem': "grep MemTotal /proc/meminfo",
+    'disks': "df -P -k",
+    'ips': "hostname -I",
+}
+CANNED = {
+    'os_release': 'NAME="Ubuntu"\nVERSION_ID="22.04"\nPRETTY_NAME="Ubuntu 22.04.4 LTS"\n' + "X_PAD=" + "x" * 400,
+    'kernel': "5.15.0-105-generic",
+    'cpu': "8",
+    'mem': "MemTotal:       32823520 kB",
+    'disks': "\n".join(f"/dev/sd{c}1 {i * 1048576} {i * 524288} {i * 524288} 50% /data{i}" for i, c in enumerate("abcdefgh", 1)),
+    'ips': "10.1.0.12 10.2.0.12",
+}
+TRANSFORMS = {'active_directory': {'attribute_map': {'kernel': 'kernel_version', 'cpu': 'cpu_count'}}}
+
+
+# --- stand-in SSH server ---------------------------------------------------
+
+class _AnyAuth(paramiko.ServerInterface):
+    def __init__(self):
+        self.command = None
+        self.event = threading.Event()
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == 'session' else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_auth_publickey(self, username, key):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_exec_request(self, channel, command):
+        self.command = command.decode('utf-8', 'replace')
+        self.event.set()
+        return True
+
+
+def _serve_conn(conn, host_key):
+    t = paramiko.Transport(conn)
+    t.add_server_key(host_key)
+    server = _AnyAuth()
+    try:
+        t.start_server(server=server)
+        chan = t.accept(20)
+        if chan is None or not server.event.wait(20):
+            return
+        names = re.findall(re.escape(_MARK) + r"(\w+)", server.command or '')
+        chan.sendall("".join(f"{_MARK}{n}\n{CANNED.get(n, '')}\n" for n in names).encode())
+        chan.send_exit_status(0)
+        chan.close()
+        # Wait for the client to hang up so its close is clean
+        deadline = time.monotonic() + 10
+        while t.is_active() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    except Exception:
+        pass
+    finally:
+        t.close()
+
+
+def _server_main(port_out, ready):
+    # Clients hanging up right after exit-status is normal here
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+    host_key = paramiko.RSAKey.generate(2048)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(512)
+    port_out.value = sock.getsockname()[1]
+    ready.set()
+    while True:
+        conn, _ = sock.accept()
+        threading.Thread(target=_serve_conn, args=(conn, host_key), daemon=True).start()
+
+
+def start_servers(n):
+    ctx = mp.get_context('spawn')
+    procs, ports = [], []
+    for _ in range(n):
+        port, ready = ctx.Value('i', 0), ctx.Event()
+        p = ctx.Process(target=_server_main, args=(port, ready), daemon=True)
+        p.start()
+        ready.wait(60)
+        procs.append(p); ports.append(port.value)
+    return procs, ports
+
+
+# --- collection work -------------------------------------------------------
+
+def _init():
+    return compile_transforms(TRANSFORMS)
+
+
+def collect(plan, target):
+    lcfg = {'port': target['port'], 'username': 'bench', 'password': 'bench', 'timeout': 30}
+    with HostSession('127.0.0.1', None, lcfg) as s:
+        out = s.run_sh(COMMANDS)
+    row = dict(target, provider='active_directory', **out)
+    return plan.apply(row)
+
+
+def run_threads(targets, threads):
+    plan = _init()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        rows = list(ex.map(lambda t: collect(plan, t), targets))
+    return rows, time.perf_counter() - t0
+
+
+def run_sharded(targets, processes, threads):
+    pool = ShardPool(processes, threads, collect, init=_init).start()
+    # Let the shards finish importing before the clock starts
+    time.sleep(1.0)
+    t0 = time.perf_counter()
+    for t in targets:
+        pool.submit(t)
+    pool.close_input()
+    rows, failed = [], 0
+    while not pool.done:
+        for _, _, _, ok, value in pool.results(timeout=0.2):
+            if ok: rows.append(value)
+            else: failed += 1
+    elapsed = time.perf_counter() - t0
+    pool.join()
+    if failed:
+        print(f"  {failed} hosts failed", file=sys.stderr)
+    return rows, elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    ap.add_argument("--hosts", type=int, default=600)
+    ap.add_argument("--threads", type=int, default=16, help="Threads per process")
+    ap.add_argument("--max-processes", type=int, default=max(1, min(8, (os.cpu_count() or 2) // 2)))
+    ap.add_argument("--servers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Stand-in SSH server processes")
+    args = ap.parse_args()
+
+    print(f"cores={os.cpu_count()} hosts={args.hosts} threads/process={args.threads} servers={args.servers}")
+    procs, ports = start_servers(args.servers)
+    targets = [{'host': f"bench{i:05d}", 'port': ports[i % len(ports)]} for i in range(args.hosts)]
+    try:
+        rows, elapsed = run_threads(targets, args.threads)
+        assert len(rows) == len(targets) and rows[0].get('kernel_version') == CANNED['kernel']
+        base = len(rows) / elapsed
+        print(f"{'in-process threads':<22} {base:8.1f} hosts/s  ({elapsed:.2f}s)")
+        for p in range(1, args.max_processes + 1):
+            rows, elapsed = run_sharded(targets, p, args.threads)
+            rate = len(rows) / elapsed
+            print(f"{f'{p} process(es)':<22} {rate:8.1f} hosts/s  ({elapsed:.2f}s, x{rate / base:.2f})")
+    finally:
+        for p in procs:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Transform engine microbenchmark on a synthetic inventory.
+
+Compares the per-row legacy implementation (config re-read, tags re-parsed
+and three try/except blocks per row) with the compiled TransformPlan: row
+by row, in one apply_many() batch and on four threads. Outputs and rule
+counters are checked to be identical.
+
+Usage:
+  python benchmarks/bench_transforms.py
+  python benchmarks/bench_transforms.py --rows 500000 --tags 30
+"""
+
+import argparse
+import copy
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.transforms import compile_transforms
+
+TRANSFORMS = {
+    'azure': {'tag_map': {'env': 'environment', 'owner': 'owner', 'app': 'application', 'cc': 'cost_center'}},
+    'vsphere': {'tag_map': {'env': 'environment', 'role': 'role'}},
+    'active_directory': {'attribute_map': {'description': 'description', 'managedBy': 'owner', 'location': 'site'}},
+}
+
+
+def legacy_apply(row, transforms):
+    # The pre-compilation implementation, kept here as the baseline
+    try:
+        if row.get('provider') == 'azure' and transforms.get('azure'):
+            tag_map = transforms['azure'].get('tag_map', {})
+            kv = {}
+            for t in row.get('tags') or []:
+                if isinstance(t, str) and '=' in t:
+                    k, v = t.split('=', 1); kv[k] = v
+            for src_key, dst in tag_map.items():
+                if src_key in kv:
+                    row[dst] = kv[src_key]
+    except Exception:
+        pass
+    try:
+        if row.get('provider') == 'vsphere' and transforms.get('vsphere'):
+            tag_map = transforms['vsphere'].get('tag_map', {})
+            kv = {}
+            for t in row.get('tags') or []:
+                if isinstance(t, str) and '=' in t:
+                    k, v = t.split('=', 1); kv[k] = v
+            for src_key, dst in tag_map.items():
+                if src_key in kv:
+                    row[dst] = kv[src_key]
+    except Exception:
+        pass
+    try:
+        if row.get('provider') in ('onprem', 'active_directory') and transforms.get('active_directory'):
+            for src_attr, dst in transforms['active_directory'].get('attribute_map', {}).items():
+                val = row.get(src_attr) or row.get(src_attr.lower()) or None
+                if val:
+                    row[dst] = val
+    except Exception:
+        pass
+    return row
+
+
+def synth_rows(n, ntags, seed=1):
+    rnd = random.Random(seed)
+    providers = ['azure', 'vsphere', 'active_directory', 'onprem', 'local-network']
+    keys = ['env', 'owner', 'app', 'cc', 'role'] + [f"k{i}" for i in range(ntags)]
+    rows = []
+    for i in range(n):
+        p = rnd.choice(providers)
+        row = {'host': f"host{i:06d}.example.local", 'provider': p, 'IPs': [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}"]}
+        if p in ('azure', 'vsphere'):
+            row['tags'] = [f"{k}=v{rnd.randint(0, 9)}" for k in rnd.sample(keys, min(len(keys), ntags))]
+        elif p in ('active_directory', 'onprem'):
+            row['description'] = f"server {i}"
+            if rnd.random() < 0.5: row['managedby'] = f"team{rnd.randint(0, 20)}"
+        rows.append(row)
+    return rows
+
+
+def timed(name, n, fn):
+    t0 = time.perf_counter()
+    out = fn()
+    dt = time.perf_counter() - t0
+    print(f"{name:<24} {dt:8.3f} s  {n / dt:12,.0f} rows/s")
+    return out, dt
+
+
+def on_threads(plan, rows, n):
+    # One slice per thread, the way collection threads call apply()
+    parts = [rows[i::n] for i in range(n)]
+    threads = [threading.Thread(target=lambda part=part: [plan.apply(r) for r in part]) for part in parts]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--rows', type=int, default=100000)
+    ap.add_argument('--tags', type=int, default=12, help='Tags per Azure/vSphere row')
+    args = ap.parse_args()
+
+    rows = synth_rows(args.rows, args.tags)
+    print(f"{args.rows} rows, {args.tags} tags per tagged row\n")
+
+    a = copy.deepcopy(rows)
+    legacy, t_legacy = timed("legacy per-row", len(a), lambda: [legacy_apply(r, TRANSFORMS) for r in a])
+
+    plan = compile_transforms(TRANSFORMS)
+    b = copy.deepcopy(rows)
+    compiled, t_plan = timed("compiled apply()", len(b), lambda: [plan.apply(r) for r in b])
+
+    batch_plan = compile_transforms(TRANSFORMS)
+    c = copy.deepcopy(rows)
+    batched, t_batch = timed("compiled apply_many()", len(c), lambda: batch_plan.apply_many(c))
+
+    threaded_plan = compile_transforms(TRANSFORMS)
+    d = copy.deepcopy(rows)
+    threaded, t_threads = timed("compiled apply() x4", len(d), lambda: on_threads(threaded_plan, d, 4))
+
+    assert legacy == compiled == batched == threaded, "compiled plan output differs from legacy"
+    stats = threaded_plan.stats()
+    assert stats == plan.stats() == batch_plan.stats(), "batch or per-thread counters differ from the single-thread run"
+    print(f"\nspeedup: apply() {t_legacy / t_plan:.2f}x, apply_many() {t_legacy / t_batch:.2f}x, "
+          f"apply() on 4 threads {t_legacy / t_threads:.2f}x")
+    print(f"rules fired ({sum(stats['fired'].values())} total):")
+    for name, count in stats['fired'].items():
+        print(f"  {count:8d}  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,30 @@
-import argparse, os, json, csv, time, math
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse, asyncio, copy, os, sys, json, csv, time, math, threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
 from contextlib import nullcontext
 
 from modules.config import load_config
 from modules.discovery.azure_discovery import discover as azure_discover
 from modules.discovery.ad_discovery import discover as ad_discover
 from modules.discovery.ad_enricher import enrich as ad_enrich
+from modules.discovery.ad_index import AdPrefetch
 from modules.discovery.vsphere_discovery import discover as vs_discover
 from modules.discovery.subnet_scan import discover as subnet_discover
 from modules.collect.windows_collect import collect as win_collect
 from modules.collect.linux_collect import collect as lin_collect
-from modules.export.csv_export import export_csv
-from modules.export.html_export import export_html
-from modules.export.servicenow_export import export_servicenow
-from modules.export.sqlite_export import export_sqlite
-from modules.transforms import apply_transforms
-from modules.dns_enrich import reverse_lookup
+from modules.collect.session import HostSession, OsCache, probe_ports, precheck_ports, classify_by_ports, uses_session
+from modules.collect.async_collect import AsyncCollector
+from modules.export.stream_export import StreamExporter
+from modules.transforms import compile_transforms
+from modules import incremental
+from modules.checkpoint import Journal
+from modules.concurrency import ConcurrencyController, _is_timeout
+from modules.sharding import ShardPool
+from modules.distributed import Coordinator, run_worker, merge_secrets
+from modules.timing import timings, StackSampler
+from modules.pipeline import TargetQueue
+from modules.identity import IdentityResolver, apply_late
+from modules.dns_enrich import reverse_lookup, bulk_reverse_lookup, cache_stats as dns_cache_stats
 
 try:
     from rich.progress import Progress, TimeElapsedColumn, TimeRemainingColumn, BarColumn, SpinnerColumn, TextColumn
@@ -39,11 +48,9 @@ def load_targets_csv(path):
             targets.append({'host': r.get('host'), 'os_hint': r.get('os_hint'), 'source': r.get('source') or 'manual', 'provider': r.get('provider') or 'manual'})
     return targets
 
-def do_discovery(cfg, extra_targets, console=None):
+def _discovery_steps(cfg, extra_targets):
     disc = cfg.get('discovery', {})
     feats = cfg.get('features', {}).get('discovery', {})
-    all_targets = []
-
     steps = []
     if feats.get('ad', True) and disc.get('active_directory', {}).get('enabled', True):
         steps.append(('Active Directory', lambda: ad_discover(disc.get('active_directory', {}))))
@@ -57,116 +64,194 @@ def do_discovery(cfg, extra_targets, console=None):
         steps.append(('Static targets', lambda: (cfg.get('static_targets') or [])))
     if feats.get('csv_targets', True):
         steps.append(('CSV targets', lambda: (extra_targets or [])))
+    return steps
+
+def start_discovery(cfg, extra_targets, console=None, prepare=None, select=None):
+    """Run every discovery provider in parallel and return a TargetQueue that
+    collection can consume while slower providers are still running (or,
+    with `select`, once discovery has finished; see TargetQueue)."""
+    steps = _discovery_steps(cfg, extra_targets)
+    queue = TargetQueue(producers=len(steps), prepare=prepare, resolver=IdentityResolver(cfg.get('identity') or {}),
+                        select=select)
 
+    def run_step(name, fn):
+        try:
+            with timings.phase(f"discovery.{name}"):
+                res = fn() or []
+            added = queue.put_many(res)
+            if console:
+                console.print(f"  [cyan]{name}[/]: {len(res)} targets ({added} new)")
+        except Exception as e:
+            queue.failed.append(name)
+            msg = f"Discovery failed for {name}: {e}"
+            if console:
+                console.print(f"[red]{msg}[/]")
+            else:
+                print(msg, file=sys.stderr)
+        finally:
+            queue.producer_done()
+
+    def coordinator():
+        with timings.phase("discovery"):
+            with ThreadPoolExecutor(max_workers=max(1, len(steps)), thread_name_prefix="discovery") as ex:
+                for name, fn in steps:
+                    ex.submit(run_step, name, fn)
+        if console:
+            ids = queue.resolver.stats()
+            console.print(f"Discovered [bold]{queue.total}[/] unique targets ({queue.duplicates} duplicates dropped, "
+                          f"{ids['merged']} merged across providers).")
+
+    threading.Thread(target=coordinator, name="discovery", daemon=True).start()
+    return queue
+
+def do_discovery(cfg, extra_targets, console=None):
+    """Blocking discovery: every provider (in parallel), merged per machine, as a list."""
+    return list(start_discovery(cfg, extra_targets, console=console))
+
+def _target_ips(t):
+    ips = t.get('ips') or []
+    if isinstance(ips, str) and ips:
+        ips = [ips]
+    return ips[:2]
+
+def resolve_names(cfg, targets, console=None):
+    """Bulk reverse-DNS stage: resolve every target IP at once and attach
+    resolved_name before collection starts."""
+    ips = [ip for t in targets if not t.get('resolved_name') for ip in _target_ips(t)]
+    if not ips:
+        return
     if RICH_AVAILABLE and console:
-        with Progress(SpinnerColumn(), TextColumn("{task.description}"), BarColumn(), TimeElapsedColumn(), transient=True, console=console) as progress:
-            for name, fn in steps:
-                task = progress.add_task(f"[cyan]Discovering: {name}...", total=None)
-                try:
-                    res = fn() or []
-                    all_targets += res
-                finally:
-                    progress.update(task, completed=1)
+        with Progress(SpinnerColumn(), TextColumn("{task.description}"), TimeElapsedColumn(), transient=True, console=console) as progress:
+            progress.add_task(f"[cyan]Resolving {len(set(ips))} PTR records...", total=None)
+            names = bulk_reverse_lookup(ips, cfg.get('dns', {}))
     else:
-        for _, fn in steps:
-            all_targets += fn() or []
-
-    # Deduplicate
-    seen = set(); uniq = []
-    for t in all_targets:
-        h = t.get('host')
-        if not h: continue
-        key = h.lower()
-        if key in seen: continue
-        seen.add(key); uniq.append(t)
-    return uniq
-
-def collect_one(cfg, t, software_enabled, sw_filters, ad_cfg, dry_run, transforms, dns_cfg, feats):
+        names = bulk_reverse_lookup(ips, cfg.get('dns', {}))
+    for t in targets:
+        if t.get('resolved_name'):
+            continue
+        for ip in _target_ips(t):
+            if names.get(ip):
+                t['resolved_name'] = names[ip]
+                break
+
+_ad_warned = set()
+
+def _ad_enrich(ad_cfg, row, ad_index):
+    """OU for a non-AD host from the prefetched index (by host, then resolved
+    name); per-host LDAP lookup only when no index could be built."""
+    host = row.get('host')
+    try:
+        enr = ad_index.enrich(host, row.get('resolved_name') or '') if ad_index is not None else None
+        if enr is None:
+            with timings.step(host, 'ad_enrich'):
+                enr = ad_enrich(ad_cfg, host)
+        row.update(enr or {})
+    except Exception as e:
+        if type(e).__name__ not in _ad_warned:
+            _ad_warned.add(type(e).__name__)
+            print(f"AD enrichment failed for {host}: {e!r}", file=sys.stderr)
+
+def _collector_cfgs(cfg, software_enabled, sw_filters):
+    """(windows cfg, linux cfg, session cfg) handed to the collectors."""
+    wcfg = (cfg.get('collect') or {}).get('windows', {}).copy()
+    lcfg = (cfg.get('collect') or {}).get('linux', {}).copy()
+    wcfg['__software_enabled__'] = software_enabled
+    lcfg['__software_enabled__'] = software_enabled
+    wcfg['__software_filters__'] = sw_filters
+    lcfg['__software_filters__'] = sw_filters
+    return wcfg, lcfg, (cfg.get('collect') or {}).get('session') or {}
+
+def _known_os(t, os_cache):
+    """'windows' / 'linux' from the discovery hint or the OS cache, else None."""
     host = t.get('host'); hint = (t.get('os_hint') or '').lower(); provider = t.get('provider')
+    if hint == 'windows' or (provider == 'azure' and 'win' in hint):
+        return 'windows'
+    if hint == 'linux' or provider in ('vsphere','onprem','local-network'):
+        return 'linux'
+    return os_cache.get(host) if os_cache else None
+
+def collect_one(cfg, t, software_enabled, sw_filters, ad_cfg, dry_run, transforms, dns_cfg, feats, os_cache=None, ad_index=None):
+    host = t.get('host')
     row = dict(t)
 
-    if feats.get('dns', True) and (cfg.get('dns') or {}).get('enabled', True):
-        ips = row.get('ips') or []
-        if isinstance(ips, str) and ips:
-            ips = [ips]
+    # Skipped when the bulk stage in main() has already resolved every target
+    dns_bulk = ((cfg.get('dns') or {}).get('bulk') or {}).get('enabled', True)
+    if feats.get('dns', True) and (cfg.get('dns') or {}).get('enabled', True) and not dns_bulk:
         names = []
-        for ip in ips[:2]:
-            name = reverse_lookup(ip, cfg.get('dns', {}))
-            if name: names.append(name)
+        with timings.step(host, 'dns'):
+            for ip in _target_ips(row):
+                name = reverse_lookup(ip, cfg.get('dns', {}))
+                if name: names.append(name)
         if names and not row.get('resolved_name'):
             row['resolved_name'] = names[0]
 
     if dry_run:
-        if feats.get('ad_ou', True) and ad_cfg.get('enabled') and ad_cfg.get('enrich_non_ad'):
-            try:
-                enr = ad_enrich(ad_cfg, host); row.update(enr)
-            except Exception: pass
+        if feats.get('ad_ou', True) and not row.get('ad_ou') and ad_cfg.get('enabled') and ad_cfg.get('enrich_non_ad'):
+            _ad_enrich(ad_cfg, row, ad_index)
         if feats.get('transforms', True):
-            try:
-                row = apply_transforms(row, transforms)
-            except Exception:
-                pass
+            with timings.step(host, 'transforms'):
+                row = transforms.apply(row)
         return row
 
-    wcfg = (cfg.get('collect') or {}).get('windows', {}).copy()
-    lcfg = (cfg.get('collect') or {}).get('linux', {}).copy()
-    wcfg['__software_enabled__'] = software_enabled
-    lcfg['__software_enabled__'] = software_enabled
-    wcfg['__software_filters__'] = sw_filters
-    lcfg['__software_filters__'] = sw_filters
+    wcfg, lcfg, scfg = _collector_cfgs(cfg, software_enabled, sw_filters)
 
-    # Feature toggles for collection
+    # One connection per host for all of its commands, for collectors that read __session__
+    session = None
+    if scfg.get('enabled', True) and (uses_session(win_collect) or uses_session(lin_collect)):
+        session = HostSession(host, wcfg, lcfg)
+    wcfg['__session__'] = session
+    lcfg['__session__'] = session
+
+    os_name = _known_os(t, os_cache)
+
+    # Unknown OS: a port pre-check is far cheaper than a failed WinRM attempt
     data = {}
-    if (feats.get('windows', True) and (hint == 'windows' or (provider == 'azure' and 'win' in hint))):
-        data = win_collect(host, wcfg)
-    elif (feats.get('linux', True) and (hint == 'linux' or provider in ('vsphere','onprem','local-network'))):
-        data = lin_collect(host, lcfg)
-    else:
-        if feats.get('windows', True):
-            data = win_collect(host, wcfg)
-        if (not data or data.get('error')) and feats.get('linux', True):
-            data = lin_collect(host, lcfg)
+    probed = False
+    open_ports = []
+    winrm_ports, ssh_ports = precheck_ports(wcfg, lcfg)
+    if os_name is None and scfg.get('precheck', True):
+        ports = winrm_ports + ssh_ports
+        with timings.step(host, 'precheck'):
+            open_ports = probe_ports((_target_ips(row) or [host])[0], ports, float(scfg.get('precheck_timeout', 1.0)))
+        os_name = classify_by_ports(open_ports, winrm_ports, ssh_ports); probed = True
+        if os_name is None:
+            data = {'error': f"no WinRM/SSH port open ({', '.join(str(p) for p in ports)})"}
+
+    # Feature toggles for collection
+    try:
+        fallback = os_name is None and not probed
+        if os_name == 'windows' or fallback:
+            if feats.get('windows', True):
+                with timings.step(host, 'winrm'):
+                    data = win_collect(host, wcfg)
+                os_name = 'windows'
+                # A probed "Windows" host may be Linux with OMI on the WinRM port
+                fallback = fallback or (probed and bool((data or {}).get('error')) and any(p in open_ports for p in ssh_ports))
+            if fallback and (not data or data.get('error')) and feats.get('linux', True):
+                with timings.step(host, 'ssh'):
+                    data = lin_collect(host, lcfg)
+                os_name = 'linux'
+        elif os_name == 'linux':
+            if feats.get('linux', True):
+                with timings.step(host, 'ssh'):
+                    data = lin_collect(host, lcfg)
+    finally:
+        if session:
+            session.close()
+    if os_cache is not None and os_name and data and not data.get('error'):
+        os_cache.set(host, os_name)
 
     if feats.get('ad_ou', True) and not row.get('ad_ou') and ad_cfg.get('enabled') and ad_cfg.get('enrich_non_ad'):
-        try:
-            enr = ad_enrich(ad_cfg, host); row.update(enr)
-        except Exception: pass
+        _ad_enrich(ad_cfg, row, ad_index)
 
     row.update(data or {})
     if feats.get('transforms', True):
-        try:
-            row = apply_transforms(row, transforms)
-        except Exception:
-            pass
+        with timings.step(host, 'transforms'):
+            row = transforms.apply(row)
     return row
 
-def _autotune_workers(targets_len, fast=False):
-    # Heuristic: more targets -> more workers, cap at 64 (or 48 in fast mode)
-    if targets_len <= 50: base = 16
-    elif targets_len <= 200: base = 24
-    elif targets_len <= 1000: base = 32
-    else: base = 48
-    cap = 48 if fast else 64
-    try:
-        import multiprocessing
-        cpu = multiprocessing.cpu_count()
-    except Exception:
-        cpu = 4
-    base = max(base, cpu * 4)
-    return min(base, cap)
-
-def _apply_field_filters(rows, include, exclude):
-    if not rows: return rows
-    if include:
-        include_set = set(include)
-        rows = [{k:v for k,v in r.items() if k in include_set} for r in rows]
-    if exclude:
-        ex = set(exclude)
-        rows = [{k:v for k,v in r.items() if k not in ex} for r in rows]
-    return rows
-
-def collect_hosts(cfg, targets, workers=8, dry_run=False, console=None, fast=False):
-    rows = []
+def _collect_context(cfg, fast=False):
+    """(software_enabled, software_cfg, ad_cfg, feats) for collect_one()."""
     software_cfg = ((cfg.get('collect') or {}).get('software') or {})
     software_enabled = bool(software_cfg.get('enabled', False))
     if fast:
@@ -174,43 +259,366 @@ def collect_hosts(cfg, targets, workers=8, dry_run=False, console=None, fast=Fal
         # also consider trimming transforms/DNS done via feats below
 
     ad_cfg = (cfg.get('discovery') or {}).get('active_directory', {})
-    transforms = cfg.get('transforms', {})
     feats = cfg.get('features', {}).get('enrichment', {}).copy()
     feats.update(cfg.get('features', {}).get('collection', {}))
 
     if fast:
         feats['dns'] = False
         # transforms still helpful; keep enabled
+    return software_enabled, software_cfg, ad_cfg, feats
 
+def _progress(console):
     if RICH_AVAILABLE and console:
-        total = len(targets)
-        with Progress(
+        return Progress(
             SpinnerColumn(),
-            TextColumn("[green]Collecting hosts"),
+            TextColumn("[green]{task.description}"),
             BarColumn(),
             TextColumn("{task.completed}/{task.total}"),
             TimeElapsedColumn(),
             TimeRemainingColumn(),
             console=console
-        ) as progress:
-            task = progress.add_task("collect", total=total)
-            with ThreadPoolExecutor(max_workers=workers) as ex:
-                futs = [ex.submit(collect_one, cfg, t, software_enabled, software_cfg, ad_cfg, dry_run, transforms, cfg.get('dns', {}), feats) for t in targets]
-                for fut in as_completed(futs):
-                    rows.append(fut.result())
-                    progress.update(task, advance=1)
-    else:
-        with ThreadPoolExecutor(max_workers=workers) as ex:
-            futs = [ex.submit(collect_one, cfg, t, software_enabled, software_cfg, ad_cfg, dry_run, transforms, cfg.get('dns', {}), feats) for t in targets]
-            for fut in as_completed(futs):
-                rows.append(fut.result())
+        )
+    return nullcontext()
+
+def collect_hosts(cfg, targets, workers=8, dry_run=False, console=None, fast=False, sink=None, journal=None, controller=None, transforms=None, ad_index=None):
+    """Collect every target. Rows are returned as a list, or, when `sink` is
+    given, handed to sink(row) as each host finishes and not retained.
+    Completed rows are also appended to `journal` (see --resume).
+
+    Concurrency is governed by `controller` (adaptive per-OS limits); without
+    one a fixed pool of `workers` is used. `transforms` is a compiled
+    TransformPlan (compiled from cfg when omitted). `ad_index` is an
+    AdPrefetch used for OU enrichment instead of one LDAP query per host."""
+    rows = []
+    emit = sink or rows.append
+    software_enabled, software_cfg, ad_cfg, feats = _collect_context(cfg, fast)
+    transforms = transforms or compile_transforms(cfg.get('transforms', {}))
+
+    controller = controller or ConcurrencyController(fixed=workers)
+    os_cache = OsCache(((cfg.get('collect') or {}).get('session') or {}).get('os_cache_file'))
+    # `targets` may be a list or a TargetQueue still being filled by discovery
+    source = targets if isinstance(targets, TargetQueue) else TargetQueue.from_list(targets)
+    queues = {}
+
+    with _progress(console) as progress:
+        task = progress.add_task("Collecting hosts", total=source.total) if progress else None
+        with ThreadPoolExecutor(max_workers=controller.max_workers) as ex:
+            futs = {}
+            while futs or any(queues.values()) or not source.exhausted:
+                for t in source.get_nowait():
+                    queues.setdefault(controller.classify(t), deque()).append(t)
+                # Admit work while each collector class is under its current limit
+                for cls, q in queues.items():
+                    limiter = controller.limiters[cls]
+                    while q and limiter.can_start():
+                        t = q.popleft()
+                        limiter.started()
+                        fut = ex.submit(collect_one, cfg, t, software_enabled, software_cfg, ad_cfg, dry_run, transforms, cfg.get('dns', {}), feats, os_cache, ad_index)
+                        futs[fut] = (cls, time.monotonic(), t)
+                if not futs:
+                    # Idle until discovery hands over more targets
+                    source.wait(timeout=0.5)
+                    continue
+                done, _ = wait(futs, timeout=1.0 if source.closed else 0.2, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    cls, started, t = futs.pop(fut)
+                    # Providers that reported this machine after collection started
+                    row = apply_late(fut.result(), source.late_attrs(t))
+                    elapsed = time.monotonic() - started
+                    timings.record(row.get('host'), 'total', elapsed)
+                    controller.limiters[cls].finished(elapsed, row.get('error'))
+                    if journal:
+                        journal.append(row)
+                    emit(row)
+                    if progress:
+                        progress.update(task, advance=1)
+                controller.tick()
+                if progress:
+                    desc = "Collecting hosts" + (f" ({controller.describe()})" if controller.adaptive else "")
+                    if not source.closed:
+                        desc += " [dim]discovery running[/]"
+                    progress.update(task, description=desc, total=source.total)
+    if not dry_run:
+        try: os_cache.save()
+        except Exception: pass
     return rows
 
+# --- process-sharded collection (--processes) ---------------------------
+# These run inside the shard processes; ShardPool pickles them by reference.
+
+def _shard_init(cfg, fast, parent_ad):
+    software_enabled, software_cfg, ad_cfg, feats = _collect_context(cfg, fast)
+    if parent_ad:
+        feats['ad_ou'] = False   # the parent enriches from its prefetched AD index
+    plan = compile_transforms(cfg.get('transforms', {}))
+    os_cache = OsCache(((cfg.get('collect') or {}).get('session') or {}).get('os_cache_file'))
+    return {'cfg': cfg, 'plan': plan, 'os_cache': os_cache,
+            'args': (software_enabled, software_cfg, ad_cfg, False, plan, cfg.get('dns', {}), feats, os_cache)}
+
+def _shard_collect(state, t):
+    started = time.monotonic()
+    row = collect_one(state['cfg'], t, *state['args'])
+    timings.record(row.get('host'), 'total', time.monotonic() - started)
+    return row
+
+def _shard_finish(state):
+    # Counters for the parent to merge; it also owns the OS cache file
+    with timings.lock:
+        hosts = {h: dict(steps) for h, steps in timings.hosts.items()}
+    with state['os_cache'].lock:
+        os_seen = dict(state['os_cache'].data)
+    return {'transforms': state['plan'].stats(), 'os_cache': os_seen, 'timings': hosts}
+
+def collect_hosts_sharded(cfg, targets, processes, workers=8, console=None, fast=False, sink=None, journal=None, transforms=None, ad_index=None):
+    """collect_hosts() across `processes` worker processes with `workers`
+    threads each, for when CPU-bound collector work (SSH key exchange, WinRM
+    XML parsing, transforms) saturates one core under the GIL.
+
+    Discovery, identity merging, AD index enrichment, the journal, the sink
+    and progress stay in this process; targets are handed to the least
+    loaded shard and rows stream back as each host finishes. Shard
+    transforms counters, OS cache entries and step timings are merged in
+    at the end. Returns (rows, concurrency summary)."""
+    rows = []
+    emit = sink or rows.append
+    _, _, ad_cfg, feats = _collect_context(cfg, fast)
+    transforms = transforms or compile_transforms(cfg.get('transforms', {}))
+    enrich_here = ad_index is not None and feats.get('ad_ou', True) and ad_cfg.get('enabled') and ad_cfg.get('enrich_non_ad')
+    source = targets if isinstance(targets, TargetQueue) else TargetQueue.from_list(targets)
+    pool = ShardPool(processes, workers, _shard_collect, init=_shard_init, init_args=(cfg, fast, bool(enrich_here)),
+                     finalize=_shard_finish).start()
+    names = [f"shard{i}" for i in range(pool.processes)]
+    shard_stats = {n: {'limit': pool.threads, 'completed': 0, 'errors': 0, 'timeouts': 0} for n in names}
+
+    try:
+        with _progress(console) as progress:
+            task = progress.add_task("Collecting hosts", total=source.total) if progress else None
+            while not pool.done:
+                for t in source.get_nowait():
+                    pool.submit(t)
+                if source.exhausted and not pool.closing:
+                    pool.close_input()
+                if not pool.pending and not pool.closing:
+                    # Idle until discovery hands over more targets
+                    source.wait(timeout=0.5)
+                    continue
+                for idx, _, t, ok, result in pool.results(timeout=0.2):
+                    row = result if ok else dict(t, error=f"collection failed in {names[idx]}: {result}")
+                    row = apply_late(row, source.late_attrs(t))
+                    if enrich_here and not row.get('ad_ou'):
+                        _ad_enrich(ad_cfg, row, ad_index)
+                    st = shard_stats[names[idx]]
+                    st['completed'] += 1
+                    st['errors'] += 1 if row.get('error') else 0
+                    st['timeouts'] += 1 if row.get('error') and _is_timeout(row.get('error')) else 0
+                    if journal:
+                        journal.append(row)
+                    emit(row)
+                    if progress:
+                        progress.update(task, advance=1)
+                if progress:
+                    desc = f"Collecting hosts ({pool.processes}x{pool.threads}, {pool.pending} in flight)"
+                    if not source.closed:
+                        desc += " [dim]discovery running[/]"
+                    progress.update(task, description=desc, total=source.total)
+    finally:
+        pool.join()
+
+    os_cache = OsCache(((cfg.get('collect') or {}).get('session') or {}).get('os_cache_file'))
+    for st in pool.shard_stats:
+        if not st:
+            continue
+        transforms.absorb(st['transforms'])
+        timings.merge(st['timings'])
+        os_cache.data.update(st['os_cache'])
+    try: os_cache.save()
+    except Exception: pass
+    summary = {'mode': 'sharded', 'processes': pool.processes, 'threads_per_process': pool.threads,
+               'limiters': shard_stats, 'peak_limits': {n: pool.threads for n in names},
+               'exitcodes': pool.summary()['exitcodes']}
+    return rows, summary
+
+# --- asyncio engine (--engine async) -------------------------------------
+
+async def collect_one_async(engine, cfg, t, software_enabled, sw_filters, ad_cfg, transforms, dns_cfg, feats, os_cache=None, ad_index=None):
+    """collect_one() with WinRM/SSH driven by an AsyncCollector."""
+    host = t.get('host')
+    row = dict(t)
+
+    dns_bulk = ((cfg.get('dns') or {}).get('bulk') or {}).get('enabled', True)
+    if feats.get('dns', True) and (cfg.get('dns') or {}).get('enabled', True) and not dns_bulk:
+        t0 = time.perf_counter()
+        names = [n for n in await asyncio.gather(*(engine.blocking(reverse_lookup, ip, dns_cfg) for ip in _target_ips(row))) if n]
+        timings.record(host, 'dns', time.perf_counter() - t0)
+        if names and not row.get('resolved_name'):
+            row['resolved_name'] = names[0]
+
+    wcfg, lcfg, scfg = _collector_cfgs(cfg, software_enabled, sw_filters)
+    data, os_name = await engine.collect(host, (_target_ips(row) or [host])[0], _known_os(t, os_cache), wcfg, lcfg, feats, scfg)
+    if os_cache is not None and os_name and data and not data.get('error'):
+        os_cache.set(host, os_name)
+
+    if feats.get('ad_ou', True) and not row.get('ad_ou') and ad_cfg.get('enabled') and ad_cfg.get('enrich_non_ad'):
+        if ad_index is not None and ad_index.ready.is_set() and ad_index.index is not None:
+            _ad_enrich(ad_cfg, row, ad_index)   # dictionary lookup
+        else:
+            await engine.blocking(_ad_enrich, ad_cfg, row, ad_index)
+
+    row.update(data or {})
+    if feats.get('transforms', True):
+        with timings.step(host, 'transforms'):
+            row = transforms.apply(row)
+    return row
+
+def collect_hosts_async(cfg, targets, console=None, fast=False, sink=None, journal=None, transforms=None, ad_index=None):
+    """collect_hosts() on one asyncio event loop (see AsyncCollector):
+    up to collect.async.max_in_flight hosts at once without a thread per
+    host. Rows, journal, sink and progress behave as in collect_hosts().
+    Returns (rows, concurrency summary)."""
+    rows = []
+    emit = sink or rows.append
+    software_enabled, software_cfg, ad_cfg, feats = _collect_context(cfg, fast)
+    transforms = transforms or compile_transforms(cfg.get('transforms', {}))
+    os_cache = OsCache(((cfg.get('collect') or {}).get('session') or {}).get('os_cache_file'))
+    source = targets if isinstance(targets, TargetQueue) else TargetQueue.from_list(targets)
+    engine = AsyncCollector((cfg.get('collect') or {}).get('async') or {}, {'windows': win_collect, 'linux': lin_collect})
+
+    async def drive():
+        loop = asyncio.get_running_loop()
+        engine.open()
+        finished: asyncio.Queue = asyncio.Queue()
+        backlog = deque()
+        tasks = set()   # the loop only keeps weak references to tasks
+        in_flight = 0
+
+        async def one(t):
+            started = time.monotonic()
+            try:
+                row = await collect_one_async(engine, cfg, t, software_enabled, software_cfg, ad_cfg, transforms, cfg.get('dns', {}), feats, os_cache, ad_index)
+            except Exception as e:
+                row = dict(t, error=f"{type(e).__name__}: {e}")
+            timings.record(row.get('host'), 'total', time.monotonic() - started)
+            finished.put_nowait((t, row))
+
+        with _progress(console) as progress:
+            task = progress.add_task("Collecting hosts", total=source.total) if progress else None
+            while in_flight or backlog or not source.exhausted:
+                backlog.extend(source.get_nowait())
+                while backlog and in_flight < engine.max_in_flight:
+                    fut = asyncio.ensure_future(one(backlog.popleft()))
+                    tasks.add(fut); fut.add_done_callback(tasks.discard)
+                    in_flight += 1
+                if not in_flight:
+                    # Idle until discovery hands over more targets
+                    await loop.run_in_executor(None, source.wait, 0.5)
+                    continue
+                try:
+                    done = [await asyncio.wait_for(finished.get(), 0.2)]
+                except asyncio.TimeoutError:
+                    done = []
+                while not finished.empty():
+                    done.append(finished.get_nowait())
+                for t, row in done:
+                    in_flight -= 1
+                    # Providers that reported this machine after collection started
+                    row = apply_late(row, source.late_attrs(t))
+                    if journal:
+                        journal.append(row)
+                    emit(row)
+                    if progress:
+                        progress.update(task, advance=1)
+                if progress:
+                    desc = f"Collecting hosts (async, {in_flight} in flight)"
+                    if not source.closed:
+                        desc += " [dim]discovery running[/]"
+                    progress.update(task, description=desc, total=source.total)
+
+    try:
+        asyncio.run(drive())
+    finally:
+        engine.close()
+    try: os_cache.save()
+    except Exception: pass
+    return rows, engine.summary()
+
+# --- distributed collection (--coordinator / --worker) -------------------
+
+def _worker_collect(run, targets, sink, local_cfg=None):
+    """One spool shard in a --worker process; returns stats for the coordinator.
+    run.json carries no secrets: they come from the worker's own config
+    (`local_cfg`) or the collectors' environment variables."""
+    cfg = merge_secrets(run['cfg'], local_cfg or {})
+    timings.reset()
+    plan = compile_transforms(cfg.get('transforms', {}))
+    if run.get('engine') == 'async':
+        collect_hosts_async(cfg, targets, fast=run.get('fast', False), sink=sink, transforms=plan)
+    else:
+        collect_hosts(cfg, targets, workers=int(run.get('workers') or 8), fast=run.get('fast', False), sink=sink, transforms=plan)
+    with timings.lock:
+        hosts = {h: dict(steps) for h, steps in timings.hosts.items()}
+    return {'transforms': plan.stats(), 'timings': hosts}
+
+def collect_hosts_distributed(cfg, targets, spool_dir, local_workers=0, workers=8, engine='threads', console=None, fast=False,
+                              sink=None, journal=None, transforms=None, ad_index=None, config_path=None):
+    """Collect `targets` (a finished discovery list) through --worker
+    processes sharing `spool_dir` (see modules.distributed.Coordinator).
+    `local_workers` are started here, reading secrets from `config_path`;
+    more can join from other runners.
+    Rows, journal, sink, progress and AD index enrichment stay in this
+    process. Returns (rows, concurrency summary)."""
+    rows = []
+    emit = sink or rows.append
+    _, _, ad_cfg, feats = _collect_context(cfg, fast)
+    transforms = transforms or compile_transforms(cfg.get('transforms', {}))
+    enrich_here = ad_index is not None and feats.get('ad_ou', True) and ad_cfg.get('enabled') and ad_cfg.get('enrich_non_ad')
+
+    # Workers share nothing on disk but the spool: they skip the OS cache
+    # file and, with an AD index here, OU enrichment
+    wcfg = copy.deepcopy(cfg)
+    wcfg.setdefault('collect', {}).setdefault('session', {})['os_cache_file'] = None
+    if enrich_here:
+        wcfg.setdefault('features', {}).setdefault('enrichment', {})['ad_ou'] = False
+    run_doc = {'cfg': wcfg, 'fast': fast, 'engine': engine, 'workers': workers}
+    worker_cmd = [sys.executable, os.path.abspath(__file__), '--worker']
+    if config_path:
+        worker_cmd += ['--config', os.path.abspath(config_path)]
+    coord = Coordinator(spool_dir, run_doc, cfg.get('distributed') or {}, worker_cmd, local_workers).start(targets)
+    if console:
+        console.print(f"Distributed: [bold]{len(coord.shards)}[/] shards in {coord.spool.path}, {local_workers} local workers")
+
+    try:
+        with _progress(console) as progress:
+            task = progress.add_task("Collecting hosts", total=coord.total) if progress else None
+            while not coord.finished:
+                for t, row in coord.poll():
+                    if enrich_here and not row.get('ad_ou'):
+                        _ad_enrich(ad_cfg, row, ad_index)
+                    if journal:
+                        journal.append(row)
+                    emit(row)
+                    if progress:
+                        progress.update(task, advance=1)
+                if progress:
+                    progress.update(task, description=f"Collecting hosts ({coord.describe()})")
+    finally:
+        coord.close()
+    for st in coord.stats:
+        transforms.absorb(st.get('transforms') or {})
+        timings.merge(st.get('timings') or {})
+    return rows, coord.summary()
+
 def main():
     ap = argparse.ArgumentParser(description="Modular CMDB inventory")
     ap.add_argument("--config","-c", default="config.yaml", help="Config YAML path")
     ap.add_argument("--out","-o", default="out", help="Output folder")
     ap.add_argument("--workers","-w", default="8", help="Parallel collection workers (int or 'auto')")
+    ap.add_argument("--engine", choices=["threads", "async"], default="threads", help="Collection engine: a thread per host in flight, or one asyncio event loop (collect.async)")
+    ap.add_argument("--processes","-p", type=int, default=1, help="Shard collection across N worker processes, each with --workers threads (escapes the GIL on CPU-heavy collectors)")
+    ap.add_argument("--coordinator", action="store_true", help="Discover, then hand target shards to --worker processes through a spool directory and merge their rows")
+    ap.add_argument("--local-workers", type=int, default=2, help="Worker processes the coordinator starts on this machine (default: 2)")
+    ap.add_argument("--worker", action="store_true", help="Collect shards from a coordinator's spool directory until it finishes")
+    ap.add_argument("--spool", type=str, help="Spool directory shared by coordinator and workers (coordinator default: <out>/spool)")
+    ap.add_argument("--worker-id", type=str, help="Worker name in the spool (default: <hostname>-<pid>)")
     ap.add_argument("--autotune", action="store_true", help="Auto-pick worker count based on target size")
     ap.add_argument("--dry-run", action="store_true", help="Discovery only; do not perform WinRM/SSH collection")
     ap.add_argument("--targets", type=str, help="CSV file with additional targets (host,os_hint,source,provider)")
@@ -218,8 +626,46 @@ def main():
     ap.add_argument("--fast", action="store_true", help="Fast mode: disable software inventory, DNS reverse, TCP probes")
     ap.add_argument("--include-fields", type=str, help="Comma-separated list of fields to include in outputs")
     ap.add_argument("--exclude-fields", type=str, help="Comma-separated list of fields to exclude from outputs")
+    ap.add_argument("--incremental", action="store_true", help="Reuse previous rows for hosts whose discovery fingerprint is unchanged")
+    ap.add_argument("--previous", type=str, help="Previous inventory.json or SQLite DB for --incremental (default: <out>/inventory.json)")
+    ap.add_argument("--resume", action="store_true", help="Resume an interrupted run from <out>/checkpoint.ndjson; only unfinished targets are collected")
+    ap.add_argument("--profile", nargs="?", const="sample", choices=["sample", "cprofile"], help="Profile the run: 'sample' (all threads, default) or 'cprofile' (main thread)")
     args = ap.parse_args()
+    if args.engine == "async" and args.processes > 1:
+        ap.error("--engine async runs on one event loop; it cannot be combined with --processes")
+    if args.worker:
+        if not args.spool:
+            ap.error("--worker needs --spool DIR")
+        # Secrets are not in the spool: use this runner's config when it has one
+        local_cfg = load_config(args.config) if os.path.exists(args.config) else {}
+        run_worker(args.spool, lambda run, targets, sink: _worker_collect(run, targets, sink, local_cfg), args.worker_id)
+        return
+    if args.coordinator and args.processes > 1:
+        ap.error("--coordinator distributes work to --worker processes; drop --processes")
 
+    os.makedirs(args.out, exist_ok=True)
+    if args.profile == "cprofile":
+        import cProfile, pstats
+        prof = cProfile.Profile()
+        try:
+            prof.runcall(run, args)
+        finally:
+            prof.dump_stats(os.path.join(args.out, "profile.pstats"))
+            with open(os.path.join(args.out, "profile.txt"), "w", encoding="utf-8") as f:
+                pstats.Stats(prof, stream=f).sort_stats("cumulative").print_stats(40)
+    elif args.profile == "sample":
+        sampler = StackSampler()
+        sampler.start()
+        try:
+            run(args)
+        finally:
+            sampler.stop()
+            sampler.write(os.path.join(args.out, "profile.txt"))
+    else:
+        run(args)
+
+def run(args):
+    """One inventory run for parsed CLI `args`."""
     cfg = load_config(args.config)
     os.makedirs(args.out, exist_ok=True)
 
@@ -233,27 +679,28 @@ def main():
         # disable DNS reverse
         cfg.setdefault('dns', {})['reverse_lookup'] = False
 
+    # Persist reverse DNS answers between runs unless a cache file is configured
+    cfg.setdefault('dns', {}).setdefault('cache', {}).setdefault('file', os.path.join(args.out, "dns_cache.db"))
+    # Same for the OS classification learned by the collector pre-check
+    cfg.setdefault('collect', {}).setdefault('session', {}).setdefault('os_cache_file', os.path.join(args.out, "os_cache.json"))
+
     console = Console() if (args.tui and RICH_AVAILABLE) else None
     if console:
         console.print("[bold cyan]CMDB Inventory[/] starting…")
-        console.print("Phase: [bold]Discovery[/]")
-
-    extra = load_targets_csv(args.targets) if args.targets else []
-    targets = do_discovery(cfg, extra, console=console)
-    if console:
-        console.print(f"Discovered [bold]{len(targets)}[/] unique targets.")
-        console.print("Phase: [bold]Collection[/]" if not args.dry_run else "Phase: [bold]Collection[/] [dim](skipped — dry run)[/]")
 
-    # Autotune workers
-    if args.autotune or (isinstance(args.workers, str) and args.workers.lower() == 'auto'):
-        workers = _autotune_workers(len(targets), fast=args.fast)
+    # Adaptive per-OS concurrency, or a fixed pool with --workers N
+    processes = max(1, args.processes or 1)
+    sharded = processes > 1 and not args.dry_run
+    try:
+        workers = int(args.workers)
+    except:
+        workers = 8
+    if (args.autotune or (isinstance(args.workers, str) and args.workers.lower() == 'auto')) and not sharded:
+        controller = ConcurrencyController(cfg.get('concurrency') or {})
     else:
-        try:
-            workers = int(args.workers)
-        except:
-            workers = 8
-
-    rows = collect_hosts(cfg, targets, workers=workers, dry_run=args.dry_run, console=console, fast=args.fast)
+        if sharded and (args.autotune or str(args.workers).lower() == 'auto') and console:
+            console.print(f"[yellow]--autotune is not used with --processes; each shard runs a fixed pool of {workers} threads[/]")
+        controller = ConcurrencyController(fixed=workers)
 
     # Field filters
     include = []
@@ -265,20 +712,154 @@ def main():
         include = [x.strip() for x in args.include_fields.split(',') if x.strip()]
     if args.exclude_fields:
         exclude = [x.strip() for x in args.exclude_fields.split(',') if x.strip()]
-    rows = _apply_field_filters(rows, include, exclude)
-
-    if (cfg.get('export') or {}).get('json', True):
-        with open(os.path.join(args.out,"inventory.json"),"w",encoding="utf-8") as f:
-            json.dump(rows, f, indent=2)
-    if (cfg.get('export') or {}).get('csv', True):
-        export_csv(rows, os.path.join(args.out,"inventory.csv"))
-    if (cfg.get('export') or {}).get('html', True):
-        export_html(rows, os.path.join(args.out,"inventory.html"), template_dir="templates", title=(cfg.get('report') or {}).get('title',"CMDB Inventory Report"))
-    export_servicenow(rows, (cfg.get('export') or {}).get('servicenow'))
-    export_sqlite(rows, (cfg.get('export') or {}).get('sqlite'))
 
+    # Incremental: carry over unchanged hosts instead of re-collecting them. The previous
+    # rows are read first: the exporter drops the inventory tables it rebuilds
+    carried = []
+    incremental_on = args.incremental and not args.dry_run
+    if incremental_on:
+        state_path = os.path.join(args.out, "incremental_state.json")
+        state = incremental.load_state(state_path)
+        previous = incremental.load_previous_rows(args.previous or os.path.join(args.out, "inventory.json"))
+
+    # Rows are streamed to disk as they complete; finalize() builds the
+    # pretty JSON, HTML and ServiceNow exports from the stream.
+    exporter = StreamExporter(args.out, cfg.get('export') or {}, include, exclude)
+    failed = []
+    def on_row(row):
+        exporter.write(row)
+        if row.get('error'):
+            failed.append(row)
+
+    # Checkpoint journal: hosts finished by an interrupted run are replayed
+    collected_targets = []
+    journal = Journal(os.path.join(args.out, "checkpoint.ndjson"))
+    done = journal.load() if args.resume else {}
+    journal.open(resume=args.resume)
+    # A restored row may carry its machine's other names (merged targets)
+    done_names = set(done) | {str(a).lower() for row in done.values() for a in row.get('aliases') or []}
+
+    enrich_feats = cfg.get('features', {}).get('enrichment', {})
+    dns_cfg = cfg.get('dns') or {}
+    bulk_dns = (not args.fast and enrich_feats.get('dns', True) and dns_cfg.get('enabled', True)
+                and (dns_cfg.get('bulk') or {}).get('enabled', True))
+
+    def prepare(batch):
+        # Runs on each deduplicated discovery batch before collection sees it
+        if bulk_dns:
+            with timings.phase("dns_bulk"):
+                resolve_names(cfg, batch)
+        return batch
+
+    def select(targets):
+        # Runs once on the merged targets after discovery: what to collect
+        if incremental_on:
+            targets, keep = incremental.plan(targets, previous, state, cfg.get('incremental') or {})
+            # Carried rows get the current transforms config, as collected ones do
+            if transforms_on:
+                keep = plan.apply_many(keep)
+            for row in keep:
+                exporter.write(row)
+            carried.extend(keep)
+        # Copies: state is recorded from the targets as planned
+        collected_targets.extend(dict(t) for t in targets)
+        if done:
+            targets = [t for t in targets if not ({(t.get('host') or '').lower()} | {str(a).lower() for a in t.get('aliases') or []}) & done_names]
+        return targets
+
+    plan = compile_transforms(cfg.get('transforms', {}))
+    transforms_on = _collect_context(cfg, args.fast)[3].get('transforms', True)
+
+    # One paged LDAP pull of all computer objects, overlapping discovery,
+    # replaces a per-host ad_enrich() query during collection
+    ad_cfg = (cfg.get('discovery') or {}).get('active_directory', {})
+    ad_index = None
+    if (enrich_feats.get('ad_ou', True) and ad_cfg.get('enabled') and ad_cfg.get('enrich_non_ad')
+            and (ad_cfg.get('index') or {}).get('enabled', True)):
+        icfg = ad_cfg.get('index') or {}
+        ad_index = AdPrefetch(ad_cfg, icfg.get('cache_file', os.path.join(args.out, "ad_index.json"))).start()
+
+    extra = load_targets_csv(args.targets) if args.targets else []
     if console:
-        console.print(f"[bold green]Done.[/] Outputs in: {os.path.abspath(args.out)}  (workers={workers})")
+        console.print("Phase: [bold]Discovery → Collection[/] (pipelined)" if not args.dry_run
+                      else "Phase: [bold]Discovery[/] [dim](collection skipped — dry run)[/]")
+    if done and console:
+        console.print(f"Resume: [bold]{len(done)}[/] hosts restored from checkpoint.")
+
+    try:
+        for row in (plan.apply_many(done.values()) if transforms_on else done.values()):
+            on_row(row)
+        source = start_discovery(cfg, extra, console=console, prepare=prepare,
+                                 select=select if incremental_on or done else None)
+        conc = None
+        with timings.phase("collection"):
+            if args.coordinator and not args.dry_run:
+                # Shards need the full target list, so discovery finishes first (as in do_discovery)
+                _, conc = collect_hosts_distributed(cfg, list(source), args.spool or os.path.join(args.out, "spool"), args.local_workers, workers,
+                                                    args.engine, console=console, fast=args.fast, sink=on_row, journal=journal, transforms=plan, ad_index=ad_index,
+                                                    config_path=args.config)
+            elif args.engine == "async" and not args.dry_run:
+                _, conc = collect_hosts_async(cfg, source, console=console, fast=args.fast, sink=on_row, journal=journal, transforms=plan, ad_index=ad_index)
+            elif sharded:
+                _, conc = collect_hosts_sharded(cfg, source, processes, workers=workers, console=console, fast=args.fast, sink=on_row, journal=journal, transforms=plan, ad_index=ad_index)
+            else:
+                collect_hosts(cfg, source, dry_run=args.dry_run, console=console, fast=args.fast, sink=on_row, journal=journal, controller=controller, transforms=plan, ad_index=ad_index)
+        fresh_count = exporter.count - len(carried)
+    finally:
+        exporter.close()
+        journal.close()
+    if incremental_on and console:
+        console.print(f"Incremental: [bold]{len(collected_targets)}[/] to collect, [bold]{len(carried)}[/] carried over.")
+    if incremental_on:
+        # A provider that failed did not report its hosts; they have not vanished
+        if source.failed:
+            msg = f"Incremental: keeping state of hosts not seen this run ({', '.join(source.failed)} failed)"
+            if console:
+                console.print(f"[yellow]{msg}[/]")
+            else:
+                print(msg, file=sys.stderr)
+        incremental.save_state(state_path, incremental.update_state(state, collected_targets, failed, carried,
+                                                                    prune=not source.failed))
+    with timings.phase("export.finalize"):
+        exporter.finalize(title=(cfg.get('report') or {}).get('title',"CMDB Inventory Report"))
+    timings.write(os.path.join(args.out, "timings.json"))
+    journal.remove()
+
+    if incremental_on:
+        inc_line = f"Incremental: fresh={fresh_count} carried_over={len(carried)} total={exporter.count}"
+        if console:
+            console.print(inc_line)
+        else:
+            print(inc_line, file=sys.stderr)
+    conc = conc or controller.summary()
+    with open(os.path.join(args.out, "concurrency.json"), "w", encoding="utf-8") as f:
+        json.dump(conc, f, indent=2)
+    if conc['mode'] == 'distributed':
+        conc_line = f"Distributed ({conc['shard_by']}): shards={conc['shards']} redispatched={conc['redispatched']} failed_targets={conc['failed_targets']} " + ", ".join(
+            f"{w} rows={v['rows']} shards={v['shards']}" + (" lost" if v['lost'] else "") for w, v in conc['workers'].items())
+    else:
+        conc_line = "Concurrency ({}): ".format(conc['mode'] if conc['mode'] != 'sharded' else f"{conc['processes']} processes") + ", ".join(
+            f"{n} final={v['limit']} peak={conc['peak_limits'][n]} done={v['completed']} timeouts={v['timeouts']}" for n, v in conc['limiters'].items())
+    dns_stats = dns_cache_stats()
+    dns_line = "DNS cache: hits={hits} disk_hits={disk_hits} negative_hits={negative_hits} misses={misses} errors={errors}".format(**dns_stats)
+    tstats = plan.stats()
+    with open(os.path.join(args.out, "transforms.json"), "w", encoding="utf-8") as f:
+        json.dump(tstats, f, indent=2)
+    tr_line = f"Transforms: rows={tstats['rows']} rules_fired={sum(tstats['fired'].values())} errors={sum(tstats['errors'].values())}"
+    lines = [conc_line, dns_line, tr_line]
+    ids = source.resolver.stats()
+    lines.append("Identity: machines={machines} merged={merged} late_merges={late_merges} late_duplicates={late_duplicates}".format(**ids))
+    if ad_index is not None and ad_index.ready.is_set():
+        ad = ad_index.summary()
+        lines.append("AD index: " + (f"failed ({ad['error']})" if ad.get('error') else
+                     f"{ad['mode']} computers={ad['computers']} fetched={ad['fetched']} hits={ad['hits']} misses={ad['misses']} ({ad['seconds']}s)"))
+    if console:
+        console.print(f"[bold green]Done.[/] Outputs in: {os.path.abspath(args.out)}")
+        for line in lines:
+            console.print(f"[dim]{line}[/]")
+    else:
+        for line in lines:
+            print(line, file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -4,22 +4,53 @@ Inventory Viewer (stdlib only)
 
 Usage:
   python inventory_viewer.py out/inventory.json
+  python inventory_viewer.py out/inventory.ndjson
+  python inventory_viewer.py out/inventory.json --build-index   # (re)build the search sidecar
   # Keys inside the viewer:
-  #   n         next page
-  #   p         previous page
-  #   g <num>   go to page number (1-based)
-  #   f <text>  filter rows by substring across visible columns
-  #   c         clear filter
-  #   q         quit
+  #   n              next page
+  #   p              previous page
+  #   g <num>        go to page number (1-based)
+  #   f <text>       filter rows by substring across visible columns
+  #   f <col>:<text> filter rows by substring in one column
+  #   c              clear filter
+  #   sort <col>     sort the view by a column (sort -<col> descending, sort alone: file order)
+  #   group <col>    row counts per value of a column in the current view
+  #   stats          distinct/empty counts, top values and numeric range per visible column
+  #   q              quit
+
+When out/inventory.viewer.db (written by the export) is present and not older
+than the JSON, rows are paged and searched from it instead of loading the
+whole file: filters are FTS5 trigram lookups (columns left out of the index
+are scanned) and only the visible page is decoded. Without it, NDJSON files and JSON arrays are memory-mapped and their
+rows located by a background thread, so page 1 shows immediately and
+`g <num>` jumps straight to the row's byte offset.
 """
 
 from __future__ import annotations
 
 import argparse
 import json
+import math
+import mmap
 import os
 import sys
-from typing import List, Dict, Any, Sequence
+import threading
+from array import array
+from collections import Counter
+from typing import List, Dict, Any, Optional, Sequence
+
+try:
+    from modules.export.viewer_index import IndexStore, build_index, sidecar_path, cell_text
+    INDEX_AVAILABLE = True
+except Exception:
+    INDEX_AVAILABLE = False
+
+    def cell_text(v: Any) -> str:
+        if v is None:
+            return ""
+        if isinstance(v, (list, tuple)):
+            return ", ".join(str(x) for x in v)
+        return str(v)
 
 DEFAULT_COLUMNS: Sequence[str] = (
     "host",
@@ -62,22 +93,258 @@ def load_rows(path: str) -> List[Dict[str, Any]]:
     return norm
 
 
-def pick_columns(rows: List[Dict[str, Any]], requested: Sequence[str] | None) -> List[str]:
+class ListStore:
+    """In-memory rows with the same interface as IndexStore (1-based row ids).
+
+    The lowercase search text of each row is built once per column set and
+    reused by later filters.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self._keys: Optional[List[str]] = None
+        self._hay: Dict[tuple, List[str]] = {}
+
+    def count(self) -> int:
+        return len(self.rows)
+
+    def columns(self) -> List[str]:
+        if self._keys is None:
+            self._keys = list(dict.fromkeys(k for r in self.rows for k in r.keys()))
+        return self._keys
+
+    def get(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        n = len(self.rows)
+        return [self.rows[i - 1] for i in ids if 1 <= i <= n]
+
+    def column_values(self, cols: Sequence[str]) -> Dict[str, List[str]]:
+        return {c: [cell_text(r.get(c)) for r in self.rows] for c in cols}
+
+    def search(self, needle: str, cols: Sequence[str]) -> List[int]:
+        key = tuple(cols)
+        hay = self._hay.get(key)
+        if hay is None:
+            # \x00 keeps a match from spanning two columns
+            hay = self._hay[key] = ["\x00".join(cell_text(r.get(c, "")) for c in cols).lower() for r in self.rows]
+        n = needle.lower()
+        return [i + 1 for i, h in enumerate(hay) if n in h]
+
+    def close(self):
+        pass
+
+
+class OffsetStore:
+    """Rows addressed by byte range in a memory-mapped NDJSON file or JSON array.
+
+    A background thread records where each row starts and ends, so the first
+    page is shown as soon as its rows are located and any row (and therefore
+    `g <num>`) is a constant-time slice of the map. Only rows that are shown
+    or searched get decoded. Columns are taken from the first rows.
+    """
+
+    SAMPLE_ROWS = 1000
+    NOTIFY_EVERY = 2048
+
+    def __init__(self, path: str):
+        self.path = path
+        self.f = open(path, "rb")
+        size = os.fstat(self.f.fileno()).st_size
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.starts = array("q")
+        self.ends = array("q")
+        self.cond = threading.Condition()
+        self.loading = True
+        self.error: Optional[str] = None
+        self._keys: Optional[List[str]] = None
+        self._hay: Dict[tuple, List[str]] = {}
+        self._stop = False
+        if path.endswith(".ndjson") or path.endswith(".jsonl"):
+            target = self._index_ndjson
+        elif self.mm[:5] == b"[\n  {" or self.mm[:6] == b"[\r\n  {":
+            target = self._index_pretty
+        else:
+            target = self._index_json
+        self.thread = threading.Thread(target=self._run, args=(target,), name="viewer-index", daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def wants(path: str) -> bool:
+        """False for payloads OffsetStore cannot address (e.g. dict-wrapped JSON)."""
+        if path.endswith(".ndjson") or path.endswith(".jsonl"):
+            return True
+        with open(path, "rb") as f:
+            head = f.read(64).lstrip()
+        return head.startswith(b"[")
+
+    def _run(self, target):
+        try:
+            target()
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            with self.cond:
+                self.loading = False
+                self.cond.notify_all()
+
+    def _add(self, start: int, end: int):
+        self.starts.append(start); self.ends.append(end)
+        if len(self.starts) % self.NOTIFY_EVERY == 0:
+            with self.cond:
+                self.cond.notify_all()
+
+    def _index_ndjson(self):
+        mm = self.mm; n = len(mm); pos = 0
+        while pos < n and not self._stop:
+            end = mm.find(b"\n", pos)
+            if end < 0:
+                end = n
+            if end - pos > 2 or mm[pos:end].strip():
+                self._add(pos, end)
+            pos = end + 1
+
+    def _index_pretty(self):
+        # Layout written by json.dump(rows, indent=2) and the stream exporter:
+        # every row opens with "\n  {" and closes with "\n  }" (CRLF files
+        # match too, "\r" sits before the "\n"); nested values
+        # are indented deeper, so these markers only occur at row level.
+        mm = self.mm; pos = 0
+        while not self._stop:
+            start = mm.find(b"\n  {", pos)
+            if start < 0:
+                break
+            if mm[start + 3:start + 5] == b"{}":
+                self._add(start + 3, start + 5); pos = start + 5
+                continue
+            end = mm.find(b"\n  }", start)
+            if end < 0:
+                break
+            self._add(start + 3, end + 4)
+            pos = end + 4
+
+    def _index_json(self, chunk: int = 1 << 20):
+        # Any other JSON array: raw_decode one element at a time from a text
+        # buffer, tracking the byte offset of what has been consumed. No
+        # newline translation, so characters map back to bytes exactly.
+        dec = json.JSONDecoder()
+        with open(self.path, "r", encoding="utf-8", newline="") as f:
+            buf = f.read(chunk)
+            i = buf.find("[") + 1
+            consumed_chars, consumed_bytes = i, len(buf[:i].encode("utf-8"))
+            eof = False
+            while not self._stop:
+                while i < len(buf) and buf[i] in " \t\r\n,":
+                    i += 1
+                if i < len(buf) and buf[i] == "]":
+                    break
+                try:
+                    obj, j = dec.raw_decode(buf, i)
+                except ValueError:
+                    if eof:
+                        break
+                    more = f.read(chunk)
+                    eof = not more
+                    buf = buf[consumed_chars:] + more
+                    i -= consumed_chars; consumed_chars = 0
+                    continue
+                start = consumed_bytes + len(buf[consumed_chars:i].encode("utf-8"))
+                end = start + len(buf[i:j].encode("utf-8"))
+                consumed_chars, consumed_bytes = j, end
+                if isinstance(obj, dict):
+                    self._add(start, end)
+                i = j
+
+    def wait_for(self, n: int) -> int:
+        """Block until `n` rows are located (or the file is done); returns the count."""
+        with self.cond:
+            self.cond.wait_for(lambda: len(self.starts) >= n or not self.loading)
+            return len(self.starts)
+
+    def count(self) -> int:
+        return len(self.starts)
+
+    def _row(self, i: int) -> Dict[str, Any]:
+        return json.loads(self.mm[self.starts[i - 1]:self.ends[i - 1]])
+
+    def get(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        ids = list(ids)
+        if ids:
+            self.wait_for(max(ids))
+        n = len(self.starts)
+        return [self._row(i) for i in ids if i <= n]
+
+    def iter_rows(self):
+        i = 1
+        while True:
+            if i > self.wait_for(i):
+                return
+            yield self._row(i)
+            i += 1
+
+    def columns(self) -> List[str]:
+        if self._keys is None:
+            n = self.wait_for(self.SAMPLE_ROWS)
+            rows = self.get(range(1, min(n, self.SAMPLE_ROWS) + 1))
+            keys = list(dict.fromkeys(k for r in rows for k in r.keys()))
+            if self.loading:
+                return keys
+            self._keys = keys
+        return self._keys
+
+    def column_values(self, cols: Sequence[str]) -> Dict[str, List[str]]:
+        lists: List[List[str]] = [[] for _ in cols]
+        for r in self.iter_rows():
+            for lst, c in zip(lists, cols):
+                lst.append(cell_text(r.get(c)))
+        return dict(zip(cols, lists))
+
+    def search(self, needle: str, cols: Sequence[str]) -> List[int]:
+        self.wait_for(sys.maxsize)
+        key = tuple(cols)
+        hay = self._hay.get(key)
+        if hay is None:
+            hay = self._hay[key] = ["\x00".join(cell_text(r.get(c, "")) for c in cols).lower() for r in self.iter_rows()]
+        n = needle.lower()
+        return [i + 1 for i, h in enumerate(hay) if n in h]
+
+    def close(self):
+        self._stop = True
+        self.thread.join()
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.f.close()
+
+
+def open_store(path: str, use_index: bool = True):
+    """Sidecar index when available and fresh, else the file mapped and
+    indexed in the background (NDJSON / JSON array), else loaded in memory."""
+    if not os.path.exists(path):
+        sys.stderr.write(f"ERROR: file not found: {path}\n")
+        sys.exit(2)
+    if use_index and INDEX_AVAILABLE:
+        store = IndexStore.open_for(path)
+        if store is not None:
+            return store
+    if OffsetStore.wants(path):
+        return OffsetStore(path)
+    return ListStore(load_rows(path))
+
+
+def pick_columns(store, requested: Sequence[str] | None) -> List[str]:
     if requested:
         return list(requested)
+    existing = store.columns()
     # Choose defaults but include any obviously present keys like 'name' if 'host' missing
     cols = list(DEFAULT_COLUMNS)
-    if rows:
-        sample = rows[0]
+    first = store.get([1]) if store.count() else []
+    if first:
+        sample = first[0]
         if "host" not in sample and "name" in sample and "name" not in cols:
             cols.insert(0, "name")
     # Keep only columns that exist in at least one row
-    existing = set()
-    for r in rows:
-        existing.update(k for k in r.keys())
-    cols = [c for c in cols if c in existing]
+    present = set(existing)
+    cols = [c for c in cols if c in present]
     # Always ensure at least one column
-    return cols or sorted(list(existing))[:8]
+    return cols or sorted(existing)[:8]
 
 
 def truncate(val: Any, width: int) -> str:
@@ -99,10 +366,7 @@ def compute_widths(rows: List[Dict[str, Any]], cols: Sequence[str], max_width: i
     for i, c in enumerate(cols):
         max_cell = widths[i]
         for r in sample_rows:
-            v = r.get(c)
-            if isinstance(v, (list, tuple)):
-                v = ", ".join(str(x) for x in v)
-            max_cell = max(max_cell, len(str(v)) if v is not None else 0)
+            max_cell = max(max_cell, len(cell_text(r.get(c))))
             if max_cell >= MAX_COL_WIDTH:
                 max_cell = MAX_COL_WIDTH
                 break
@@ -128,66 +392,208 @@ def compute_widths(rows: List[Dict[str, Any]], cols: Sequence[str], max_width: i
     return widths
 
 
-def render_page(rows: List[Dict[str, Any]], cols: Sequence[str], page: int, page_size: int, term_width: int) -> str:
-    total_pages = max(1, (len(rows) + page_size - 1) // page_size)
+def render_page(store, ids: Sequence[int], cols: Sequence[str], page: int, page_size: int, term_width: int, widths: List[int]) -> str:
+    total = len(ids)
+    total_pages = max(1, (total + page_size - 1) // page_size)
     page = max(1, min(page, total_pages))
     start = (page - 1) * page_size
-    end = min(len(rows), start + page_size)
-    view = rows[start:end]
-
-    widths = compute_widths(view, cols, max_width=term_width)
+    end = min(total, start + page_size)
+    view = store.get(ids[start:end])
     sep = " | "
 
     def fmt_row(r: Dict[str, Any]) -> str:
         parts = []
         for i, c in enumerate(cols):
-            parts.append(truncate(r.get(c, ""), widths[i]).ljust(widths[i]))
+            parts.append(truncate(cell_text(r.get(c, "")), widths[i]).ljust(widths[i]))
         return sep.join(parts)
 
     header = sep.join(c.ljust(widths[i]) for i, c in enumerate(cols))
     line = "-" * min(term_width, max(len(header), 3))
     body = "\n".join(fmt_row(r) for r in view)
-    footer = f"[{start + 1}-{end} of {len(rows)}]  page {page}/{total_pages}"
-    helpbar = "Commands: n=next, p=prev, g <num>=goto, f <text>=filter, c=clear, q=quit"
+    partial = "+" if getattr(store, "loading", False) and isinstance(ids, range) else ""
+    footer = f"[{start + 1 if total else 0}-{end} of {total}{partial}]  page {page}/{total_pages}{partial}"
+    if partial:
+        footer += "  (locating rows…)"
+    helpbar = "Commands: n=next, p=prev, g <num>=goto, f <text>|<col>:<text>=filter, c=clear, sort [-]<col>, group <col>, stats, q=quit"
     rendered = f"{header}\n{line}\n{body}\n{line}\n{footer}\n{helpbar}"
     return rendered, total_pages
 
 
-def filter_rows(rows: List[Dict[str, Any]], cols: Sequence[str], needle: str) -> List[Dict[str, Any]]:
+def view_widths(store, ids: Sequence[int], cols: Sequence[str], term_width: int) -> List[int]:
+    """Column widths for a whole view, sampled once from its first rows."""
+    return compute_widths(store.get(ids[:200]), cols, max_width=term_width)
+
+
+def filter_rows(store, cols: Sequence[str], needle: str) -> List[int] | range:
+    """Row ids matching `needle`, or `col:text` for a single column."""
     if not needle:
-        return rows
-    n = needle.lower()
-    out: List[Dict[str, Any]] = []
-    for r in rows:
-        hay = []
+        return range(1, store.count() + 1)
+    col, sep, text = needle.partition(":")
+    if sep and col in store.columns() and text:
+        return store.search(text, [col])
+    return store.search(needle, cols)
+
+
+def as_number(text: str) -> Optional[float]:
+    """float(text) for finite numbers; "nan", "inf" and the like stay text."""
+    try:
+        f = float(text)
+    except ValueError:
+        return None
+    return f if math.isfinite(f) else None
+
+
+def sort_key(text: str):
+    """Numbers before text (numerically), text case-insensitively, blanks last."""
+    if text == "":
+        return (2, 0.0, "")
+    f = as_number(text)
+    if f is None:
+        return (1, 0.0, text.lower())
+    return (0, f, "")
+
+
+class ViewIndexes:
+    """Sort and group indexes for `sort`, `group` and `stats`.
+
+    Built once per column per load: every row gets a small integer code for
+    its value, and every distinct value a rank in sort order. Sorting or
+    grouping any filtered view then only looks up those arrays for the ids in
+    the view instead of touching row dicts; the unfiltered view uses the
+    cached full order and counts directly, and the last sorted filtered view
+    is kept until the filter or the sort changes.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.codes: Dict[str, array] = {}
+        self.values: Dict[str, List[str]] = {}
+        self.vrank: Dict[str, array] = {}
+        self.totals: Dict[str, Counter] = {}
+        self.orders: Dict[tuple, List[int]] = {}
+        self._view: Optional[tuple] = None
+
+    def ensure(self, cols: Sequence[str]) -> None:
+        need = [c for c in dict.fromkeys(cols) if c not in self.codes]
+        if not need:
+            return
+        for c, vals in self.store.column_values(need).items():
+            lookup: Dict[str, int] = {}
+            codes = array("i", [0])  # slot 0 unused: row ids are 1-based
+            for v in vals:
+                code = lookup.get(v)
+                if code is None:
+                    code = lookup[v] = len(lookup)
+                codes.append(code)
+            distinct = list(lookup)
+            vrank = array("i", bytes(4 * len(distinct)))
+            for r, k in enumerate(sorted(range(len(distinct)), key=lambda k: sort_key(distinct[k]))):
+                vrank[k] = r
+            self.codes[c], self.values[c], self.vrank[c] = codes, distinct, vrank
+            self.totals[c] = Counter(codes[1:])
+
+    def _is_full(self, ids: Sequence[int]) -> bool:
+        return isinstance(ids, range) and len(ids) == len(next(iter(self.codes.values()))) - 1
+
+    def sort(self, ids: Sequence[int], col: str, desc: bool = False) -> List[int]:
+        self.ensure([col])
+        codes, vrank = self.codes[col], self.vrank[col]
+        key = lambda i: vrank[codes[i]]
+        if self._is_full(ids):
+            if (col, desc) not in self.orders:
+                self.orders[(col, desc)] = sorted(ids, key=key, reverse=desc)
+            return self.orders[(col, desc)]
+        view = self._view
+        if view is not None and view[0] is ids and view[1:3] == (col, desc):
+            return view[3]
+        out = sorted(ids, key=key, reverse=desc)
+        self._view = (ids, col, desc, out)
+        return out
+
+    def group(self, ids: Sequence[int], col: str) -> List[tuple]:
+        """[(value, count)] for the view, largest groups first."""
+        self.ensure([col])
+        codes, values = self.codes[col], self.values[col]
+        counts = self.totals[col] if self._is_full(ids) else Counter(codes[i] for i in ids)
+        return [(values[k], n) for k, n in counts.most_common()]
+
+    def stats(self, ids: Sequence[int], cols: Sequence[str]) -> List[Dict[str, Any]]:
+        self.ensure(cols)
+        out = []
         for c in cols:
-            v = r.get(c, "")
-            if isinstance(v, (list, tuple)):
-                v = ", ".join(str(x) for x in v)
-            hay.append(str(v))
-        if any(n in h.lower() for h in hay):
-            out.append(r)
-    return out
+            groups = self.group(ids, c)
+            filled = [(v, n) for v, n in groups if v != ""]
+            nums = []
+            for v, _ in filled:
+                f = as_number(v)
+                if f is None:
+                    nums = None
+                    break
+                nums.append(f)
+            out.append({"column": c, "distinct": len(filled), "empty": sum(n for v, n in groups if v == ""),
+                        "top": filled[:3], "min": min(nums) if nums else None, "max": max(nums) if nums else None})
+        return out
+
+
+def render_groups(col: str, groups: List[tuple], total: int, limit: int = 50) -> str:
+    width = min(MAX_COL_WIDTH, max([len(col)] + [len(v or "(empty)") for v, _ in groups[:limit]]))
+    lines = [f"{col.ljust(width)} | {'count':>8} | {'%':>6}", "-" * (width + 20)]
+    for v, n in groups[:limit]:
+        lines.append(f"{truncate(v or '(empty)', width).ljust(width)} | {n:>8} | {100.0 * n / max(1, total):>5.1f}%")
+    if len(groups) > limit:
+        lines.append(f"… {len(groups) - limit} more groups")
+    lines.append(f"{len(groups)} groups, {total} rows")
+    return "\n".join(lines)
+
+
+def render_stats(stats: List[Dict[str, Any]], total: int) -> str:
+    lines = [f"{total} rows in view"]
+    for st in stats:
+        top = ", ".join(f"{truncate(v, 24)} ({n})" for v, n in st["top"])
+        rng = f"  range {st['min']:g}..{st['max']:g}" if st["min"] is not None else ""
+        lines.append(f"  {st['column']}: {st['distinct']} distinct, {st['empty']} empty{rng}  top: {top}")
+    return "\n".join(lines)
 
 
 def main() -> None:
     ap = argparse.ArgumentParser(description="Simple inventory viewer")
-    ap.add_argument("json_path", help="Path to inventory.json")
+    ap.add_argument("json_path", help="Path to inventory.json or inventory.ndjson")
     ap.add_argument("--columns", help="Comma-separated list of columns to display")
     ap.add_argument("--page-size", type=int, default=PAGE_SIZE_DEFAULT, help="Rows per page")
     ap.add_argument("--width", type=int, default=120, help="Target terminal width for rendering")
+    ap.add_argument("--build-index", action="store_true", help="Build the search sidecar (<name>.viewer.db) before viewing")
+    ap.add_argument("--no-index", action="store_true", help="Ignore the sidecar and load the JSON into memory")
     args = ap.parse_args()
 
-    rows = load_rows(args.json_path)
-    cols = pick_columns(rows, args.columns.split(",") if args.columns else None)
+    if args.build_index:
+        if not INDEX_AVAILABLE:
+            sys.stderr.write("ERROR: modules/export/viewer_index.py not found next to the viewer\n")
+            sys.exit(2)
+        src = open_store(args.json_path, use_index=False)
+        n = build_index(src.iter_rows if hasattr(src, "iter_rows") else (lambda: iter(src.rows)),
+                        sidecar_path(args.json_path), source=args.json_path)
+        src.close()
+        print(f"Indexed {n} rows into {sidecar_path(args.json_path)}")
+
+    store = open_store(args.json_path, use_index=not args.no_index)
+    cols = pick_columns(store, args.columns.split(",") if args.columns else None)
     page = 1
     page_size = max(1, args.page_size)
-    current = rows
+    current = None  # None: every row, including ones still being located
+    widths = view_widths(store, range(1, 201), cols, args.width)
     filter_text = ""
+    indexes = ViewIndexes(store)
+    sort_col, sort_desc = None, False
+    show = True
 
     while True:
-        rendered, total_pages = render_page(current, cols, page, page_size, args.width)
-        print(rendered)
+        ids = current if current is not None else range(1, store.count() + 1)
+        if sort_col:
+            ids = indexes.sort(ids, sort_col, sort_desc)
+        if show:
+            rendered, total_pages = render_page(store, ids, cols, page, page_size, args.width, widths)
+            print(rendered)
+        show = True
         try:
             cmd = input("> ").strip()
         except (EOFError, KeyboardInterrupt):
@@ -207,19 +613,45 @@ def main() -> None:
         elif cmd.startswith("g "):
             try:
                 num = int(cmd.split(None, 1)[1])
+                if current is None and getattr(store, "loading", False):
+                    # Past the rows located so far: wait for the background index
+                    total_pages = max(1, (store.wait_for(num * page_size) + page_size - 1) // page_size)
                 page = max(1, min(num, total_pages))
             except Exception:
                 print("Invalid page number")
         elif cmd.startswith("f "):
             filter_text = cmd.split(None, 1)[1].strip()
-            current = filter_rows(rows, cols, filter_text)
+            current = filter_rows(store, cols, filter_text)
+            widths = view_widths(store, current, cols, args.width)
             page = 1
         elif cmd == "c":
             filter_text = ""
-            current = rows
+            current = None
+            widths = view_widths(store, range(1, 201), cols, args.width)
+            page = 1
+        elif cmd == "sort" or cmd.startswith("sort "):
+            arg = cmd[4:].strip()
+            desc = arg.startswith("-")
+            col = arg.lstrip("-")
+            if col and col not in store.columns():
+                print(f"Unknown column: {col}")
+                show = False
+                continue
+            sort_col, sort_desc = (col or None), desc
             page = 1
+        elif cmd.startswith("group "):
+            col = cmd.split(None, 1)[1].strip()
+            if col not in store.columns():
+                print(f"Unknown column: {col}")
+            else:
+                print(render_groups(col, indexes.group(ids, col), len(ids)))
+            show = False
+        elif cmd == "stats":
+            print(render_stats(indexes.stats(ids, cols), len(ids)))
+            show = False
         else:
-            print("Unknown command. Use: n, p, g <num>, f <text>, c, q")
+            print("Unknown command. Use: n, p, g <num>, f <text>, c, sort <col>, group <col>, stats, q")
+    store.close()
 
 
 if __name__ == "__main__":
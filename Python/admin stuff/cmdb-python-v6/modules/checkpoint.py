@@ -0,0 +1,85 @@
+from typing import Dict, Any
+import json, os, threading
+
+class Journal:
+    """Append-only NDJSON log of completed hosts, used by --resume.
+
+    Each line is a full (unfiltered) row. Rows with an `error` are not
+    journaled, so a resumed run retries those hosts. A torn last line from a
+    crash is ignored on load and cut off when the journal is reopened. The
+    file is fsync'ed every `fsync_every` rows so a VPN drop or killed CI job
+    loses at most that many hosts.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 25):
+        self.path = path
+        self.fsync_every = max(1, fsync_every)
+        self.lock = threading.Lock()
+        self.f = None
+        self.pending = 0
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        done: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                host = (row.get('host') or '').lower() if isinstance(row, dict) else ''
+                if host and not row.get('error'):
+                    done[host] = row
+        return done
+
+    def open(self, resume: bool = False):
+        d = os.path.dirname(self.path)
+        if d: os.makedirs(d, exist_ok=True)
+        if resume:
+            self._truncate_torn_tail()
+        self.f = open(self.path, 'a' if resume else 'w', encoding='utf-8')
+
+    def _truncate_torn_tail(self):
+        # Appending after a half-written line would glue the next row onto it
+        try:
+            with open(self.path, 'rb+') as f:
+                size = f.seek(0, os.SEEK_END)
+                pos = size
+                while pos > 0:
+                    step = min(pos, 65536)
+                    f.seek(pos - step)
+                    nl = f.read(step).rfind(b"\n")
+                    if nl >= 0:
+                        pos = pos - step + nl + 1
+                        break
+                    pos -= step
+                if pos < size:
+                    f.truncate(pos)
+        except FileNotFoundError:
+            pass
+
+    def append(self, row: Dict[str, Any]):
+        if row.get('error'):
+            return
+        with self.lock:
+            self.f.write(json.dumps(row, default=str) + "\n")
+            self.f.flush()
+            self.pending += 1
+            if self.pending >= self.fsync_every:
+                os.fsync(self.f.fileno())
+                self.pending = 0
+
+    def close(self):
+        with self.lock:
+            if self.f and not self.f.closed:
+                self.f.flush()
+                os.fsync(self.f.fileno())
+                self.f.close()
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
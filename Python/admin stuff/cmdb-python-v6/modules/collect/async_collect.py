@@ -0,0 +1,314 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, time
+
+from modules.collect.session import HostSession, precheck_ports, classify_by_ports, uses_session, _cred, _sh_batch, _split_sections
+from modules.concurrency import _is_timeout
+from modules.discovery.tcp_scan import _connect, OPEN
+from modules.timing import timings
+
+try:
+    import asyncssh
+    ASYNCSSH_AVAILABLE = True
+except Exception:
+    ASYNCSSH_AVAILABLE = False
+
+try:
+    import resource
+except Exception:
+    resource = None
+
+def raise_nofile_limit(wanted: int) -> int:
+    """Lift the soft open-files limit towards `wanted` (capped at the hard
+    limit); each host in flight holds at least one socket."""
+    if resource is None:
+        return 0
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+    if soft != resource.RLIM_INFINITY and soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            pass
+    return soft
+
+async def probe_ports_async(host: str, ports: List[int], timeout: float = 1.0) -> List[int]:
+    """probe_ports() on the event loop: connect to all `ports` at once."""
+    states = await asyncio.gather(*(_connect(host, int(p), timeout) for p in ports))
+    return sorted(int(p) for p, state in zip(ports, states) if state == OPEN)
+
+class _NeedsSession(Exception):
+    pass
+
+class _Replay:
+    """Stands in for HostSession while a collector runs on a worker thread.
+
+    run_sh()/run_ps() answer from batches the event loop already fetched.
+    An unknown batch is recorded as missing and answered with empty sections
+    so the collector runs to completion; the engine then fetches the first
+    missing batch and runs the collector again. A fetch that failed is
+    re-raised at the same call, so collectors report it as they would with a
+    live session. Collectors that reach for the raw connection (ssh() /
+    winrm()) are run on a real HostSession instead.
+    """
+
+    def __init__(self, known: Dict[Tuple, Any]):
+        self.known = known
+        self.missing: List[Tuple[Tuple, str, Dict[str, str]]] = []
+        self.needs_session = False
+        self.round_trips = 0
+
+    def _answer(self, kind: str, commands: Dict[str, str]) -> Dict[str, str]:
+        key = (kind, tuple(sorted(commands.items())))
+        if key in self.known:
+            out = self.known[key]
+            if isinstance(out, BaseException):
+                raise out
+            self.round_trips += 1
+            return dict(out)
+        if all(m[0] != key for m in self.missing):
+            self.missing.append((key, kind, dict(commands)))
+        return {name: '' for name in commands}
+
+    def run_sh(self, commands: Dict[str, str]) -> Dict[str, str]:
+        return self._answer('sh', commands)
+
+    def run_ps(self, commands: Dict[str, str]) -> Dict[str, str]:
+        return self._answer('ps', commands)
+
+    def ssh(self):
+        self.needs_session = True
+        raise _NeedsSession("collector uses the SSH client directly")
+
+    def winrm(self):
+        self.needs_session = True
+        raise _NeedsSession("collector uses the WinRM protocol directly")
+
+    def close(self):
+        pass
+
+class _AsyncSsh:
+    """One asyncssh connection per host, opened on first use."""
+
+    def __init__(self, host: str, lcfg: Dict[str, Any]):
+        self.host = host
+        self.lcfg = lcfg
+        self.timeout = float(lcfg.get('timeout', 10))
+        self.conn = None
+
+    async def run(self, kind: str, commands: Dict[str, str]) -> Dict[str, str]:
+        if self.conn is None:
+            # Host keys are not checked, as with paramiko's AutoAddPolicy in HostSession
+            opts = {'port': int(self.lcfg.get('port', 22)), 'known_hosts': None,
+                    'connect_timeout': self.timeout, 'login_timeout': self.timeout}
+            user = _cred(self.lcfg, 'username', 'SSH_USER')
+            password = _cred(self.lcfg, 'password', 'SSH_PASSWORD')
+            if user: opts['username'] = user
+            if password: opts['password'] = password
+            if self.lcfg.get('key_filename'): opts['client_keys'] = [self.lcfg['key_filename']]
+            self.conn = await asyncssh.connect(self.host, **opts)
+        res = await asyncio.wait_for(self.conn.run(_sh_batch(commands), check=False, errors='replace'), self.timeout * 3)
+        return _split_sections(res.stdout or '')
+
+    async def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            try: await self.conn.wait_closed()
+            except Exception: pass
+            self.conn = None
+
+class _ThreadedSession:
+    """HostSession driven from the loop through the bounded blocking pool
+    (WinRM, and SSH when asyncssh is not installed)."""
+
+    def __init__(self, engine: "AsyncCollector", host: str, wcfg: Dict[str, Any], lcfg: Dict[str, Any]):
+        self.engine = engine
+        self.session = HostSession(host, wcfg, lcfg)
+
+    async def run(self, kind: str, commands: Dict[str, str]) -> Dict[str, str]:
+        return await self.engine.blocking(self.session.run_ps if kind == 'ps' else self.session.run_sh, commands)
+
+    async def close(self):
+        await self.engine.blocking(self.session.close)
+
+class AsyncCollector:
+    """Collection engine for --engine async.
+
+    Hosts are coroutines on one event loop, so thousands can wait on the
+    network at once without a thread each. SSH goes through asyncssh when it
+    is installed. WinRM (pywinrm is blocking) and SSH without asyncssh run
+    on a bounded `blocking_threads` pool. Collectors that declare the
+    session contract (session.uses_session) run on a small CPU pool against
+    a replay session (see _Replay), so rows are identical to the threaded
+    engine. Collectors that open their own connections cannot be driven from
+    the loop and run unchanged on the blocking pool.
+
+    Limits (collect.async config): `max_in_flight` hosts overall,
+    `ssh` / `winrm` sessions per protocol and `per_host` sessions per
+    address. A collector that needs more than `max_rounds` command
+    batches, or a session feature the replay cannot serve, runs on the
+    blocking pool against a real HostSession.
+    """
+
+    def __init__(self, cfg: Dict[str, Any], collectors: Dict[str, Callable[[str, Dict[str, Any]], Dict[str, Any]]]):
+        cfg = cfg or {}
+        self.collectors = collectors
+        self.max_in_flight = max(1, int(cfg.get('max_in_flight', 2000)))
+        self.per_host = max(1, int(cfg.get('per_host', 1)))
+        self.blocking_threads = max(1, int(cfg.get('blocking_threads', 64)))
+        self.cpu_threads = max(1, int(cfg.get('cpu_threads', 4)))
+        self.max_rounds = max(1, int(cfg.get('max_rounds', 8)))
+        self.use_asyncssh = ASYNCSSH_AVAILABLE and cfg.get('asyncssh', True)
+        self.replay = {p: uses_session(collectors[k]) for p, k in (('ssh', 'linux'), ('winrm', 'windows'))}
+        ssh_default = self.max_in_flight if self.use_asyncssh and self.replay['ssh'] else self.blocking_threads
+        self.limits = {'ssh': max(1, int(cfg.get('ssh') or ssh_default)),
+                       'winrm': max(1, int(cfg.get('winrm') or self.blocking_threads))}
+        self.stats = {p: {'in_flight': 0, 'peak': 0, 'completed': 0, 'errors': 0, 'timeouts': 0, 'fallbacks': 0}
+                      for p in self.limits}
+        self.host_sems: Dict[str, Tuple[asyncio.Semaphore, List[int]]] = {}
+        self.sems: Dict[str, asyncio.Semaphore] = {}
+        self._cpu: Optional[ThreadPoolExecutor] = None
+        self._blocking: Optional[ThreadPoolExecutor] = None
+        self.nofile = 0
+
+    def open(self):
+        """Call from inside the event loop before the first collect()."""
+        self.sems = {p: asyncio.Semaphore(n) for p, n in self.limits.items()}
+        self._cpu = ThreadPoolExecutor(max_workers=self.cpu_threads, thread_name_prefix="async-cpu")
+        self._blocking = ThreadPoolExecutor(max_workers=self.blocking_threads, thread_name_prefix="async-io")
+        self.nofile = raise_nofile_limit(self.max_in_flight * 2 + 256)
+
+    def close(self):
+        for ex in (self._cpu, self._blocking):
+            if ex is not None:
+                ex.shutdown(wait=True)
+
+    async def blocking(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._blocking, fn, *args)
+
+    async def cpu(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._cpu, fn, *args)
+
+    def _host_sem(self, host: str) -> Tuple[asyncio.Semaphore, List[int]]:
+        entry = self.host_sems.get(host)
+        if entry is None:
+            entry = self.host_sems[host] = (asyncio.Semaphore(self.per_host), [0])
+        entry[1][0] += 1
+        return entry
+
+    def _release_host(self, host: str):
+        entry = self.host_sems.get(host)
+        if entry is not None:
+            entry[1][0] -= 1
+            if not entry[1][0]:
+                del self.host_sems[host]
+
+    def _session(self, proto: str, host: str, ccfg: Dict[str, Any]):
+        if proto == 'ssh' and self.use_asyncssh:
+            return _AsyncSsh(host, ccfg)
+        return _ThreadedSession(self, host, ccfg if proto == 'winrm' else {}, ccfg if proto == 'ssh' else {})
+
+    def _direct(self, collector: Callable, host: str, ccfg: Dict[str, Any], proto: str) -> Dict[str, Any]:
+        # Blocking pool: the collector drives a real HostSession itself
+        session = HostSession(host, ccfg if proto == 'winrm' else {}, ccfg if proto == 'ssh' else {})
+        try:
+            return collector(host, dict(ccfg, __session__=session))
+        finally:
+            session.close()
+
+    async def _collect_with(self, proto: str, host: str, ccfg: Dict[str, Any]) -> Dict[str, Any]:
+        collector = self.collectors['windows' if proto == 'winrm' else 'linux']
+        st = self.stats[proto]
+        sem, _ = self._host_sem(host)
+        try:
+            async with self.sems[proto], sem:
+                st['in_flight'] += 1; st['peak'] = max(st['peak'], st['in_flight'])
+                t0 = time.perf_counter()
+                try:
+                    if self.replay[proto]:
+                        data = await self._rounds(collector, proto, host, ccfg)
+                    else:
+                        # Opens its own connections: run it as is on the blocking pool
+                        data = await self.blocking(collector, host, dict(ccfg, __session__=None))
+                finally:
+                    st['in_flight'] -= 1
+                    timings.record(host, proto, time.perf_counter() - t0)
+        finally:
+            self._release_host(host)
+        st['completed'] += 1
+        if data and data.get('error'):
+            st['errors'] += 1
+            st['timeouts'] += 1 if _is_timeout(data.get('error')) else 0
+        return data
+
+    async def _rounds(self, collector: Callable, proto: str, host: str, ccfg: Dict[str, Any]) -> Dict[str, Any]:
+        known: Dict[Tuple, Any] = {}
+        session = None
+        try:
+            for _ in range(self.max_rounds):
+                replay = _Replay(known)
+                try:
+                    data = await self.cpu(collector, host, dict(ccfg, __session__=replay))
+                except Exception:
+                    if not replay.missing and not replay.needs_session:
+                        raise
+                    data = None
+                if replay.needs_session:
+                    self.stats[proto]['fallbacks'] += 1
+                    return await self.blocking(self._direct, collector, host, ccfg, proto)
+                if not replay.missing:
+                    return data
+                # Later batches may depend on this one's output: fetch one per round
+                key, kind, commands = replay.missing[0]
+                session = session or self._session(proto, host, ccfg)
+                try:
+                    known[key] = await session.run(kind, commands)
+                except Exception as e:
+                    known[key] = e
+        finally:
+            if session is not None:
+                await session.close()
+        # More batches than max_rounds: replaying would cost a collector run
+        # per batch, so run it once against a real session instead
+        self.stats[proto]['fallbacks'] += 1
+        return await self.blocking(self._direct, collector, host, ccfg, proto)
+
+    async def collect(self, host: str, addr: str, os_name: Optional[str], wcfg: Dict[str, Any], lcfg: Dict[str, Any],
+                      feats: Dict[str, Any], scfg: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Same OS selection, pre-check and WinRM-then-SSH fallback as
+        collect_one(); returns (collector data, os_name)."""
+        data: Dict[str, Any] = {}
+        probed = False
+        open_ports: List[int] = []
+        winrm_ports, ssh_ports = precheck_ports(wcfg, lcfg)
+        if os_name is None and scfg.get('precheck', True):
+            ports = winrm_ports + ssh_ports
+            t0 = time.perf_counter()
+            open_ports = await probe_ports_async(addr, ports, float(scfg.get('precheck_timeout', 1.0)))
+            timings.record(host, 'precheck', time.perf_counter() - t0)
+            os_name = classify_by_ports(open_ports, winrm_ports, ssh_ports); probed = True
+            if os_name is None:
+                data = {'error': f"no WinRM/SSH port open ({', '.join(str(p) for p in ports)})"}
+
+        fallback = os_name is None and not probed
+        if os_name == 'windows' or fallback:
+            if feats.get('windows', True):
+                data = await self._collect_with('winrm', host, wcfg)
+                os_name = 'windows'
+                # A probed "Windows" host may be Linux with OMI on the WinRM port
+                fallback = fallback or (probed and bool((data or {}).get('error')) and any(p in open_ports for p in ssh_ports))
+            if fallback and (not data or data.get('error')) and feats.get('linux', True):
+                data = await self._collect_with('ssh', host, lcfg)
+                os_name = 'linux'
+        elif os_name == 'linux':
+            if feats.get('linux', True):
+                data = await self._collect_with('ssh', host, lcfg)
+        return data, os_name
+
+    def summary(self) -> Dict[str, Any]:
+        return {'mode': 'async', 'ssh_transport': 'asyncssh' if self.use_asyncssh else 'threads',
+                'max_in_flight': self.max_in_flight, 'open_files_limit': self.nofile,
+                'limiters': {p: {'limit': self.limits[p], 'replay': self.replay[p], 'completed': s['completed'], 'errors': s['errors'],
+                                 'timeouts': s['timeouts'], 'fallbacks': s['fallbacks']} for p, s in self.stats.items()},
+                'peak_limits': {p: s['peak'] for p, s in self.stats.items()}}
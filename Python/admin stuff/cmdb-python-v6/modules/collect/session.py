@@ -0,0 +1,236 @@
+from typing import Dict, Any, List, Optional, Tuple
+import base64, json, os, select, socket, sys, threading, time
+
+try:
+    from winrm.protocol import Protocol
+    WINRM_AVAILABLE = True
+except Exception:
+    WINRM_AVAILABLE = False
+
+try:
+    import paramiko
+    PARAMIKO_AVAILABLE = True
+except Exception:
+    PARAMIKO_AVAILABLE = False
+
+WINRM_PORTS = (5985, 5986)
+SSH_PORT = 22
+_MARK = "__CMDB_SECTION__"
+
+def probe_ports(host: str, ports: List[int], timeout: float = 1.0) -> List[int]:
+    """Non-blocking connect to all `ports` at once; returns the ones that accepted."""
+    socks = {}
+    try:
+        addr = socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)[0]
+    except OSError:
+        return []
+    family, ip = addr[0], addr[4][0]
+    for port in ports:
+        s = socket.socket(family, socket.SOCK_STREAM)
+        s.setblocking(False)
+        try:
+            s.connect_ex((ip, port))
+            socks[s] = port
+        except OSError:
+            s.close()
+    open_ports = []
+    deadline = time.monotonic() + timeout
+    try:
+        while socks:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            _, writable, _ = select.select([], list(socks), [], left)
+            for s in writable:
+                if s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    open_ports.append(socks[s])
+                s.close(); del socks[s]
+    finally:
+        for s in socks:
+            s.close()
+    return sorted(open_ports)
+
+def precheck_ports(wcfg: Dict[str, Any], lcfg: Dict[str, Any]) -> Tuple[List[int], List[int]]:
+    """(WinRM ports, SSH ports) to probe: the ports the collectors will
+    actually connect to (collect.windows.port / ssl, collect.linux.port)."""
+    wcfg = wcfg or {}; lcfg = lcfg or {}
+    winrm = int(wcfg.get('port') or (5986 if wcfg.get('ssl') else 5985))
+    return [winrm], [int(lcfg.get('port') or SSH_PORT)]
+
+def classify_by_ports(open_ports: List[int], winrm_ports=WINRM_PORTS, ssh_ports=(SSH_PORT,)) -> Optional[str]:
+    # Windows hosts may also run OpenSSH, so WinRM wins
+    if any(p in open_ports for p in winrm_ports):
+        return 'windows'
+    if any(p in open_ports for p in ssh_ports):
+        return 'linux'
+    return None
+
+def uses_session(collector) -> bool:
+    """True when a collector reads cfg['__session__'] and sends its commands
+    through run_ps()/run_sh(): it sets `uses_session = True` on the
+    function or `USES_SESSION = True` in its module."""
+    if getattr(collector, 'uses_session', False):
+        return True
+    return bool(getattr(sys.modules.get(getattr(collector, '__module__', None) or ''), 'USES_SESSION', False))
+
+class OsCache:
+    """host -> 'windows' | 'linux' learned from pre-checks and successful
+    collections; optionally persisted so the next run skips the probe."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data: Dict[str, str] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.data = json.load(f) or {}
+            except Exception:
+                self.data = {}
+
+    def get(self, host: str) -> Optional[str]:
+        with self.lock:
+            return self.data.get((host or '').lower())
+
+    def set(self, host: str, os_name: str):
+        with self.lock:
+            self.data[(host or '').lower()] = os_name
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            data = dict(self.data)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+def _cred(cfg: Dict[str, Any], key: str, env: str) -> Optional[str]:
+    return cfg.get(key) or os.environ.get(env)
+
+class HostSession:
+    """One authenticated WinRM shell and/or SSH connection for a host.
+
+    Collectors that declare it (see uses_session()) receive it as
+    `cfg['__session__']` and call run_ps()/run_sh() with a dict of named
+    commands; every batch goes over the already open
+    connection as a single remote script and comes back split by name.
+    Connections are opened on first use and closed by close().
+    """
+
+    def __init__(self, host: str, wcfg: Dict[str, Any] = None, lcfg: Dict[str, Any] = None):
+        self.host = host
+        self.wcfg = wcfg or {}
+        self.lcfg = lcfg or {}
+        self._winrm: Optional[Tuple[Any, str]] = None
+        self._ssh = None
+        self.round_trips = 0
+
+    # --- WinRM ---------------------------------------------------------
+    def winrm(self) -> Tuple[Any, str]:
+        """(Protocol, shell_id) for this host, opened once."""
+        if self._winrm is None:
+            if not WINRM_AVAILABLE:
+                raise RuntimeError("pywinrm not installed")
+            ssl = bool(self.wcfg.get('ssl', False))
+            port = int(self.wcfg.get('port') or (5986 if ssl else 5985))
+            endpoint = f"{'https' if ssl else 'http'}://{self.host}:{port}/wsman"
+            p = Protocol(endpoint=endpoint,
+                         transport=self.wcfg.get('transport', 'ntlm'),
+                         username=_cred(self.wcfg, 'username', 'WINRM_USER'),
+                         password=_cred(self.wcfg, 'password', 'WINRM_PASSWORD'),
+                         server_cert_validation='validate' if self.wcfg.get('verify_ssl', False) else 'ignore',
+                         operation_timeout_sec=int(self.wcfg.get('timeout', 20)),
+                         read_timeout_sec=int(self.wcfg.get('timeout', 20)) + 10)
+            self._winrm = (p, p.open_shell())
+        return self._winrm
+
+    def run_ps(self, commands: Dict[str, str]) -> Dict[str, str]:
+        """Run named PowerShell snippets as one script; returns {name: stdout}."""
+        encoded = _ps_batch(commands)
+        p, shell_id = self.winrm()
+        cmd_id = p.run_command(shell_id, 'powershell', ['-NoProfile', '-NonInteractive', '-EncodedCommand', encoded])
+        try:
+            out, err, rc = p.get_command_output(shell_id, cmd_id)
+        finally:
+            p.cleanup_command(shell_id, cmd_id)
+        self.round_trips += 1
+        if rc != 0 and not out:
+            raise RuntimeError((err or b'').decode('utf-8', 'replace').strip() or f"powershell exited {rc}")
+        return _split_sections(out.decode('utf-8', 'replace'))
+
+    # --- SSH -----------------------------------------------------------
+    def ssh(self):
+        if self._ssh is None:
+            if not PARAMIKO_AVAILABLE:
+                raise RuntimeError("paramiko not installed")
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            timeout = float(self.lcfg.get('timeout', 10))
+            client.connect(self.host, port=int(self.lcfg.get('port', 22)),
+                           username=_cred(self.lcfg, 'username', 'SSH_USER'),
+                           password=_cred(self.lcfg, 'password', 'SSH_PASSWORD'),
+                           key_filename=self.lcfg.get('key_filename'),
+                           timeout=timeout, banner_timeout=timeout, auth_timeout=timeout,
+                           allow_agent=True, look_for_keys=True)
+            self._ssh = client
+        return self._ssh
+
+    def run_sh(self, commands: Dict[str, str]) -> Dict[str, str]:
+        """Run named shell commands as one script over one channel; returns {name: stdout}."""
+        _, stdout, _ = self.ssh().exec_command(_sh_batch(commands),
+                                               timeout=float(self.lcfg.get('timeout', 10)) * 3)
+        out = stdout.read().decode('utf-8', 'replace')
+        self.round_trips += 1
+        return _split_sections(out)
+
+    def close(self):
+        if self._winrm is not None:
+            p, shell_id = self._winrm
+            try: p.close_shell(shell_id)
+            except Exception: pass
+            self._winrm = None
+        if self._ssh is not None:
+            try: self._ssh.close()
+            except Exception: pass
+            self._ssh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _sh_quote(s: str) -> str:
+    return "'" + s.replace("'", "'\"'\"'") + "'"
+
+def _sh_batch(commands: Dict[str, str]) -> str:
+    """One `sh -c` command line running every named command behind a section marker."""
+    parts = []
+    for name, cmd in commands.items():
+        parts.append(f"echo '{_MARK}{name}'")
+        parts.append(f"( {cmd} ) 2>/dev/null")
+    return "sh -c " + _sh_quote("\n".join(parts))
+
+def _ps_batch(commands: Dict[str, str]) -> str:
+    """Base64 (UTF-16LE) script for `powershell -EncodedCommand`, one section per named snippet."""
+    parts = []
+    for name, script in commands.items():
+        parts.append(f"Write-Output '{_MARK}{name}'")
+        parts.append(f"try {{ & {{ {script} }} | Out-String -Width 4096 }} catch {{ Write-Output \"ERROR: $($_.Exception.Message)\" }}")
+    return base64.b64encode("\n".join(parts).encode('utf-16-le')).decode('ascii')
+
+def _split_sections(out: str) -> Dict[str, str]:
+    sections: Dict[str, str] = {}
+    name = None; buf: List[str] = []
+    for line in out.splitlines():
+        if line.startswith(_MARK):
+            if name is not None:
+                sections[name] = "\n".join(buf).strip()
+            name = line[len(_MARK):].strip(); buf = []
+        elif name is not None:
+            buf.append(line)
+    if name is not None:
+        sections[name] = "\n".join(buf).strip()
+    return sections
@@ -0,0 +1,148 @@
+from typing import Dict, Any, List, Optional
+from collections import deque
+import time
+
+def _is_timeout(error: Any) -> bool:
+    text = str(error or '').lower()
+    return 'timed out' in text or 'timeout' in text
+
+class AimdLimiter:
+    """Additive-increase / multiplicative-decrease concurrency limit.
+
+    The limit grows by roughly one slot per full window of healthy
+    completions and is cut by `decrease` on a timeout, when the error rate
+    over the last `window` hosts exceeds `error_threshold`, or when the
+    latency EWMA rises above `latency_factor` times the best EWMA seen.
+    Decreases are rate limited by `cooldown_s` so one burst of slow hosts
+    does not collapse the pool.
+    """
+
+    def __init__(self, name: str, initial: int = 8, minimum: int = 2, maximum: int = 64,
+                 decrease: float = 0.7, latency_factor: float = 2.0, error_threshold: float = 0.5,
+                 window: int = 20, cooldown_s: float = 2.0):
+        self.name = name
+        self.minimum, self.maximum = max(1, int(minimum)), max(1, int(maximum))
+        self.limit = float(min(max(int(initial), self.minimum), self.maximum))
+        self.peak = int(self.limit)
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.error_threshold = error_threshold
+        self.cooldown_s = cooldown_s
+        self.recent = deque(maxlen=max(1, window))
+        self.in_flight = 0
+        self.completed = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.ewma: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.last_decrease = 0.0
+
+    def can_start(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def started(self):
+        self.in_flight += 1
+
+    def finished(self, latency: float, error: Any = None):
+        self.in_flight -= 1
+        self.completed += 1
+        timeout = bool(error) and _is_timeout(error)
+        self.errors += 1 if error else 0
+        self.timeouts += 1 if timeout else 0
+        self.recent.append(1 if error else 0)
+        self.ewma = latency if self.ewma is None else 0.8 * self.ewma + 0.2 * latency
+        if self.completed >= 5 and not error:
+            self.baseline = self.ewma if self.baseline is None else min(self.baseline, self.ewma)
+
+        congested = timeout
+        if len(self.recent) == self.recent.maxlen and sum(self.recent) / len(self.recent) > self.error_threshold:
+            congested = True
+        if self.baseline and self.ewma > self.latency_factor * self.baseline:
+            congested = True
+
+        now = time.monotonic()
+        if congested:
+            if now - self.last_decrease >= self.cooldown_s:
+                self.limit = max(float(self.minimum), self.limit * self.decrease)
+                self.last_decrease = now
+        elif not error:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self.peak = max(self.peak, int(self.limit))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'limit': int(self.limit), 'in_flight': self.in_flight, 'completed': self.completed,
+                'errors': self.errors, 'timeouts': self.timeouts,
+                'latency_ewma_s': round(self.ewma, 3) if self.ewma is not None else None}
+
+class ConcurrencyController:
+    """Per-collector limiters plus a throughput curve for tuning.
+
+    Adaptive mode keeps separate Windows and Linux limiters configured from
+    the `concurrency` config section. Fixed mode (--workers N) uses a single
+    limiter pinned at N. Only the scheduling thread touches it, so there is
+    no locking.
+    """
+
+    DEFAULTS = {'windows': {'initial': 8, 'min': 2, 'max': 64},
+                'linux': {'initial': 16, 'min': 2, 'max': 128}}
+
+    def __init__(self, ccfg: Dict[str, Any] = None, fixed: Optional[int] = None):
+        ccfg = ccfg or {}
+        self.adaptive = fixed is None
+        self.limiters: Dict[str, AimdLimiter] = {}
+        if self.adaptive:
+            for name, dflt in self.DEFAULTS.items():
+                c = dict(dflt); c.update(ccfg.get(name) or {})
+                self.limiters[name] = AimdLimiter(
+                    name, c['initial'], c['min'], c['max'],
+                    decrease=float(ccfg.get('decrease', 0.7)),
+                    latency_factor=float(ccfg.get('latency_factor', 2.0)),
+                    error_threshold=float(ccfg.get('error_threshold', 0.5)),
+                    window=int(ccfg.get('window', 20)),
+                    cooldown_s=float(ccfg.get('cooldown_s', 2.0)))
+        else:
+            n = max(1, int(fixed))
+            self.limiters['all'] = AimdLimiter('all', n, n, n)
+        self.sample_interval = float(ccfg.get('sample_interval_s', 5.0))
+        self.started_at = time.monotonic()
+        self.last_sample = self.started_at
+        self.last_completed = 0
+        self.curve: List[Dict[str, Any]] = []
+
+    @property
+    def max_workers(self) -> int:
+        return sum(l.maximum for l in self.limiters.values())
+
+    def classify(self, t: Dict[str, Any]) -> str:
+        """Which limiter a target counts against; mirrors collect_one's routing."""
+        if not self.adaptive:
+            return 'all'
+        hint = (t.get('os_hint') or '').lower(); provider = t.get('provider')
+        if hint == 'windows' or (provider == 'azure' and 'win' in hint):
+            return 'windows'
+        if hint == 'linux' or provider in ('vsphere', 'onprem', 'local-network'):
+            return 'linux'
+        return 'windows'  # unknown OS tries WinRM first
+
+    def tick(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_sample < self.sample_interval:
+            return
+        completed = sum(l.completed for l in self.limiters.values())
+        dt = max(1e-6, now - self.last_sample)
+        self.curve.append({'t_s': round(now - self.started_at, 1),
+                           'hosts_per_s': round((completed - self.last_completed) / dt, 2),
+                           'completed': completed,
+                           'limits': {n: int(l.limit) for n, l in self.limiters.items()},
+                           'in_flight': {n: l.in_flight for n, l in self.limiters.items()}})
+        self.last_sample, self.last_completed = now, completed
+
+    def describe(self) -> str:
+        return " ".join(f"{n}={int(l.limit)}" for n, l in self.limiters.items())
+
+    def summary(self) -> Dict[str, Any]:
+        self.tick(force=True)
+        return {'mode': 'adaptive' if self.adaptive else 'fixed',
+                'limiters': {n: l.snapshot() for n, l in self.limiters.items()},
+                'peak_limits': {n: l.peak for n, l in self.limiters.items()},
+                'curve': self.curve}
@@ -0,0 +1,217 @@
+from typing import Dict, Any, Optional, Tuple
+import json, os, sys, threading, time
+
+from modules.timing import timings
+
+try:
+    from ldap3 import Server, Connection, SUBTREE, DSA, NTLM, SIMPLE
+    LDAP3_AVAILABLE = True
+except Exception:
+    LDAP3_AVAILABLE = False
+
+CACHE_VERSION = 1
+COMPUTER_FILTER = "(objectCategory=computer)"
+ATTRIBUTES = ['dNSHostName', 'sAMAccountName', 'distinguishedName', 'uSNChanged', 'objectGUID']
+
+def ou_of(dn: str) -> str:
+    """CN=web01,OU=Servers,DC=example,DC=local -> OU=Servers,DC=example,DC=local"""
+    i = 0
+    while True:
+        i = dn.find(',', i)
+        if i < 0:
+            return ''
+        if i == 0 or dn[i - 1] != '\\':
+            return dn[i + 1:]
+        i += 1
+
+def _first(v: Any) -> Any:
+    if isinstance(v, (list, tuple)):
+        return v[0] if v else None
+    return v
+
+class AdIndex:
+    """Computer objects under base_dn, keyed by dNSHostName, sAMAccountName
+    (without the trailing $) and short host name, all lowercased.
+
+    Short names that occur in more than one domain are ambiguous and only
+    match through the full DNS name. Built once, read-only afterwards.
+    """
+
+    def __init__(self, computers: Dict[str, Dict[str, Any]]):
+        self.computers = computers
+        self.keys: Dict[str, Optional[str]] = {}
+        short: Dict[str, Optional[str]] = {}
+        for guid, c in computers.items():
+            fqdn = (c.get('dNSHostName') or '').lower().rstrip('.')
+            sam = (c.get('sAMAccountName') or '').lower().rstrip('$')
+            if fqdn:
+                self.keys[fqdn] = guid
+                s = fqdn.split('.', 1)[0]
+                short[s] = guid if short.get(s, guid) == guid else None
+            if sam:
+                short[sam] = guid if short.get(sam, guid) == guid else None
+        for k, guid in short.items():
+            self.keys.setdefault(k, guid)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, host: str) -> Optional[Dict[str, Any]]:
+        h = (host or '').lower().rstrip('.')
+        if not h:
+            return None
+        guid = self.keys.get(h)
+        if guid is None and '.' in h and not h.replace('.', '').isdigit():
+            guid = self.keys.get(h.split('.', 1)[0])
+        return self.computers[guid] if guid is not None else None
+
+    def enrich(self, *names: str) -> Dict[str, Any]:
+        """Same fields as the per-host ad_enrich() lookup: {'ad_ou': ...} or
+        {}. The first of `names` (host, resolved name, ...) found wins."""
+        c = None
+        for name in names:
+            c = self.lookup(name)
+            if c:
+                break
+        with self.lock:
+            if c: self.hits += 1
+            else: self.misses += 1
+        if not c:
+            return {}
+        ou = ou_of(c.get('distinguishedName') or '')
+        return {'ad_ou': ou} if ou else {}
+
+def _connect(ad_cfg: Dict[str, Any]):
+    server = Server(ad_cfg.get('server'), get_info=DSA, connect_timeout=int(ad_cfg.get('timeout', 10)))
+    user = ad_cfg.get('username') or os.environ.get('AD_BIND_USER')
+    password = ad_cfg.get('password') or os.environ.get('AD_BIND_PASSWORD')
+    auth = NTLM if user and '\\' in user else SIMPLE
+    conn = Connection(server, user=user, password=password, authentication=auth if user else None,
+                      auto_bind=True, receive_timeout=int(ad_cfg.get('timeout', 10)) * 3)
+    return server, conn
+
+def _server_state(server) -> Tuple[str, int]:
+    """(DC identity, highestCommittedUSN) from rootDSE. USNs are per DC, so
+    an incremental pull is only valid against the DC that issued them."""
+    other = getattr(server.info, 'other', {}) or {}
+    dc = _first(other.get('dsServiceName')) or ''
+    usn = int(_first(other.get('highestCommittedUSN')) or 0)
+    return str(dc), usn
+
+def _search(conn, base_dn: str, ldap_filter: str, page_size: int) -> Dict[str, Dict[str, Any]]:
+    out: Dict[str, Dict[str, Any]] = {}
+    for e in conn.extend.standard.paged_search(base_dn, ldap_filter, search_scope=SUBTREE, attributes=ATTRIBUTES,
+                                               paged_size=page_size, generator=True):
+        if e.get('type') != 'searchResEntry':
+            continue
+        raw = _first((e.get('raw_attributes') or {}).get('objectGUID'))
+        guid = raw.hex() if isinstance(raw, (bytes, bytearray)) else (e.get('dn') or '').lower()
+        a = e.get('attributes') or {}
+        out[guid] = {'dNSHostName': _first(a.get('dNSHostName')) or '',
+                     'sAMAccountName': _first(a.get('sAMAccountName')) or '',
+                     'distinguishedName': e.get('dn') or _first(a.get('distinguishedName')) or '',
+                     'uSNChanged': int(_first(a.get('uSNChanged')) or 0)}
+    return out
+
+def _load_cache(path: Optional[str]) -> Dict[str, Any]:
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f) or {}
+        return data if data.get('version') == CACHE_VERSION else {}
+    except Exception:
+        return {}
+
+def _save_cache(path: Optional[str], data: Dict[str, Any]):
+    if not path:
+        return
+    d = os.path.dirname(path)
+    if d: os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def fetch_index(ad_cfg: Dict[str, Any], cache_file: Optional[str] = None) -> Tuple[AdIndex, Dict[str, Any]]:
+    """Pull every computer object under base_dn with one paged search (only
+    the attributes the index needs) and return (index, stats).
+
+    With `cache_file`, the objects are kept on disk together with the DC and
+    its highestCommittedUSN; the next run only asks for objects with a higher
+    uSNChanged. Deleted computers do not show up in that query, so a full
+    pull is forced after `index.full_refresh_hours` or when the DC changes.
+    """
+    icfg = ad_cfg.get('index') or {}
+    base_dn = ad_cfg.get('base_dn')
+    page_size = int(icfg.get('page_size', 1000))
+    ldap_filter = icfg.get('filter') or COMPUTER_FILTER
+    max_age = float(icfg.get('full_refresh_hours', 24)) * 3600
+
+    server, conn = _connect(ad_cfg)
+    try:
+        dc, usn = _server_state(server)
+        cache = _load_cache(cache_file)
+        incremental = bool(cache and cache.get('dc') == dc and dc and cache.get('base_dn') == base_dn
+                       and cache.get('filter') == ldap_filter and time.time() - cache.get('full_at', 0) < max_age)
+        if incremental:
+            computers = cache.get('computers') or {}
+            changed = _search(conn, base_dn, f"(&{ldap_filter}(uSNChanged>={int(cache.get('usn', 0)) + 1}))", page_size)
+            computers.update(changed)
+            full_at = cache.get('full_at')
+        else:
+            changed = computers = _search(conn, base_dn, ldap_filter, page_size)
+            full_at = time.time()
+    finally:
+        try: conn.unbind()
+        except Exception: pass
+
+    if cache_file and dc:
+        _save_cache(cache_file, {'version': CACHE_VERSION, 'dc': dc, 'usn': usn, 'base_dn': base_dn,
+                                 'filter': ldap_filter, 'full_at': full_at, 'computers': computers})
+    stats = {'mode': 'incremental' if incremental else 'full', 'computers': len(computers), 'fetched': len(changed)}
+    return AdIndex(computers), stats
+
+class AdPrefetch:
+    """Loads the AdIndex in a background thread so the LDAP pull overlaps
+    with discovery. enrich() waits for it and returns None when the index
+    could not be built (callers then fall back to per-host lookups)."""
+
+    def __init__(self, ad_cfg: Dict[str, Any], cache_file: Optional[str] = None):
+        self.ad_cfg = ad_cfg
+        self.cache_file = cache_file
+        self.index: Optional[AdIndex] = None
+        self.stats: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._load, name="ad-prefetch", daemon=True)
+
+    def start(self) -> "AdPrefetch":
+        self.thread.start()
+        return self
+
+    def _load(self):
+        try:
+            if not LDAP3_AVAILABLE:
+                raise RuntimeError("ldap3 not installed")
+            t0 = time.perf_counter()
+            with timings.phase("ad_prefetch"):
+                self.index, self.stats = fetch_index(self.ad_cfg, self.cache_file)
+            self.stats['seconds'] = round(time.perf_counter() - t0, 3)
+        except Exception as e:
+            self.error = str(e)
+            print(f"AD prefetch failed, falling back to per-host lookups: {e}", file=sys.stderr)
+        finally:
+            self.ready.set()
+
+    def enrich(self, *names: str) -> Optional[Dict[str, Any]]:
+        self.ready.wait()
+        return self.index.enrich(*names) if self.index is not None else None
+
+    def summary(self) -> Dict[str, Any]:
+        out = dict(self.stats)
+        if self.index is not None:
+            out.update(hits=self.index.hits, misses=self.index.misses)
+        if self.error:
+            out['error'] = self.error
+        return out
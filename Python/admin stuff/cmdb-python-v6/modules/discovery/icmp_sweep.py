@@ -0,0 +1,125 @@
+from typing import Iterable, List, Tuple
+import asyncio, os, socket, struct
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def _echo_packet(ident: int, seq: int) -> bytes:
+    payload = b'cmdb-sweep'
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    csum = _checksum(header + payload)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, csum, ident, seq) + payload
+
+def _parse_reply(data: bytes, raw: bool):
+    # Raw sockets hand us the IPv4 header as well; datagram sockets do not
+    if raw:
+        if len(data) < 20: return None
+        data = data[(data[0] & 0x0F) * 4:]
+    if len(data) < 8: return None
+    icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+    if icmp_type != ICMP_ECHO_REPLY: return None
+    return ident, seq
+
+def open_icmp_socket() -> Tuple[socket.socket, bool]:
+    """Return (socket, is_raw). Raises OSError when neither raw nor
+    unprivileged ICMP datagram sockets are permitted."""
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        raw = True
+    except (PermissionError, OSError):
+        # Linux: allowed when the gid is inside net.ipv4.ping_group_range
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        raw = False
+    sock.setblocking(False)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    except OSError:
+        pass
+    return sock, raw
+
+async def _sweep(sock: socket.socket, raw: bool, ips: Iterable[str], timeout_ms: int,
+                 rate_pps: int, batch_size: int) -> List[str]:
+    loop = asyncio.get_running_loop()
+    # Datagram ICMP sockets get their echo id rewritten by the kernel, so only
+    # raw sockets can filter on it; (ip, seq) is unique per sweep either way.
+    ident = os.getpid() & 0xFFFF
+    timeout = timeout_ms / 1000.0
+    interval = batch_size / float(max(1, rate_pps))
+    pending = {}  # (ip, seq) -> deadline
+    alive: List[str] = []
+
+    def on_readable():
+        while True:
+            try:
+                data, addr = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            parsed = _parse_reply(data, raw)
+            if not parsed: continue
+            rid, seq = parsed
+            if raw and rid != ident: continue
+            if pending.pop((addr[0], seq), None) is not None:
+                alive.append(addr[0])
+
+    async def send(ip: str, seq: int):
+        pkt = _echo_packet(ident, seq)
+        while True:
+            try:
+                sock.sendto(pkt, (ip, 0))
+                return True
+            except (BlockingIOError, InterruptedError):
+                await asyncio.sleep(0.001)
+            except OSError:
+                return False
+
+    loop.add_reader(sock.fileno(), on_readable)
+    try:
+        seq = 0; sent = 0
+        next_batch = loop.time()
+        last_deadline = next_batch
+        for ip in ips:
+            seq = (seq + 1) & 0xFFFF
+            now = loop.time()
+            last_deadline = now + timeout
+            pending[(ip, seq)] = last_deadline
+            if not await send(ip, seq):
+                pending.pop((ip, seq), None)
+            sent += 1
+            if sent % batch_size == 0:
+                # Pace batches to rate_pps and expire unanswered probes
+                next_batch += interval
+                delay = next_batch - loop.time()
+                await asyncio.sleep(max(0.0, delay))
+                now = loop.time()
+                for key in [k for k, d in pending.items() if d < now]:
+                    del pending[key]
+        while pending and loop.time() < last_deadline:
+            await asyncio.sleep(0.01)
+    finally:
+        loop.remove_reader(sock.fileno())
+    return alive
+
+def sweep(ips: Iterable[str], timeout_ms: int = 500, rate_pps: int = 2000, batch_size: int = 256) -> List[str]:
+    """Ping IPv4 addresses from a single ICMP socket; return the responsive ones.
+
+    Raises OSError if no ICMP socket can be opened so callers can fall back
+    to the subprocess ping path.
+    """
+    sock, raw = open_icmp_socket()
+    # add_reader() needs a selector loop; Windows' default proactor loop lacks it
+    loop = asyncio.SelectorEventLoop()
+    try:
+        return loop.run_until_complete(_sweep(sock, raw, ips, timeout_ms, rate_pps, max(1, batch_size)))
+    finally:
+        loop.close()
+        sock.close()
@@ -0,0 +1,76 @@
+from typing import Iterable, Iterator, List, Optional, Tuple
+import ipaddress
+
+# (version, first, last) with first/last as inclusive integer addresses
+Interval = Tuple[int, int, int]
+
+def parse_target(spec: str) -> Optional[Interval]:
+    """Parse a CIDR or single IP into the interval of scannable host addresses
+    (same rules as ip_network.hosts(): no network/broadcast on v4, no
+    subnet-router anycast on v6, except for /31, /32, /127 and /128)."""
+    spec = str(spec).strip()
+    try:
+        net = ipaddress.ip_network(spec, strict=False)
+    except ValueError:
+        try:
+            ip = ipaddress.ip_address(spec)
+        except ValueError:
+            return None
+        return ip.version, int(ip), int(ip)
+    first, last = int(net.network_address), int(net.broadcast_address)
+    if net.version == 4 and net.prefixlen <= 30:
+        first, last = first + 1, last - 1
+    elif net.version == 6 and net.prefixlen <= 126:
+        first += 1
+    return net.version, first, last
+
+def merge(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort and coalesce overlapping or adjacent intervals."""
+    out: List[Interval] = []
+    for ver, first, last in sorted(intervals):
+        if out and out[-1][0] == ver and first <= out[-1][2] + 1:
+            if last > out[-1][2]:
+                out[-1] = (ver, out[-1][1], last)
+        else:
+            out.append((ver, first, last))
+    return out
+
+def subtract(intervals: List[Interval], excludes: List[Interval]) -> List[Interval]:
+    """Remove every excluded address; both inputs must already be merged."""
+    out: List[Interval] = []
+    for ver, first, last in intervals:
+        for xver, xfirst, xlast in excludes:
+            if xver != ver or xlast < first or xfirst > last:
+                continue
+            if xfirst > first:
+                out.append((ver, first, xfirst - 1))
+            first = xlast + 1
+            if first > last:
+                break
+        if first <= last:
+            out.append((ver, first, last))
+    return out
+
+def build(targets: Iterable[str], exclude: Iterable[str] = ()) -> List[Interval]:
+    inc = merge(i for i in (parse_target(t) for t in targets or []) if i)
+    # Exclusions are taken as whole networks, network/broadcast included
+    exc = []
+    for t in exclude or []:
+        try:
+            net = ipaddress.ip_network(str(t).strip(), strict=False)
+        except ValueError:
+            continue
+        exc.append((net.version, int(net.network_address), int(net.broadcast_address)))
+    return subtract(inc, merge(exc))
+
+def count(intervals: Iterable[Interval]) -> int:
+    return sum(last - first + 1 for _, first, last in intervals)
+
+def iter_ips(intervals: Iterable[Interval], version: Optional[int] = None) -> Iterator[str]:
+    """Lazily yield addresses as strings; nothing is materialized."""
+    for ver, first, last in intervals:
+        if version and ver != version:
+            continue
+        cls = ipaddress.IPv4Address if ver == 4 else ipaddress.IPv6Address
+        for n in range(first, last + 1):
+            yield str(cls(n))
@@ -1,5 +1,9 @@
-from typing import List, Dict, Any
-import ipaddress, subprocess, platform, concurrent.futures, socket
+from typing import List, Dict, Any, Iterable
+import subprocess, platform, concurrent.futures
+
+from modules.discovery import ip_ranges
+from modules.discovery.icmp_sweep import sweep as icmp_sweep
+from modules.discovery.tcp_scan import scan as tcp_scan
 
 def _ping(ip: str, timeout_ms: int) -> bool:
     system = platform.system().lower()
@@ -14,16 +18,28 @@ def _ping(ip: str, timeout_ms: int) -> bool:
     except Exception:
         return False
 
-def _tcp_probe(ip: str, ports: list, per_port_timeout_ms: int) -> List[int]:
-    open_ports = []
-    tout = per_port_timeout_ms / 1000.0
-    for p in ports:
-        try:
-            with socket.create_connection((ip, int(p)), timeout=tout):
-                open_ports.append(int(p))
-        except Exception:
-            pass
-    return open_ports
+def _ping_sweep(ips: Iterable[str], timeout_ms: int, threads: int) -> List[str]:
+    # Keep at most 2x threads pings queued so large ranges never materialize
+    responsive: List[str] = []
+    it = iter(ips)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as ex:
+        futs = {}
+        while True:
+            for ip in it:
+                futs[ex.submit(_ping, ip, timeout_ms)] = ip
+                if len(futs) >= threads * 2:
+                    break
+            if not futs:
+                break
+            done, _ = concurrent.futures.wait(futs, return_when=concurrent.futures.FIRST_COMPLETED)
+            for fut in done:
+                ip = futs.pop(fut)
+                try:
+                    if fut.result():
+                        responsive.append(ip)
+                except Exception:
+                    pass
+    return responsive
 
 def discover(config: dict) -> List[Dict[str, Any]]:
     out: List[Dict[str, Any]] = []
@@ -37,40 +53,58 @@ def discover(config: dict) -> List[Dict[str, Any]]:
     tcp_enabled = bool(tcp_cfg.get('enabled', False))
     tcp_ports = tcp_cfg.get('ports', [22, 80, 443])
     per_port_timeout_ms = int(tcp_cfg.get('per_port_timeout_ms', 400))
+    tcp_liveness = bool(tcp_cfg.get('liveness', False))
+    tcp_in_flight = int(tcp_cfg.get('max_in_flight', 512))
+    tcp_per_host = int(tcp_cfg.get('per_host', 4))
+    engine = str(config.get('engine', 'auto')).lower()   # auto (ICMP socket) | ping (subprocess)
+    rate_pps = int(config.get('rate_pps', 2000))
+    batch_size = int(config.get('batch_size', 256))
 
-    ips = []
-    for t in targets:
-        try:
-            net = ipaddress.ip_network(t, strict=False)
-            for ip in net.hosts():
-                ips.append(str(ip))
-        except Exception:
-            try:
-                _ = ipaddress.ip_address(t); ips.append(str(t))
-            except:
-                continue
-    ips = list(dict.fromkeys(ips))
+    # Targets stay as merged integer intervals; addresses are generated on demand
+    intervals = ip_ranges.build(targets, config.get('exclude') or [])
 
     responsive = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as ex:
-        futs = {ex.submit(_ping, ip, timeout_ms): ip for ip in ips}
-        for fut in concurrent.futures.as_completed(futs):
-            ip = futs[fut]
-            try:
-                if fut.result():
-                    responsive.append(ip)
-            except Exception:
-                pass
+    ping_versions = (4, 6)
+    if engine != 'ping':
+        try:
+            responsive = icmp_sweep(ip_ranges.iter_ips(intervals, 4), timeout_ms, rate_pps, batch_size)
+            ping_versions = (6,)
+        except (OSError, NotImplementedError):
+            # No raw or unprivileged ICMP socket (or no socket readiness on
+            # this event loop); use ping subprocesses
+            responsive = []
+
+    for ver in ping_versions:
+        responsive += _ping_sweep(ip_ranges.iter_ips(intervals, ver), timeout_ms, threads)
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    def _entry(ip: str) -> Dict[str, Any]:
+        entry = entries.get(ip)
+        if entry is None:
+            entry = entries[ip] = {
+                'host': ip,
+                'ips': [ip],
+                'source': 'subnet_scan',
+                'provider': 'local-network',
+                'open_ports': []
+            }
+        return entry
 
     for ip in responsive:
-        entry = {
-            'host': ip,
-            'ips': [ip],
-            'source': 'subnet_scan',
-            'provider': 'local-network',
-            'open_ports': []
-        }
-        if not ping_only and tcp_enabled:
-            entry['open_ports'] = _tcp_probe(ip, tcp_ports, per_port_timeout_ms)
+        _entry(ip)
+
+    if not ping_only and tcp_enabled:
+        # With liveness on, every IP is probed and any TCP answer (open or
+        # refused) marks the host up, which catches hosts that drop ICMP.
+        def on_result(ip: str, port: int, state: str):
+            if state == 'open':
+                _entry(ip)['open_ports'].append(port)
+            elif state == 'closed' and tcp_liveness:
+                _entry(ip)
+        scan_ips = ip_ranges.iter_ips(intervals) if tcp_liveness else list(entries)
+        tcp_scan(scan_ips, tcp_ports, per_port_timeout_ms, tcp_in_flight, tcp_per_host, on_result)
+
+    for entry in entries.values():
+        entry['open_ports'].sort()
         out.append(entry)
     return out
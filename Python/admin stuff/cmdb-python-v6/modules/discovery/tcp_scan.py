@@ -0,0 +1,72 @@
+from typing import Callable, Dict, Iterable, List, Optional
+import asyncio
+
+# Outcome of a single connect attempt
+OPEN, CLOSED, FILTERED = 'open', 'closed', 'filtered'
+
+async def _connect(ip: str, port: int, timeout: float) -> str:
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except ConnectionRefusedError:
+        # RST: nothing listening, but the host itself answered
+        return CLOSED
+    except (asyncio.TimeoutError, OSError):
+        return FILTERED
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return OPEN
+
+async def _scan(ips: Iterable[str], ports: List[int], timeout_ms: int, max_in_flight: int,
+                per_host: int, on_result: Optional[Callable[[str, int, str], None]]) -> Dict[str, List[int]]:
+    timeout = timeout_ms / 1000.0
+    global_sem = asyncio.Semaphore(max(1, max_in_flight))
+    host_sems: Dict[str, asyncio.Semaphore] = {}
+    open_ports: Dict[str, List[int]] = {}
+    pending: Dict[str, int] = {}
+
+    async def probe(ip: str, port: int):
+        sem = host_sems.setdefault(ip, asyncio.Semaphore(max(1, per_host)))
+        async with sem:
+            async with global_sem:
+                state = await _connect(ip, port, timeout)
+        pending[ip] -= 1
+        if not pending[ip]:
+            del pending[ip]; del host_sems[ip]
+        if state == OPEN:
+            open_ports.setdefault(ip, []).append(port)
+        if on_result:
+            on_result(ip, port, state)
+
+    # Pairs are generated lazily and fed through a bounded queue, so memory
+    # stays proportional to max_in_flight rather than to the target range.
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, max_in_flight) * 2)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            await probe(*item)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, max_in_flight))]
+    for ip in ips:
+        for p in ports:
+            pending[ip] = pending.get(ip, 0) + 1
+            await queue.put((ip, int(p)))
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    return open_ports
+
+def scan(ips: Iterable[str], ports: List[int], timeout_ms: int = 400, max_in_flight: int = 512,
+         per_host: int = 4, on_result: Optional[Callable[[str, int, str], None]] = None) -> Dict[str, List[int]]:
+    """Connect-scan every (ip, port) pair concurrently.
+
+    ``on_result(ip, port, state)`` is called as each probe finishes, with
+    state one of 'open', 'closed' (refused) or 'filtered' (timeout/unreachable).
+    Returns {ip: [open ports]} for hosts with at least one open port.
+    """
+    return asyncio.run(_scan(ips, ports, timeout_ms, max_in_flight, per_host, on_result))
@@ -0,0 +1,517 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import ipaddress, json, os, shutil, socket, subprocess, sys, threading, time, uuid, zlib
+
+# Spool layout (all writes are tmp file + rename, so readers never see half a file):
+#   run.json                            cfg (without secrets) and options for workers
+#   pending/<sid>.<attempt>.json        shard waiting for a worker
+#   claimed/<sid>.<attempt>@<wid>.json  claimed by renaming out of pending/
+#   rows/<sid>.<attempt>@<wid>.ndjson   {"i": index in shard, "row": {...}} per finished host
+#   done/<sid>.<attempt>@<wid>.json     worker finished the shard (+ its stats)
+#   workers/<wid>.json                  heartbeat
+#   stop                                coordinator is done; idle workers exit
+SUBDIRS = ('pending', 'claimed', 'rows', 'done', 'workers')
+SHARD_KEY = '_shard_i'
+# Config keys never written to the spool; workers take them from their own config or env
+SECRET_KEYS = ('password', 'passwd', 'secret', 'client_secret', 'token', 'api_key', 'apikey', 'passphrase')
+
+def _is_secret(key: Any) -> bool:
+    k = str(key).lower()
+    return k in SECRET_KEYS or k.endswith(('_password', '_secret', '_token'))
+
+def strip_secrets(cfg: Any) -> Any:
+    """Copy of `cfg` without password/secret/token keys, at any depth."""
+    if isinstance(cfg, dict):
+        return {k: strip_secrets(v) for k, v in cfg.items() if not _is_secret(k)}
+    if isinstance(cfg, list):
+        return [strip_secrets(v) for v in cfg]
+    return cfg
+
+def merge_secrets(cfg: Any, local: Any) -> Any:
+    """`cfg` with the secret keys of `local` (a worker's own config) put
+    back at the same paths."""
+    if not isinstance(cfg, dict) or not isinstance(local, dict):
+        return cfg
+    out = dict(cfg)
+    for k, v in local.items():
+        if _is_secret(k):
+            out[k] = v
+        elif isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = merge_secrets(out[k], v)
+    return out
+
+def _write_json(path: str, data: Any):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp, path)
+
+def _read_json(path: str) -> Optional[Any]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _first_ip(t: Dict[str, Any]) -> Optional[str]:
+    ips = t.get('ips') or []
+    for v in ([ips] if isinstance(ips, str) else list(ips)) + [t.get('host') or '']:
+        try:
+            return str(ipaddress.ip_address(str(v).strip()))
+        except ValueError:
+            continue
+    return None
+
+def shard_targets(targets: Iterable[Dict[str, Any]], by: str = 'hash', shards: int = 8, max_size: int = 500,
+                  subnet_prefix: int = 24, site_field: str = 'site') -> List[Tuple[str, List[Tuple[int, Dict[str, Any]]]]]:
+    """Split targets into [(key, [(index, target), ...])].
+
+    `hash` spreads hosts evenly over `shards` groups. `subnet` groups by
+    the /`subnet_prefix` network of the first IP, and `site` groups by
+    the `site_field` attribute. Both keep a network segment together, and
+    targets without an IP or site land in 'unknown'. Groups larger than
+    `max_size` are split so no shard outlives its worker by much.
+    """
+    groups: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+    for i, t in enumerate(targets):
+        if by == 'subnet':
+            ip = _first_ip(t)
+            prefix = subnet_prefix if ip and ':' not in ip else max(subnet_prefix, 64)
+            key = str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False)) if ip else 'unknown'
+        elif by == 'site':
+            key = str(t.get(site_field) or 'unknown')
+        else:
+            key = f"hash-{zlib.crc32((t.get('host') or '').lower().encode()) % max(1, shards)}"
+        groups.setdefault(key, []).append((i, t))
+    out = []
+    size = max(1, int(max_size))
+    for key in sorted(groups):
+        items = groups[key]
+        for n in range(0, len(items), size):
+            out.append((key, items[n:n + size]))
+    return out
+
+class Spool:
+    """The shared directory coordinator and workers talk through. Works on
+    any filesystem with atomic rename (local disk, or NFS/SMB for workers
+    on other runners)."""
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+
+    def p(self, *parts: str) -> str:
+        return os.path.join(self.path, *parts)
+
+    def reset(self):
+        for d in SUBDIRS:
+            shutil.rmtree(self.p(d), ignore_errors=True)
+            os.makedirs(self.p(d), exist_ok=True)
+        for f in ('stop', 'run.json'):
+            try: os.remove(self.p(f))
+            except FileNotFoundError: pass
+
+    def ls(self, d: str) -> List[str]:
+        try:
+            return sorted(n for n in os.listdir(self.p(d)) if not n.endswith('.tmp'))
+        except FileNotFoundError:
+            return []
+
+    def stopped(self) -> bool:
+        return os.path.exists(self.p('stop'))
+
+    def claim(self, wid: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Take the oldest pending shard; (name, shard) or None."""
+        for name in self.ls('pending'):
+            base = name[:-len('.json')]
+            claimed = self.p('claimed', f"{base}@{wid}.json")
+            try:
+                os.rename(self.p('pending', name), claimed)
+            except FileNotFoundError:
+                continue   # another worker was faster
+            shard = _read_json(claimed)
+            if shard is not None:
+                return f"{base}@{wid}", shard
+        return None
+
+def _split_name(name: str) -> Tuple[str, int, str]:
+    """'00012.2@w1' -> ('00012', 2, 'w1')"""
+    base, _, wid = name.partition('@')
+    sid, _, attempt = base.partition('.')
+    return sid, int(attempt or 0), wid
+
+# --- worker -----------------------------------------------------------------
+
+class _Heartbeat:
+    def __init__(self, spool: Spool, wid: str, interval: float):
+        self.spool, self.wid, self.interval = spool, wid, interval
+        self.shard: Optional[str] = None
+        self.rows = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+
+    def beat(self):
+        _write_json(self.spool.p('workers', f"{self.wid}.json"),
+                    {'worker': self.wid, 'pid': os.getpid(), 'host': socket.gethostname(), 'ts': time.time(),
+                     'shard': self.shard, 'rows': self.rows})
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try: self.beat()
+            except OSError: pass
+
+    def start(self) -> "_Heartbeat":
+        self.beat()
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+def run_worker(spool_dir: str, collect: Callable[[Dict[str, Any], List[Dict[str, Any]], Callable[[Dict[str, Any]], None]], Dict[str, Any]],
+               wid: Optional[str] = None, poll: float = 0.5, wait_for_run: float = 60.0) -> int:
+    """Claim shards from the spool until the coordinator writes `stop`.
+
+    collect(run, targets, sink) collects one shard: every target carries
+    its index under SHARD_KEY, sink(row) is called once per finished host,
+    and the return value (stats) is handed back in the done marker.
+    Returns the number of shards processed.
+    """
+    spool = Spool(spool_dir)
+    wid = wid or f"{socket.gethostname()}-{os.getpid()}"
+    deadline = time.monotonic() + wait_for_run
+    run = _read_json(spool.p('run.json'))
+    while run is None:
+        if time.monotonic() > deadline or spool.stopped():
+            print(f"worker {wid}: no run in {spool.path}", file=sys.stderr)
+            return 0
+        time.sleep(poll)
+        run = _read_json(spool.p('run.json'))
+    hb = _Heartbeat(spool, wid, float((run.get('distributed') or {}).get('heartbeat_s', 5))).start()
+    processed = 0
+    try:
+        while True:
+            claim = spool.claim(wid)
+            if claim is None:
+                if spool.stopped():
+                    break
+                time.sleep(poll)
+                continue
+            name, shard = claim
+            hb.shard, hb.rows = name, 0
+            hb.beat()
+            lock = threading.Lock()
+            with open(spool.p('rows', f"{name}.ndjson"), "a", encoding="utf-8") as out:
+                def sink(row):
+                    i = row.pop(SHARD_KEY, None)
+                    line = json.dumps({'i': i, 'row': row}, default=str) + "\n"
+                    with lock:
+                        out.write(line); out.flush()
+                        hb.rows += 1
+                targets = [dict(t, **{SHARD_KEY: i}) for i, t in shard.get('targets') or []]
+                error = None
+                try:
+                    stats = collect(run, targets, sink) or {}
+                except Exception as e:
+                    # The coordinator re-dispatches whatever has no row yet
+                    stats, error = {}, f"{type(e).__name__}: {e}"
+                    print(f"worker {wid}: shard {name} failed: {error}", file=sys.stderr)
+            _write_json(spool.p('done', f"{name}.json"), {'worker': wid, 'rows': hb.rows, 'error': error, 'stats': stats})
+            try: os.remove(spool.p('claimed', f"{name}.json"))
+            except FileNotFoundError: pass
+            processed += 1
+            hb.shard = None
+    finally:
+        hb.stop()
+        try: os.remove(spool.p('workers', f"{wid}.json"))
+        except FileNotFoundError: pass
+    return processed
+
+# --- coordinator ------------------------------------------------------------
+
+class _Shard:
+    __slots__ = ('sid', 'key', 'targets', 'received', 'attempt', 'done', 'worker')
+
+    def __init__(self, sid: str, key: str, items: List[Tuple[int, Dict[str, Any]]]):
+        self.sid = sid
+        self.key = key
+        self.targets: Dict[int, Dict[str, Any]] = dict(items)
+        self.received = set()
+        self.attempt = 0
+        self.done = False
+        self.worker: Optional[str] = None
+
+    def remaining(self) -> List[Tuple[int, Dict[str, Any]]]:
+        return [(i, t) for i, t in self.targets.items() if i not in self.received]
+
+class Coordinator:
+    """Hands target shards to workers through a Spool and merges their rows.
+
+    Rows are read as workers append them and each (shard, index) is emitted
+    once. A shard whose worker stops heartbeating (`heartbeat_timeout_s`)
+    or whose local process exits is re-dispatched with only its missing
+    targets; after `max_attempts` the missing targets become error rows.
+    Heartbeats are judged by when this process saw the worker's heartbeat
+    file change, never by the worker's clock, and a worker that heartbeats
+    again after being written off counts as alive again.
+    `local_workers` are started as subprocesses from `worker_cmd` and
+    restarted (up to `max_restarts`) while work is left. Workers on
+    other runners can join by pointing --worker --spool at the same
+    directory.
+
+    Secrets are stripped from `run['cfg']` before it goes into run.json.
+
+    Call start(), then poll() until `finished`; poll() returns
+    [(target, row)] merged since the last call.
+    """
+
+    def __init__(self, spool_dir: str, run: Dict[str, Any], dcfg: Dict[str, Any] = None,
+                 worker_cmd: Optional[List[str]] = None, local_workers: int = 0):
+        self.dcfg = dcfg or {}
+        self.spool = Spool(spool_dir)
+        self.run = dict(run, run_id=uuid.uuid4().hex, distributed=self.dcfg)
+        if 'cfg' in self.run:
+            self.run['cfg'] = strip_secrets(self.run['cfg'])
+        self.worker_cmd = worker_cmd
+        self.local_workers = max(0, int(local_workers))
+        self.heartbeat_timeout = float(self.dcfg.get('heartbeat_timeout_s', 30))
+        self.max_attempts = max(1, int(self.dcfg.get('max_attempts', 3)))
+        self.max_restarts = int(self.dcfg.get('max_restarts', 3))
+        self.shards: Dict[str, _Shard] = {}
+        self.procs: Dict[str, subprocess.Popen] = {}
+        self.restarts = 0
+        self.offsets: Dict[str, int] = {}
+        self.partial: Dict[str, bytes] = {}
+        self.done_seen = set()
+        self.dead = set()
+        self.beats: Dict[str, Tuple[Tuple[int, int], float]] = {}
+        self.claims_seen: Dict[str, float] = {}
+        self.worker_rows: Dict[str, int] = {}
+        self.worker_errors: Dict[str, int] = {}
+        self.worker_shards: Dict[str, int] = {}
+        self.redispatched = 0
+        self.failed_targets = 0
+        self.stats: List[Dict[str, Any]] = []
+        self.total = 0
+
+    # --- setup ----------------------------------------------------------
+    def start(self, targets: List[Dict[str, Any]]) -> "Coordinator":
+        self.spool.reset()
+        default_shards = max(1, self.local_workers) * 4
+        groups = shard_targets(targets, by=self.dcfg.get('shard_by', 'hash'),
+                               shards=int(self.dcfg.get('shards') or default_shards),
+                               max_size=int(self.dcfg.get('max_shard_size', 500)),
+                               subnet_prefix=int(self.dcfg.get('subnet_prefix', 24)),
+                               site_field=self.dcfg.get('site_field', 'site'))
+        _write_json(self.spool.p('run.json'), self.run)
+        for n, (key, items) in enumerate(groups):
+            shard = self.shards[f"{n:05d}"] = _Shard(f"{n:05d}", key, items)
+            self._publish(shard)
+            self.total += len(items)
+        for n in range(self.local_workers):
+            self._spawn(f"local{n}")
+        return self
+
+    def _publish(self, shard: _Shard):
+        _write_json(self.spool.p('pending', f"{shard.sid}.{shard.attempt}.json"),
+                    {'shard': shard.sid, 'key': shard.key, 'attempt': shard.attempt, 'targets': shard.remaining()})
+
+    def _spawn(self, wid: str):
+        if not self.worker_cmd:
+            return
+        self.procs[wid] = subprocess.Popen(self.worker_cmd + ['--spool', self.spool.path, '--worker-id', wid])
+        self.dead.discard(wid)
+
+    # --- progress -------------------------------------------------------
+    @property
+    def finished(self) -> bool:
+        return all(s.done for s in self.shards.values())
+
+    @property
+    def merged(self) -> int:
+        return sum(len(s.received) for s in self.shards.values())
+
+    def _beat_age(self, wid: str) -> Optional[float]:
+        """Seconds (on this machine's monotonic clock) since the worker's
+        heartbeat file last changed; None without a heartbeat file."""
+        try:
+            st = os.stat(self.spool.p('workers', f"{wid}.json"))
+        except OSError:
+            return None
+        now = time.monotonic()
+        sig = (st.st_mtime_ns, st.st_ino)
+        prev = self.beats.get(wid)
+        if prev is None or prev[0] != sig:
+            self.beats[wid] = (sig, now)
+            proc = self.procs.get(wid)
+            if prev is not None and wid in self.dead and (proc is None or proc.poll() is None):
+                self.dead.discard(wid)
+                print(f"worker {wid} is heartbeating again", file=sys.stderr)
+            return 0.0
+        return now - prev[1]
+
+    def alive_workers(self) -> List[str]:
+        out = []
+        for name in self.spool.ls('workers'):
+            wid = name[:-len('.json')]
+            age = self._beat_age(wid)
+            if wid not in self.dead and age is not None and age < self.heartbeat_timeout:
+                out.append(wid)
+        return out
+
+    def describe(self) -> str:
+        done = sum(1 for s in self.shards.values() if s.done)
+        return f"shards {done}/{len(self.shards)}, workers {len(self.alive_workers())}"
+
+    # --- merge ----------------------------------------------------------
+    def _read_rows(self, name: str) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        sid, _, wid = _split_name(name)
+        shard = self.shards.get(sid)
+        path = self.spool.p('rows', f"{name}.ndjson")
+        try:
+            with open(path, 'rb') as f:
+                f.seek(self.offsets.get(name, 0))
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        self.offsets[name] = self.offsets.get(name, 0) + len(data)
+        data = self.partial.pop(name, b'') + data
+        lines = data.split(b'\n')
+        if lines[-1]:
+            self.partial[name] = lines[-1]   # a line still being written
+        out = []
+        for line in lines[:-1]:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            i = rec.get('i')
+            if shard is None or i not in shard.targets or i in shard.received:
+                continue   # duplicate from an earlier attempt
+            shard.received.add(i)
+            row = rec.get('row') or {}
+            self.worker_rows[wid] = self.worker_rows.get(wid, 0) + 1
+            if row.get('error'):
+                self.worker_errors[wid] = self.worker_errors.get(wid, 0) + 1
+            out.append((shard.targets[i], row))
+        return out
+
+    def _fail(self, shard: _Shard, reason: str) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        out = []
+        for i, t in shard.remaining():
+            shard.received.add(i)
+            out.append((t, dict(t, error=reason)))
+            self.failed_targets += 1
+        shard.done = True
+        return out
+
+    def _redispatch(self, shard: _Shard, reason: str) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        if shard.done:
+            return []
+        if not shard.remaining():
+            shard.done = True
+            return []
+        if shard.attempt + 1 >= self.max_attempts:
+            print(f"shard {shard.sid} ({shard.key}) failed {shard.attempt + 1} times: {reason}", file=sys.stderr)
+            return self._fail(shard, f"distributed: shard failed after {shard.attempt + 1} attempts ({reason})")
+        print(f"re-dispatching shard {shard.sid} ({shard.key}, {len(shard.remaining())} hosts left): {reason}", file=sys.stderr)
+        shard.attempt += 1
+        shard.worker = None
+        self.redispatched += 1
+        self._publish(shard)
+        return []
+
+    def poll(self, timeout: float = 0.5) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        out: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        for name in self.spool.ls('rows'):
+            out += self._read_rows(name[:-len('.ndjson')])
+
+        # Finished shards (stats; a shard that ended with hosts missing goes round again)
+        for name in self.spool.ls('done'):
+            if name in self.done_seen:
+                continue
+            self.done_seen.add(name)
+            base = name[:-len('.json')]
+            sid, attempt, wid = _split_name(base)
+            out += self._read_rows(base)
+            marker = _read_json(self.spool.p('done', name)) or {}
+            if marker.get('stats'):
+                self.stats.append(marker['stats'])
+            self.worker_shards[wid] = self.worker_shards.get(wid, 0) + 1
+            shard = self.shards.get(sid)
+            if shard is None or shard.done or attempt != shard.attempt:
+                continue
+            if shard.remaining():
+                out += self._redispatch(shard, marker.get('error') or f"worker {wid} returned no row for {len(shard.remaining())} hosts")
+            else:
+                shard.done = True
+
+        # Shards every host of which has a row are done, whichever attempt produced them
+        for shard in self.shards.values():
+            if not shard.done and not shard.remaining():
+                shard.done = True
+                for d in ('pending', 'claimed'):
+                    for name in self.spool.ls(d):
+                        if name.startswith(shard.sid + '.'):
+                            try: os.remove(self.spool.p(d, name))
+                            except FileNotFoundError: pass
+
+        # Dead workers: local process exited, or no heartbeat seen for the timeout
+        now = time.monotonic()
+        for wid, proc in self.procs.items():
+            if proc.poll() is not None and wid not in self.dead:
+                self.dead.add(wid)
+                print(f"worker {wid} exited with code {proc.returncode}", file=sys.stderr)
+        for name in self.spool.ls('claimed'):
+            base = name[:-len('.json')]
+            sid, attempt, wid = _split_name(base)
+            shard = self.shards.get(sid)
+            if shard is None or shard.done or attempt != shard.attempt:
+                continue
+            shard.worker = wid
+            age = self._beat_age(wid)
+            if age is None:
+                # No heartbeat file (yet): count from when the claim was first seen
+                age = now - self.claims_seen.setdefault(name, now)
+            if wid in self.dead or age > self.heartbeat_timeout:
+                self.dead.add(wid)
+                out += self._read_rows(base)
+                try: os.remove(self.spool.p('claimed', name))
+                except FileNotFoundError: pass
+                out += self._redispatch(shard, f"worker {wid} lost")
+
+        # Keep the local pool staffed while work is left
+        if not self.finished:
+            for wid, proc in list(self.procs.items()):
+                if proc.poll() is not None and self.restarts < self.max_restarts:
+                    self.restarts += 1
+                    self._spawn(wid)
+            if self.procs and all(p.poll() is not None for p in self.procs.values()) and not self.alive_workers():
+                # Nobody left to do the work
+                for shard in self.shards.values():
+                    if not shard.done:
+                        out += self._fail(shard, "distributed: no workers left")
+
+        if not out and not self.finished:
+            time.sleep(timeout)
+        return out
+
+    def close(self, timeout: float = 30.0):
+        """Tell workers to exit and wait for the local ones."""
+        try:
+            with open(self.spool.p('stop'), 'w', encoding='utf-8') as f:
+                f.write(self.run['run_id'])
+        except OSError:
+            pass
+        deadline = time.monotonic() + timeout
+        for proc in self.procs.values():
+            try:
+                proc.wait(max(0.1, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                proc.terminate()
+
+    def summary(self) -> Dict[str, Any]:
+        workers = sorted(set(self.worker_rows) | set(self.worker_shards) | set(self.procs))
+        return {'mode': 'distributed', 'shard_by': self.dcfg.get('shard_by', 'hash'), 'shards': len(self.shards),
+                'targets': self.total, 'redispatched': self.redispatched, 'failed_targets': self.failed_targets,
+                'worker_restarts': self.restarts,
+                'workers': {w: {'rows': self.worker_rows.get(w, 0), 'errors': self.worker_errors.get(w, 0),
+                                'shards': self.worker_shards.get(w, 0), 'lost': w in self.dead} for w in workers}}
@@ -1,29 +1,275 @@
-from typing import Dict, Any, List
-import socket
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import asyncio, concurrent.futures, os, socket, sqlite3, threading, time
 try:
     import dns.resolver, dns.reversename
 except Exception:
     dns = None
+try:
+    import dns.asyncresolver
+except Exception:
+    _ASYNC_DNS = False
+else:
+    _ASYNC_DNS = True
 
-def reverse_lookup(ip: str, cfg: Dict[str, Any]) -> str:
-    # Try dnspython if configured, else socket.gethostbyaddr
-    if not cfg or not cfg.get('enabled', True):
-        return ""
-    servers = cfg.get('servers') or []
+_lock = threading.Lock()
+_resolvers: Dict[Tuple[str, ...], Any] = {}
+_caches: Dict[str, "PtrCache"] = {}
+_stats = {'hits': 0, 'disk_hits': 0, 'negative_hits': 0, 'misses': 0, 'errors': 0}
+
+def _count(key: str, n: int = 1):
+    with _lock:
+        _stats[key] += n
+
+class PtrCache:
+    """PTR answers cached in an LRU, optionally backed by a sqlite file so
+    entries survive between runs. Empty names are negative (NXDOMAIN) entries."""
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 50000):
+        self.max_entries = max(1, int(max_entries))
+        self.mem: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.db = None
+        if path:
+            d = os.path.dirname(path)
+            if d: os.makedirs(d, exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS ptr_cache (ip TEXT PRIMARY KEY, name TEXT NOT NULL, expires REAL NOT NULL)")
+            self.db.execute("DELETE FROM ptr_cache WHERE expires < ?", (time.time(),))
+            self.db.commit()
+
+    def _remember(self, ip: str, name: str, expires: float):
+        self.mem[ip] = (name, expires)
+        self.mem.move_to_end(ip)
+        while len(self.mem) > self.max_entries:
+            self.mem.popitem(last=False)
+
+    def get(self, ip: str) -> Optional[str]:
+        """Return the cached name ('' for a cached miss) or None if unknown/expired."""
+        now = time.time()
+        name, stat = None, None
+        with self.lock:
+            hit = self.mem.get(ip)
+            if hit and hit[1] > now:
+                self.mem.move_to_end(ip)
+                name, stat = hit[0], 'hits'
+            elif self.db is not None:
+                row = self.db.execute("SELECT name, expires FROM ptr_cache WHERE ip = ?", (ip,)).fetchone()
+                if row and row[1] > now:
+                    self._remember(ip, row[0], row[1])
+                    name, stat = row[0], 'disk_hits'
+        if stat:
+            _count('negative_hits' if not name else stat)
+        return name
+
+    def put(self, ip: str, name: str, ttl: float):
+        expires = time.time() + ttl
+        with self.lock:
+            self._remember(ip, name, expires)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO ptr_cache (ip, name, expires) VALUES (?, ?, ?)", (ip, name, expires))
+                self.db.commit()
+
+    def put_many(self, entries: List[Tuple[str, str, float]]):
+        """put() for many (ip, name, ttl) at once, in one sqlite transaction."""
+        now = time.time()
+        rows = [(ip, name, now + ttl) for ip, name, ttl in entries]
+        with self.lock:
+            for ip, name, expires in rows:
+                self._remember(ip, name, expires)
+            if self.db is not None and rows:
+                self.db.executemany("INSERT OR REPLACE INTO ptr_cache (ip, name, expires) VALUES (?, ?, ?)", rows)
+                self.db.commit()
+
+def _get_cache(cfg: Dict[str, Any]) -> Optional[PtrCache]:
+    ccfg = cfg.get('cache') or {}
+    if not ccfg.get('enabled', True):
+        return None
+    path = ccfg.get('file') or ''
+    with _lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = PtrCache(path or None, ccfg.get('max_entries', 50000))
+    return cache
+
+def _get_resolver(servers: List[str]):
+    key = tuple(servers)
+    with _lock:
+        resolver = _resolvers.get(key)
+        if resolver is None:
+            resolver = dns.resolver.Resolver()
+            if servers:
+                resolver.nameservers = list(servers)
+            _resolvers[key] = resolver
+    return resolver
+
+def _ttl(cfg: Dict[str, Any], ttl: float) -> float:
+    ccfg = cfg.get('cache') or {}
+    return min(max(ttl, float(ccfg.get('min_ttl', 300))), float(ccfg.get('max_ttl', 86400)))
+
+def _lookup(ip: str, cfg: Dict[str, Any]) -> Tuple[Optional[str], float]:
+    """Network lookup. Returns (name, ttl); name '' means a definite miss and
+    None means a transient failure that must not be cached."""
     # dnspython path
     if dns:
         try:
-            resolver = dns.resolver.Resolver()
-            if servers:
-                resolver.nameservers = servers
+            resolver = _get_resolver(cfg.get('servers') or [])
             rev = dns.reversename.from_address(ip)
-            ans = resolver.resolve(rev, "PTR", lifetime=2.0)
+            ans = resolver.resolve(rev, "PTR", lifetime=float(cfg.get('lifetime', 2.0)))
             if ans and len(ans) > 0:
-                return str(ans[0]).rstrip('.')
+                return str(ans[0]).rstrip('.'), _ttl(cfg, ans.rrset.ttl)
         except Exception:
             pass
-    # socket fallback
+    # NXDOMAIN included: the hosts file or NSS may still know the name
+    return _system_lookup(ip, cfg)
+
+def _system_lookup(ip: str, cfg: Dict[str, Any]) -> Tuple[Optional[str], float]:
+    """socket.gethostbyaddr (hosts file, NSS, system resolvers); no TTL available."""
+    ccfg = cfg.get('cache') or {}
+    negative_ttl = float(ccfg.get('negative_ttl', 3600))
     try:
-        return socket.gethostbyaddr(ip)[0]
+        return socket.gethostbyaddr(ip)[0], _ttl(cfg, float(ccfg.get('fallback_ttl', 3600)))
+    except socket.herror:
+        return '', negative_ttl
     except Exception:
+        return None, 0
+
+def reverse_lookup(ip: str, cfg: Dict[str, Any]) -> str:
+    # Cached PTR lookup: dnspython if available, else socket.gethostbyaddr
+    if not cfg or not cfg.get('enabled', True):
         return ""
+    cache = _get_cache(cfg)
+    if cache is not None:
+        cached = cache.get(ip)
+        if cached is not None:
+            return cached
+    _count('misses')
+    name, ttl = _lookup(ip, cfg)
+    if name is None:
+        _count('errors')
+        return ""
+    if cache is not None:
+        cache.put(ip, name, ttl)
+    return name
+
+class _RateLimiter:
+    """Spaces queries to one server evenly at `rate` per second (event loop only)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        at = max(now, self.next)
+        self.next = at + self.interval
+        if at > now:
+            await asyncio.sleep(at - now)
+
+async def _bulk_async(ips: List[str], cfg: Dict[str, Any]) -> Dict[str, Tuple[Optional[str], float]]:
+    bcfg = cfg.get('bulk') or {}
+    lifetime = float(cfg.get('lifetime', 2.0))
+    servers = list(cfg.get('servers') or []) or list(dns.asyncresolver.Resolver().nameservers)
+    rate = float(bcfg.get('rate_per_server', 200))
+    # One resolver and rate limiter per server; queries are spread round-robin
+    lanes = []
+    for server in servers:
+        r = dns.asyncresolver.Resolver()
+        r.nameservers = [server]
+        lanes.append((r, _RateLimiter(rate)))
+    if not lanes:
+        lanes.append((dns.asyncresolver.Resolver(), _RateLimiter(rate)))
+    sem = asyncio.Semaphore(max(1, int(bcfg.get('max_in_flight', 256))))
+    loop = asyncio.get_running_loop()
+    negative_ttl = float((cfg.get('cache') or {}).get('negative_ttl', 3600))
+    # NXDOMAIN gets a second try through the system resolver, as
+    # reverse_lookup() does, so hosts-file/NSS-only names are not lost
+    fallback = bool(bcfg.get('system_fallback', True))
+    system = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="dns-system") if fallback else None
+    results: Dict[str, Tuple[Optional[str], float]] = {}
+
+    async def one(i: int, ip: str):
+        resolver, limiter = lanes[i % len(lanes)]
+        async with sem:
+            await limiter.wait()
+            try:
+                ans = await resolver.resolve(dns.reversename.from_address(ip), "PTR", lifetime=lifetime)
+                if ans and len(ans) > 0:
+                    results[ip] = (str(ans[0]).rstrip('.'), _ttl(cfg, ans.rrset.ttl))
+                    return
+                results[ip] = ('', negative_ttl)
+                return
+            except dns.resolver.NXDOMAIN:
+                pass
+            except dns.resolver.NoAnswer:
+                results[ip] = ('', negative_ttl)
+                return
+            except Exception:
+                # Timeout or server failure: not cached, retried next run
+                results[ip] = (None, 0)
+                return
+        if system is None:
+            results[ip] = ('', negative_ttl)
+            return
+        # Outside the semaphore, paced like the queries it stands in for
+        await limiter.wait()
+        results[ip] = await loop.run_in_executor(system, _system_lookup, ip, cfg)
+
+    try:
+        await asyncio.gather(*(one(i, ip) for i, ip in enumerate(ips)))
+    finally:
+        if system is not None:
+            system.shutdown(wait=False)
+    return results
+
+def bulk_reverse_lookup(ips: List[str], cfg: Dict[str, Any]) -> Dict[str, str]:
+    """Resolve many IPs at once; returns {ip: name} ('' when there is no PTR).
+
+    Cached answers are served first; the rest go out concurrently through
+    dns.asyncresolver (bounded by dns.bulk.max_in_flight and
+    dns.bulk.rate_per_server), or a thread pool when it is unavailable.
+    NXDOMAIN answers are retried through socket.gethostbyaddr unless
+    dns.bulk.system_fallback is off.
+    IPs whose lookup failed transiently are left out of the result.
+    """
+    if not cfg or not cfg.get('enabled', True):
+        return {}
+    cache = _get_cache(cfg)
+    out: Dict[str, str] = {}
+    todo: List[str] = []
+    for ip in dict.fromkeys(ips):
+        cached = cache.get(ip) if cache is not None else None
+        if cached is not None:
+            out[ip] = cached
+        else:
+            todo.append(ip)
+    if not todo:
+        return out
+    _count('misses', len(todo))
+
+    if dns and _ASYNC_DNS:
+        results = asyncio.run(_bulk_async(todo, cfg))
+    else:
+        workers = int((cfg.get('bulk') or {}).get('max_in_flight', 256))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(workers, 64))) as ex:
+            results = dict(zip(todo, ex.map(lambda ip: _lookup(ip, cfg), todo)))
+
+    fresh = []
+    for ip, (name, ttl) in results.items():
+        if name is None:
+            _count('errors')
+            continue
+        fresh.append((ip, name, ttl))
+        out[ip] = name
+    if cache is not None:
+        cache.put_many(fresh)
+    return out
+
+def cache_stats() -> Dict[str, int]:
+    with _lock:
+        return dict(_stats)
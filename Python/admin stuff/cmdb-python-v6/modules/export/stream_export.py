@@ -0,0 +1,171 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import csv, json, os, re, sqlite3, threading
+
+from modules.export.html_export import export_html
+from modules.export.servicenow_export import export_servicenow
+from modules.export.viewer_index import build_index, sidecar_path
+
+def make_projection(include: List[str], exclude: List[str]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """Single-pass field filter: include (minus exclude) wins, else exclude only."""
+    ex = set(exclude or [])
+    if include:
+        keys = [k for k in dict.fromkeys(include) if k not in ex]
+        return lambda r: {k: r[k] for k in keys if k in r}
+    if ex:
+        return lambda r: {k: v for k, v in r.items() if k not in ex}
+    return lambda r: r
+
+def _sql_value(v: Any) -> Any:
+    if v is None or isinstance(v, (str, int, float)):
+        return v
+    if isinstance(v, (list, tuple, dict)):
+        return json.dumps(v, default=str)
+    return str(v)
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _csv_value(v: Any) -> Any:
+    return ", ".join(str(x) for x in v) if isinstance(v, (list, tuple)) else v
+
+class _NdjsonRows:
+    """Re-iterable, sized view of inventory.ndjson for exporters that take a
+    row list; every pass streams the file instead of holding the rows."""
+
+    def __init__(self, exporter: "StreamExporter"):
+        self.exporter = exporter
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self.exporter.iter_rows()
+
+    def __len__(self) -> int:
+        return self.exporter.count
+
+class StreamExporter:
+    """Writes every row to NDJSON (and CSV/SQLite when enabled) as soon as it
+    is produced, so a crash mid-run leaves everything collected so far on
+    disk. finalize() derives the pretty inventory.json, the viewer index,
+    HTML and ServiceNow exports from the NDJSON stream.
+
+    CSV is streamed only when the column set is known up front (include
+    fields); otherwise finalize() writes it in two passes over the NDJSON
+    (union of keys, then rows). With `sqlite.provider_tables` rows go to one
+    `inventory_<provider>` table per provider instead of `inventory`.
+    """
+
+    def __init__(self, out_dir: str, export_cfg: Dict[str, Any], include: List[str] = None,
+                 exclude: List[str] = None, sqlite_commit_every: int = 100):
+        self.out_dir = out_dir
+        self.export_cfg = export_cfg or {}
+        self.project = make_projection(include or [], exclude or [])
+        self.count = 0
+        self.lock = threading.Lock()
+        self.ndjson_path = os.path.join(out_dir, "inventory.ndjson")
+        self.ndjson = open(self.ndjson_path, "w", encoding="utf-8")
+
+        self.csv_file = None; self.csv_writer = None
+        if self.export_cfg.get('csv', True) and include:
+            ex = set(exclude or [])
+            fields = [k for k in dict.fromkeys(include) if k not in ex]
+            self.csv_file = open(os.path.join(out_dir, "inventory.csv"), "w", newline="", encoding="utf-8")
+            self.csv_writer = csv.DictWriter(self.csv_file, fieldnames=fields, extrasaction='ignore')
+            self.csv_writer.writeheader()
+
+        self.db = None; self.db_cols: Dict[str, List[str]] = {}
+        self.commit_every = max(1, sqlite_commit_every)
+        scfg = self.export_cfg.get('sqlite') or {}
+        self.provider_tables = bool(scfg.get('provider_tables', False))
+        if scfg.get('enabled'):
+            path = scfg.get('file') or os.path.join(out_dir, "inventory.db")
+            d = os.path.dirname(path)
+            if d: os.makedirs(d, exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            # Each run rebuilds its tables, including providers that are gone now
+            for (name,) in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND "
+                                           "(name = 'inventory' OR name LIKE 'inventory\\_%' ESCAPE '\\')").fetchall():
+                self.db.execute(f"DROP TABLE {_quote(name)}")
+
+    def _sqlite_table(self, row: Dict[str, Any]) -> str:
+        if not self.provider_tables:
+            return "inventory"
+        return "inventory_" + (re.sub(r"\W+", "_", str(row.get('provider') or 'unknown')).strip("_").lower() or "unknown")
+
+    def _sqlite_insert(self, row: Dict[str, Any]):
+        table = self._sqlite_table(row)
+        cols = self.db_cols.get(table)
+        if cols is None:
+            self.db.execute(f"CREATE TABLE {_quote(table)} (_row INTEGER PRIMARY KEY)")
+            cols = self.db_cols[table] = []
+        for k in row:
+            if k not in cols:
+                self.db.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(k)}")
+                cols.append(k)
+        keys = list(row)
+        self.db.execute(
+            f"INSERT INTO {_quote(table)} ({', '.join(_quote(k) for k in keys)}) VALUES ({', '.join('?' for _ in keys)})",
+            [_sql_value(row[k]) for k in keys])
+        if self.count % self.commit_every == 0:
+            self.db.commit()
+
+    def write(self, row: Dict[str, Any]):
+        row = self.project(row)
+        with self.lock:
+            self.count += 1
+            self.ndjson.write(json.dumps(row, default=str) + "\n")
+            self.ndjson.flush()
+            if self.csv_writer:
+                self.csv_writer.writerow({k: _csv_value(v) for k, v in row.items()})
+                self.csv_file.flush()
+            if self.db is not None and row:
+                self._sqlite_insert(row)
+
+    def close(self):
+        with self.lock:
+            if self.ndjson and not self.ndjson.closed:
+                self.ndjson.close()
+            if self.csv_file and not self.csv_file.closed:
+                self.csv_file.close()
+            if self.db is not None:
+                self.db.commit(); self.db.close(); self.db = None
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        with open(self.ndjson_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _write_pretty_json(self, path: str):
+        # Same layout as json.dump(rows, f, indent=2) without holding all rows
+        with open(path, "w", encoding="utf-8") as f:
+            first = True
+            f.write("[")
+            for row in self.iter_rows():
+                body = json.dumps(row, indent=2, default=str).replace("\n", "\n  ")
+                f.write(("\n  " if first else ",\n  ") + body)
+                first = False
+            f.write("]" if first else "\n]")
+
+    def _write_csv(self, path: str):
+        fields = list(dict.fromkeys(k for row in self.iter_rows() for k in row))
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+            w.writeheader()
+            for row in self.iter_rows():
+                w.writerow({k: _csv_value(v) for k, v in row.items()})
+
+    def finalize(self, title: str = "CMDB Inventory Report", template_dir: str = "templates"):
+        self.close()
+        json_path = os.path.join(self.out_dir, "inventory.json")
+        if self.export_cfg.get('json', True):
+            self._write_pretty_json(json_path)
+            if self.export_cfg.get('viewer_index', True):
+                # Search sidecar for inventory_viewer.py
+                build_index(self.iter_rows, sidecar_path(json_path), source=json_path)
+        if self.export_cfg.get('csv', True) and self.csv_writer is None:
+            self._write_csv(os.path.join(self.out_dir, "inventory.csv"))
+        rows = _NdjsonRows(self)
+        if self.export_cfg.get('html', True):
+            export_html(rows, os.path.join(self.out_dir, "inventory.html"), template_dir=template_dir, title=title)
+        sn_cfg: Optional[Dict[str, Any]] = self.export_cfg.get('servicenow')
+        if sn_cfg:
+            export_servicenow(rows, sn_cfg)
@@ -0,0 +1,181 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+import json, os, sqlite3, time
+
+INDEX_VERSION = 1
+MAX_INDEXED_COLUMNS = 64
+_LIKE = " LIKE ? ESCAPE '\\'"
+
+def sidecar_path(inventory_path: str) -> str:
+    """out/inventory.json (or .ndjson) -> out/inventory.viewer.db"""
+    base, _ = os.path.splitext(inventory_path)
+    return base + ".viewer.db"
+
+def cell_text(v: Any) -> str:
+    """How the viewer prints (and therefore searches) a value."""
+    if v is None:
+        return ""
+    if isinstance(v, (list, tuple)):
+        return ", ".join(str(x) for x in v)
+    return str(v)
+
+def _scalarish(v: Any) -> bool:
+    if isinstance(v, dict):
+        return False
+    if isinstance(v, (list, tuple)):
+        return all(not isinstance(x, (dict, list, tuple)) for x in v)
+    return True
+
+def _like_escape(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _fts_phrase(s: str) -> str:
+    return '"' + s.replace('"', '""') + '"'
+
+def _has_trigram(db: sqlite3.Connection) -> bool:
+    try:
+        db.execute("CREATE VIRTUAL TABLE temp._probe USING fts5(x, tokenize='trigram')")
+        db.execute("DROP TABLE temp._probe")
+        return True
+    except sqlite3.Error:
+        return False
+
+def build_index(row_source: Callable[[], Iterable[Dict[str, Any]]], path: str, source: str = "",
+                batch: int = 5000) -> int:
+    """Write the viewer sidecar from `row_source()` (called twice: once to
+    find the columns, once to load). Each row is stored as JSON plus one text
+    column per scalar field (up to MAX_INDEXED_COLUMNS), in an FTS5 trigram
+    table when SQLite supports it so substring filters are index lookups.
+    Other fields are kept in the JSON only and searched by scanning it.
+    Returns the row count."""
+    keys: Dict[str, bool] = {}
+    for row in row_source():
+        for k, v in row.items():
+            keys[k] = keys.get(k, True) and _scalarish(v)
+    columns = [k for k, ok in keys.items() if ok][:MAX_INDEXED_COLUMNS]
+
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db = sqlite3.connect(tmp)
+    db.execute("PRAGMA journal_mode=OFF"); db.execute("PRAGMA synchronous=OFF")
+    fts = _has_trigram(db)
+    cols_sql = ", ".join(f"c{i}" for i in range(len(columns)))
+    if fts:
+        db.execute(f"CREATE VIRTUAL TABLE inv USING fts5(doc UNINDEXED{', ' + cols_sql if cols_sql else ''}, tokenize='trigram')")
+    else:
+        db.execute(f"CREATE TABLE inv (rowid INTEGER PRIMARY KEY, doc TEXT{''.join(f', c{i} TEXT' for i in range(len(columns)))})")
+    db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    db.execute("CREATE TABLE columns (pos INTEGER PRIMARY KEY, name TEXT)")
+    db.executemany("INSERT INTO columns VALUES (?,?)", list(enumerate(columns)))
+
+    insert = f"INSERT INTO inv (rowid, doc{', ' + cols_sql if cols_sql else ''}) VALUES ({', '.join('?' for _ in range(len(columns) + 2))})"
+    n = 0; buf = []
+    for row in row_source():
+        n += 1
+        buf.append([n, json.dumps(row, default=str)] + [cell_text(row.get(c)) for c in columns])
+        if len(buf) >= batch:
+            db.executemany(insert, buf); buf = []
+    if buf:
+        db.executemany(insert, buf)
+    db.executemany("INSERT INTO meta VALUES (?,?)", [
+        ('version', str(INDEX_VERSION)), ('rows', str(n)), ('fts', '1' if fts else '0'),
+        ('source', os.path.basename(source)), ('built_at', str(int(time.time()))),
+        ('all_columns', json.dumps(list(keys)))])
+    db.commit(); db.close()
+    os.replace(tmp, path)
+    return n
+
+class IndexStore:
+    """Read side of the sidecar: row count, lazy row fetch by row number and
+    substring/field search returning row numbers. Row numbers are 1-based and
+    follow the inventory order."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        meta = dict(self.db.execute("SELECT key, value FROM meta"))
+        if int(meta.get('version', 0)) != INDEX_VERSION:
+            raise ValueError(f"unsupported viewer index version in {path}")
+        self.fts = meta.get('fts') == '1'
+        self.rows = int(meta.get('rows', 0))
+        self.indexed: List[str] = [name for _, name in self.db.execute("SELECT pos, name FROM columns ORDER BY pos")]
+        self.col_pos = {name: i for i, name in enumerate(self.indexed)}
+        self.all_columns: List[str] = json.loads(meta.get('all_columns') or 'null') or list(self.indexed)
+
+    @classmethod
+    def open_for(cls, inventory_path: str) -> Optional["IndexStore"]:
+        """The sidecar next to `inventory_path`, if present and not older than it."""
+        path = sidecar_path(inventory_path)
+        try:
+            if os.path.getmtime(path) + 1 < os.path.getmtime(inventory_path):
+                return None
+            return cls(path)
+        except (OSError, ValueError, sqlite3.Error):
+            return None
+
+    def count(self) -> int:
+        return self.rows
+
+    def columns(self) -> List[str]:
+        return list(self.all_columns)
+
+    def get(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        ids = list(ids)
+        if not ids:
+            return []
+        found = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            for rid, doc in self.db.execute(
+                    f"SELECT rowid, doc FROM inv WHERE rowid IN ({', '.join('?' for _ in chunk)})", chunk):
+                found[rid] = json.loads(doc)
+        return [found[i] for i in ids if i in found]
+
+    def column_values(self, cols: Sequence[str]) -> Dict[str, List[str]]:
+        """Display text of each column for every row, in row order."""
+        out: Dict[str, List[str]] = {}
+        direct = [c for c in cols if c in self.col_pos]
+        if direct:
+            res = self.db.execute(f"SELECT {', '.join(f'c{self.col_pos[c]}' for c in direct)} FROM inv ORDER BY rowid").fetchall()
+            for i, c in enumerate(direct):
+                out[c] = [r[i] or "" for r in res]
+        rest = [c for c in cols if c not in self.col_pos]
+        if rest:
+            lists: List[List[str]] = [[] for _ in rest]
+            for (doc,) in self.db.execute("SELECT doc FROM inv ORDER BY rowid"):
+                row = json.loads(doc)
+                for lst, c in zip(lists, rest):
+                    lst.append(cell_text(row.get(c)))
+            out.update(zip(rest, lists))
+        return out
+
+    def search(self, needle: str, cols: Sequence[str]) -> List[int]:
+        """Row numbers whose text in any of `cols` contains `needle` (case-insensitive)."""
+        if not needle or not cols:
+            return []
+        names = [f"c{self.col_pos[c]}" for c in cols if c in self.col_pos]
+        hits: List[int] = []
+        if names:
+            if self.fts and len(needle) >= 3:
+                sql = "SELECT rowid FROM inv WHERE inv MATCH ? ORDER BY rowid"
+                args = ["{" + " ".join(names) + "} : " + _fts_phrase(needle)]
+            else:
+                # Trigrams need 3 characters; shorter needles scan the text columns
+                pat = "%" + _like_escape(needle) + "%"
+                sql = f"SELECT rowid FROM inv WHERE {' OR '.join(n + _LIKE for n in names)} ORDER BY rowid"
+                args = [pat] * len(names)
+            hits = [r[0] for r in self.db.execute(sql, args)]
+        rest = [c for c in cols if c not in self.col_pos]
+        if rest:
+            # Not indexed (nested values, or past MAX_INDEXED_COLUMNS): scan the stored rows
+            n = needle.lower(); found = set(hits)
+            for rid, doc in self.db.execute("SELECT rowid, doc FROM inv ORDER BY rowid"):
+                if rid not in found:
+                    row = json.loads(doc)
+                    if any(n in cell_text(row.get(c)).lower() for c in rest):
+                        found.add(rid)
+            hits = sorted(found)
+        return hits
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,343 @@
+from typing import Dict, Any, List, Optional, Tuple
+import ipaddress
+
+# Identity keys a target can be matched on (identity.keys in config)
+DEFAULT_KEYS = ('fqdn', 'short', 'ip', 'azure', 'vsphere')
+# Whose host/provider/id a merged machine keeps, and whose attributes win
+# (identity.provider_priority); unlisted providers follow in name order
+DEFAULT_PRIORITY = ('active_directory', 'azure', 'vsphere', 'onprem', 'manual', 'local-network')
+# Discovery fields that are identifiers rather than attributes to merge
+_PER_SOURCE = ('host', 'provider', 'source')
+
+def _ip(s: str) -> Optional[str]:
+    try:
+        ip = ipaddress.ip_address(s.strip())
+    except ValueError:
+        return None
+    if ip.is_loopback or ip.is_link_local or ip.is_unspecified or ip.is_multicast:
+        return None
+    return str(ip)
+
+def _is_ip(s: str) -> bool:
+    try:
+        ipaddress.ip_address(s.strip())
+        return True
+    except ValueError:
+        return False
+
+def _as_list(v: Any) -> List[Any]:
+    if v in (None, ''):
+        return []
+    return list(v) if isinstance(v, (list, tuple, set)) else [v]
+
+class _Entity:
+    __slots__ = ('target', 'sources', 'named', 'dispatched', 'dropped', 'late')
+
+    def __init__(self, target: Dict[str, Any], named: bool):
+        self.target = target
+        self.sources: List[Dict[str, Any]] = [dict(target)]   # targets as discovered
+        self.named = named   # has a host name, not just addresses
+        self.dispatched = False
+        self.dropped = False
+        self.late: Dict[str, Any] = {}
+
+class IdentityResolver:
+    """Union-find over discovery targets.
+
+    Every target contributes keys (FQDN, short name, IPs, Azure VM ID /
+    resource ID, vSphere UUID); targets sharing any key are one machine. The
+    first target of a group is the canonical dict that collection receives;
+    while it is queued it is rebuilt from all of the group's discovered
+    targets in `provider_priority` order, whatever order they arrived in:
+    host, provider and id come from the highest-priority source (the host
+    upgraded to the first FQDN), missing attributes are filled in from the
+    others, IPs are unioned, and `providers` / `aliases` record where it
+    was seen and under which names. Once it has been handed to collection
+    (dispatched), later matches are kept in `late` and applied to the
+    collected row instead.
+
+    Short names are only matched while they map to a single FQDN, so
+    web01.corp.local and web01.dmz.local stay apart. Addresses only attach
+    name-less targets (subnet scan hits) to a machine and never join two
+    named ones, since private ranges repeat across VNets and sites; an
+    address shared by several named machines attaches nothing. Not
+    thread-safe; the TargetQueue calls it under its lock.
+    """
+
+    def __init__(self, cfg: Dict[str, Any] = None):
+        cfg = cfg or {}
+        self.enabled = cfg.get('enabled', True)
+        self.keys = set(cfg.get('keys') or DEFAULT_KEYS)
+        self.priority = [str(p) for p in (cfg.get('provider_priority') or DEFAULT_PRIORITY)]
+        self.parent: List[int] = []
+        self.owner: Dict[str, int] = {}          # key -> node
+        self.ip_nodes: Dict[str, List[int]] = {} # address -> nodes that reported it
+        self.entity: Dict[int, _Entity] = {}     # root node -> entity
+        # id(target) -> (target, node); holding the target keeps its id from being reused
+        self.node_of: Dict[int, Tuple[Dict[str, Any], int]] = {}
+        self.short_fqdn: Dict[str, Optional[str]] = {}  # short name -> the FQDN it stands for ('' = ambiguous)
+        self.merged = 0
+        self.late_merges = 0
+        self.late_duplicates = 0
+
+    def _node(self, t: Dict[str, Any]) -> Optional[int]:
+        entry = self.node_of.get(id(t))
+        return entry[1] if entry is not None and entry[0] is t else None
+
+    # --- union-find ----------------------------------------------------
+    def _find(self, n: int) -> int:
+        root = n
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[n] != root:
+            self.parent[n], n = root, self.parent[n]
+        return root
+
+    def _new_node(self) -> int:
+        self.parent.append(len(self.parent))
+        return len(self.parent) - 1
+
+    # --- keys ----------------------------------------------------------
+    def _names(self, t: Dict[str, Any], names: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+        """[(fqdn or '', short)] for the non-IP names of a target."""
+        out = []
+        for n in names if names is not None else [t.get('host'), t.get('resolved_name')]:
+            n = (n or '').strip().lower().rstrip('.')
+            if not n or _is_ip(n):
+                continue
+            out.append((n if '.' in n else '', n.split('.', 1)[0]))
+        return out
+
+    def _keys(self, t: Dict[str, Any], names: Optional[List[str]] = None) -> Tuple[List[str], List[Tuple[str, str]]]:
+        keys: List[str] = []
+        shorts: List[Tuple[str, str]] = []
+        for fqdn, short in self._names(t, names):
+            if fqdn and 'fqdn' in self.keys:
+                keys.append('n:' + fqdn)
+            if 'short' in self.keys:
+                shorts.append((fqdn, short))
+        if names is None:
+            if 'azure' in self.keys:
+                for k in ('vm_id', 'vmId'):
+                    if t.get(k): keys.append('vmid:' + str(t[k]).lower())
+                if t.get('provider') == 'azure' and t.get('id'):
+                    keys.append('azid:' + str(t['id']).lower())
+            if 'vsphere' in self.keys:
+                for k in ('uuid', 'instance_uuid'):
+                    if t.get(k): keys.append('uuid:' + str(t[k]).lower())
+        return keys, shorts
+
+    def _short_key(self, fqdn: str, short: str) -> Optional[str]:
+        """'s:<short>' if this name may join on its short name, else None."""
+        seen = self.short_fqdn.get(short)
+        if seen == '':
+            return None
+        if seen is None:
+            if short not in self.short_fqdn or fqdn:
+                self.short_fqdn[short] = fqdn or None
+            return 's:' + short
+        if not fqdn or fqdn == seen:
+            return 's:' + short
+        self.short_fqdn[short] = ''   # a second domain: short name no longer identifies a machine
+        return None
+
+    def _ips(self, t: Dict[str, Any]) -> List[str]:
+        if 'ip' not in self.keys:
+            return []
+        out = []
+        for v in _as_list(t.get('ips')) + [t.get('host') or '']:
+            ip = _ip(str(v)) if v else None
+            if ip and ip not in out:
+                out.append(ip)
+        return out
+
+    def _ip_hits(self, ips: List[str], named: bool) -> List[int]:
+        """Machines an address match may join: for a named target only
+        name-less ones; for a name-less target those plus the one named
+        machine owning the address (none when several do)."""
+        roots = {self._find(n) for ip in ips for n in self.ip_nodes.get(ip, ())}
+        nameless = [r for r in roots if not self.entity[r].named]
+        owners = [r for r in roots if self.entity[r].named]
+        return nameless + (owners if not named and len(owners) == 1 else [])
+
+    # --- merging -------------------------------------------------------
+    @staticmethod
+    def _fold(into: Dict[str, Any], other: Dict[str, Any]):
+        for k, v in other.items():
+            if k in _PER_SOURCE or k in ('providers', 'aliases'):
+                continue
+            if k == 'ips':
+                cur = _as_list(into.get('ips'))
+                into['ips'] = cur + [x for x in _as_list(v) if x not in cur]
+            elif into.get(k) in (None, '', []):
+                into[k] = v
+        providers = into.setdefault('providers', [into.get('provider')] if into.get('provider') else [])
+        for p in _as_list(other.get('providers')) + [other.get('provider')]:
+            if p and p not in providers:
+                providers.append(p)
+        aliases = set(into.get('aliases') or ())
+        for h in _as_list(other.get('aliases')) + [other.get('host')]:
+            if h and h.lower() != (into.get('host') or '').lower():
+                aliases.add(h)
+        if aliases:
+            into['aliases'] = sorted(aliases)
+
+    @staticmethod
+    def _better_host(cur: str, new: str) -> bool:
+        cur, new = cur or '', new or ''
+        return bool(new) and '.' in new and not _is_ip(new) and ('.' not in cur or _is_ip(cur))
+
+    def _rank(self, t: Dict[str, Any]) -> Tuple[int, str, str]:
+        p = str(t.get('provider') or '')
+        return (self.priority.index(p) if p in self.priority else len(self.priority), p, str(t.get('host') or '').lower())
+
+    @classmethod
+    def _combine(cls, sources: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """One target from `sources`, highest priority first."""
+        out = {k: v for k, v in sources[0].items() if k not in ('providers', 'aliases')}
+        for s in sources[1:]:
+            if cls._better_host(out.get('host'), s.get('host')):
+                out['host'] = s['host']
+        for s in sources[1:]:
+            cls._fold(out, s)
+        names = [s.get('host') for s in sources] + [a for s in sources for a in _as_list(s.get('aliases'))]
+        aliases = {h for h in names if h and h.lower() != (out.get('host') or '').lower()}
+        if aliases:
+            out['aliases'] = sorted(aliases)
+        return out
+
+    def _merge(self, ent: _Entity, sources: List[Dict[str, Any]], extra: Optional[Dict[str, Any]] = None):
+        if ent.dispatched:
+            for s in sources:
+                self._fold(ent.late, s)
+            self.late_merges += 1
+            return
+        ent.sources = sorted(ent.sources + sources, key=self._rank)
+        t = ent.target
+        merged = self._combine(ent.sources)
+        # Keep what was added after discovery (e.g. resolved_name from bulk DNS)
+        for d in (t, extra or {}):
+            for k, v in d.items():
+                if k not in merged and k not in ('providers', 'aliases'):
+                    merged[k] = v
+        t.clear(); t.update(merged)
+
+    def _union_all(self, nodes: List[int]) -> int:
+        roots = sorted({self._find(n) for n in nodes})
+        keep = roots[0]   # lowest node = first seen
+        for r in roots[1:]:
+            self.parent[r] = keep
+            gone = self.entity.pop(r)
+            ent = self.entity[keep]
+            ent.named = ent.named or gone.named
+            if gone.dispatched and ent.dispatched:
+                self.late_duplicates += 1   # both already collected; nothing left to save
+                continue
+            if gone.dispatched:
+                # The survivor is still queued: drop it rather than collect twice
+                ent, gone = gone, ent
+                self.entity[keep] = ent
+                self.node_of[id(ent.target)] = (ent.target, keep)
+            gone.dropped = True
+            self._merge(ent, gone.sources, gone.target)
+            self.merged += 1
+        return keep
+
+    def add(self, t: Dict[str, Any], names: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Register `t`. Returns None if it is a new machine (t becomes
+        canonical), else the canonical target it was merged into.
+        With `names`, only those extra names (e.g. a PTR answer) are added
+        as keys for an already registered canonical `t`."""
+        if not self.enabled:
+            return None
+        keys, shorts = self._keys(t, names)
+        keys += [k for k in (self._short_key(f, s) for f, s in shorts) if k]
+        if names is not None:
+            node = self._node(t)
+            if node is None:
+                return None
+            hits = [self.owner[k] for k in keys if k in self.owner]
+            for k in keys:
+                self.owner.setdefault(k, node)
+            if keys:
+                self.entity[self._find(node)].named = True
+            if not hits:
+                return None
+            root = self._union_all([node] + hits)
+            ent = self.entity[root]
+            return ent.target if ent.target is not t else None
+        named = bool(self._names(t))
+        ips = self._ips(t)
+        hits = [self.owner[k] for k in keys if k in self.owner] + self._ip_hits(ips, named)
+        if not hits:
+            node = self._new_node()
+            self.entity[node] = _Entity(t, named)
+            self.node_of[id(t)] = (t, node)
+            for k in keys:
+                self.owner[k] = node
+            for ip in ips:
+                self.ip_nodes.setdefault(ip, []).append(node)
+            return None
+        root = self._union_all(hits)
+        for k in keys:
+            self.owner.setdefault(k, root)
+        for ip in ips:
+            if root not in self.ip_nodes.setdefault(ip, []):
+                self.ip_nodes[ip].append(root)
+        self.entity[root].named = self.entity[root].named or named
+        ent = self.entity[root]
+        self._merge(ent, [dict(t)])
+        self.merged += 1
+        return ent.target
+
+    def update(self, t: Dict[str, Any], attrs: Dict[str, Any]):
+        """Add attributes computed for `t` after it was registered (bulk DNS):
+        to `t` while it is canonical, else to its machine's target where
+        missing, or to `late` once that has been dispatched."""
+        if not attrs:
+            return
+        node = self._node(t)
+        ent = self.entity.get(self._find(node)) if node is not None else None
+        if ent is None or ent.target is t:
+            t.update(attrs)
+            return
+        into = ent.late if ent.dispatched else ent.target
+        for k, v in attrs.items():
+            if into.get(k) in (None, '', []):
+                into[k] = v
+
+    def is_canonical(self, t: Dict[str, Any]) -> bool:
+        """False if `t` has been folded into another target."""
+        node = self._node(t)
+        if node is None:
+            return True
+        ent = self.entity.get(self._find(node))
+        return ent is not None and ent.target is t
+
+    def dispatch(self, t: Dict[str, Any]) -> bool:
+        """Mark a canonical target as handed to collection. False if it was
+        folded into another target meanwhile and must be skipped."""
+        if not self.is_canonical(t):
+            return False
+        node = self._node(t)
+        if node is not None:
+            self.entity[self._find(node)].dispatched = True
+        return True
+
+    def late_attrs(self, t: Dict[str, Any]) -> Dict[str, Any]:
+        """Attributes of targets matched after `t` was dispatched."""
+        node = self._node(t)
+        if node is None:
+            return {}
+        ent = self.entity.get(self._find(node))
+        return dict(ent.late) if ent is not None and ent.target is t else {}
+
+    def stats(self) -> Dict[str, int]:
+        return {'machines': len(self.entity), 'merged': self.merged,
+                'late_merges': self.late_merges, 'late_duplicates': self.late_duplicates}
+
+def apply_late(row: Dict[str, Any], late: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold attributes matched after collection started into the row."""
+    if late:
+        IdentityResolver._fold(row, late)
+    return row
@@ -0,0 +1,132 @@
+from typing import Dict, Any, List, Tuple
+import hashlib, json, os, sqlite3, time
+
+# Discovery attributes that change when a machine is rebuilt, re-addressed or
+# modified in its source of record (AD whenChanged, vSphere changeVersion).
+FINGERPRINT_KEYS = ('provider', 'id', 'vm_id', 'vmId', 'uuid', 'instance_uuid',
+                    'ips', 'whenChanged', 'changeVersion')
+
+def fingerprint(t: Dict[str, Any]) -> str:
+    parts = {}
+    for k in FINGERPRINT_KEYS:
+        v = t.get(k)
+        if v in (None, '', []):
+            continue
+        if k == 'ips':
+            v = sorted(str(x) for x in ([v] if isinstance(v, str) else v))
+        parts[k] = v
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode('utf-8')).hexdigest()
+
+def _key(row: Dict[str, Any]) -> str:
+    return (row.get('host') or '').lower()
+
+def load_previous_rows(path: str) -> Dict[str, Dict[str, Any]]:
+    """Previous inventory keyed by lower-cased host, from inventory.json or a sqlite DB
+    (the inventory table or the per-provider inventory_* tables)."""
+    rows: List[Dict[str, Any]] = []
+    if not path or not os.path.exists(path):
+        return {}
+    if path.endswith('.db'):
+        con = sqlite3.connect(path)
+        con.row_factory = sqlite3.Row
+        try:
+            # One inventory table, or inventory_<provider> with sqlite.provider_tables
+            tables = [n for (n,) in con.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND "
+                "(name = 'inventory' OR name LIKE 'inventory\\_%' ESCAPE '\\') ORDER BY name")]
+            for r in (r for t in tables for r in con.execute('SELECT * FROM "%s"' % t.replace('"', '""'))):
+                row = {}
+                for k in r.keys():
+                    v = r[k]
+                    # _row is the table key; NULL is a column another row added
+                    if k == '_row' or v is None:
+                        continue
+                    if isinstance(v, str) and v[:1] in ('[', '{'):
+                        try: v = json.loads(v)
+                        except ValueError: pass
+                    row[k] = v
+                rows.append(row)
+        except sqlite3.Error:
+            return {}
+        finally:
+            con.close()
+    else:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        rows = data if isinstance(data, list) else []
+    return {_key(r): r for r in rows if isinstance(r, dict) and _key(r)}
+
+def load_state(path: str) -> Dict[str, Any]:
+    if not path or not os.path.exists(path):
+        return {'hosts': {}}
+    try:
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {'hosts': {}}
+    state.setdefault('hosts', {})
+    return state
+
+def save_state(path: str, state: Dict[str, Any]):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+def max_age_seconds(icfg: Dict[str, Any], t: Dict[str, Any]) -> float:
+    """Per-host override, then per-provider, then incremental.max_age_hours."""
+    hours = icfg.get('max_age_hours', 168)
+    per_provider = icfg.get('providers') or {}
+    per_host = {str(k).lower(): v for k, v in (icfg.get('hosts') or {}).items()}
+    if t.get('provider') in per_provider:
+        hours = per_provider[t.get('provider')]
+    if _key(t) in per_host:
+        hours = per_host[_key(t)]
+    return float(hours) * 3600.0
+
+def plan(targets: List[Dict[str, Any]], previous: Dict[str, Dict[str, Any]], state: Dict[str, Any],
+         icfg: Dict[str, Any], now: float = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split targets into (to_collect, carried_rows).
+
+    A host is carried over when its previous row exists, its fingerprint is
+    unchanged and its last collection is younger than its max age. Carried
+    rows are the previous row refreshed with the current discovery fields.
+    """
+    now = time.time() if now is None else now
+    hosts = state.get('hosts') or {}
+    to_collect, carried = [], []
+    for t in targets:
+        key = _key(t)
+        prev, seen = previous.get(key), hosts.get(key)
+        if (prev is not None and seen and seen.get('fingerprint') == fingerprint(t)
+                and now - float(seen.get('collected_at', 0)) < max_age_seconds(icfg, t)):
+            row = dict(prev); row.update(t)
+            carried.append(row)
+        else:
+            to_collect.append(t)
+    return to_collect, carried
+
+def update_state(state: Dict[str, Any], targets: List[Dict[str, Any]], rows: List[Dict[str, Any]],
+                 carried: List[Dict[str, Any]], now: float = None, prune: bool = True) -> Dict[str, Any]:
+    """Record the targets collected this run and drop hosts that vanished.
+
+    Fingerprints come from the discovery targets (collectors may overwrite
+    fields in the row); hosts whose row carries an error are forgotten so
+    they are retried next run. With prune=False (a discovery provider
+    failed) hosts not seen this run keep their entries.
+    """
+    now = time.time() if now is None else now
+    old = state.get('hosts') or {}
+    failed = {_key(r) for r in rows if r.get('error')}
+    hosts = {} if prune else {k: v for k, v in old.items() if k not in failed}
+    for row in carried:
+        key = _key(row)
+        if key in old:
+            hosts[key] = old[key]
+    for t in targets:
+        key = _key(t)
+        if key and key not in failed:
+            hosts[key] = {'fingerprint': fingerprint(t), 'collected_at': now}
+    state['hosts'] = hosts
+    return state
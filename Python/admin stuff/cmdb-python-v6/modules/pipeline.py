@@ -0,0 +1,142 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from collections import deque
+import sys, threading
+
+from modules.identity import IdentityResolver
+
+class TargetQueue:
+    """Deduplicating hand-off between discovery providers and collection.
+
+    Providers call put_many() from their own threads as soon as they have
+    results and producer_done() when finished; collection pulls with
+    get_nowait()/wait() while discovery is still running. Targets are
+    merged per machine by `resolver` (FQDN, short name, IPs, cloud IDs; see
+    modules.identity) before `prepare` (e.g. bulk DNS) runs on each batch
+    outside the lock. It works on copies, since another producer may rebuild
+    a canonical target meanwhile; what it added is folded back under the
+    lock, and names it learned (resolved_name) can merge further targets.
+
+    `select` (e.g. the incremental planner) needs every machine in its
+    final, merged form, so with it targets are held until the last
+    producer finishes and select() then decides, once, what is queued.
+    """
+
+    def __init__(self, producers: int = 0, prepare: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None,
+                 resolver: Optional[IdentityResolver] = None,
+                 select: Optional[Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]] = None):
+        self.cond = threading.Condition()
+        self.items: deque = deque()
+        self.seen = set()
+        self.open_producers = producers
+        self.prepare = prepare
+        self.select = select
+        self.held: List[Dict[str, Any]] = []
+        self.resolver = resolver or IdentityResolver()
+        self.total = 0
+        self.duplicates = 0
+        self.failed: List[str] = []   # providers that raised; their hosts are missing
+
+    @classmethod
+    def from_list(cls, targets: Iterable[Dict[str, Any]]) -> "TargetQueue":
+        q = cls(producers=1)
+        q.put_many(targets)
+        q.producer_done()
+        return q
+
+    def put_many(self, targets: Iterable[Dict[str, Any]]) -> int:
+        batch = []
+        with self.cond:
+            for t in targets or []:
+                h = t.get('host')
+                if not h: continue
+                key = h.lower()
+                if self.resolver.add(t) is not None or key in self.seen:
+                    self.duplicates += 1; continue
+                self.seen.add(key); batch.append(t)
+        if batch and self.prepare:
+            with self.cond:
+                copies = [(t, dict(t), dict(t)) for t in batch]
+            by_copy = {id(c): (t, before) for t, before, c in copies}
+            out = self.prepare([c for _, _, c in copies]) or []
+            batch = []
+            with self.cond:
+                for c in out:
+                    if id(c) not in by_copy:
+                        continue
+                    t, before = by_copy[id(c)]
+                    self.resolver.update(t, {k: v for k, v in c.items() if k not in before or before[k] != v})
+                    batch.append(t)
+        with self.cond:
+            kept = []
+            for t in batch:
+                if t.get('resolved_name') and self.resolver.add(t, [t['resolved_name']]) is not None:
+                    self.duplicates += 1; continue
+                kept.append(t)
+            if self.select:
+                self.held.extend(kept)
+            else:
+                self.items.extend(kept)
+                self.total += len(kept)
+                self.cond.notify_all()
+        return len(kept)
+
+    def producer_done(self):
+        with self.cond:
+            last = self.open_producers <= 1
+            held, self.held = (self.held, []) if self.select and last else ([], self.held)
+        if held:
+            # Only this thread is left; the queue stays open until select() is done
+            with self.cond:
+                held = [t for t in held if self.resolver.is_canonical(t)]
+            try:
+                held = self.select(held) or []
+            except Exception as e:
+                print(f"Target selection failed, collecting every target: {e}", file=sys.stderr)
+        with self.cond:
+            self.items.extend(held)
+            self.total += len(held)
+            self.open_producers -= 1
+            self.cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        with self.cond:
+            return self.open_producers <= 0
+
+    @property
+    def exhausted(self) -> bool:
+        with self.cond:
+            return self.open_producers <= 0 and not self.items
+
+    def get_nowait(self) -> List[Dict[str, Any]]:
+        """Everything currently queued (possibly nothing). Targets merged into
+        another one while queued are dropped here."""
+        with self.cond:
+            out = []
+            for t in self.items:
+                if self.resolver.dispatch(t):
+                    out.append(t)
+                else:
+                    self.total -= 1; self.duplicates += 1
+            self.items.clear()
+            return out
+
+    def late_attrs(self, t: Dict[str, Any]) -> Dict[str, Any]:
+        """Attributes of targets that matched `t` after it was handed out."""
+        with self.cond:
+            return self.resolver.late_attrs(t)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until targets are queued or all producers finished."""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.items or self.open_producers <= 0, timeout)
+
+    def __iter__(self):
+        while True:
+            self.wait()
+            batch = self.get_nowait()
+            if not batch:
+                if self.exhausted:
+                    return
+                continue
+            yield from batch
@@ -0,0 +1,190 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing as mp
+import queue, signal, sys, time, traceback
+
+# Items a shard may hold (queued + running) per thread before the parent
+# keeps further work back; keeps shards balanced without starving threads.
+IN_FLIGHT_PER_THREAD = 2
+
+def _shard_main(idx: int, threads: int, init: Optional[Callable], init_args: Tuple, work: Callable,
+                finalize: Optional[Callable], inbox, outbox):
+    """Worker process: `threads` threads run work(state, item) for every
+    (token, item) sent by the parent and stream results back."""
+    # Ctrl-C is handled by the parent, which terminates the shards
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        state = init(*init_args) if init else None
+    except Exception:
+        outbox.put(('fatal', idx, traceback.format_exc()))
+        return
+
+    def done(token, fut):
+        try:
+            outbox.put(('result', idx, token, True, fut.result()))
+        except Exception as e:
+            outbox.put(('result', idx, token, False, f"{type(e).__name__}: {e}"))
+
+    with ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix=f"shard{idx}") as ex:
+        while True:
+            batch = inbox.get()
+            if batch is None:
+                break
+            for token, item in batch:
+                ex.submit(work, state, item).add_done_callback(lambda f, tok=token: done(tok, f))
+    stats = None
+    try:
+        stats = finalize(state) if finalize else None
+    except Exception:
+        print(f"shard {idx}: finalize failed\n{traceback.format_exc()}", file=sys.stderr)
+    outbox.put(('done', idx, stats))
+
+class ShardPool:
+    """N worker processes, each with its own thread pool.
+
+    Threads inside one process still share a GIL, so CPU-heavy per-item work
+    (SSH key exchange, WinRM XML parsing, transforms) stops scaling with
+    thread count; shards spread it across cores. The parent submit()s items
+    and reads results() as they finish. `init`, `work` and `finalize` must
+    be module-level functions (they are pickled by reference into the
+    children); `init(*init_args)` builds per-process state once,
+    `work(state, item)` runs per item and `finalize(state)` returns per-shard
+    stats that end up in `shard_stats`.
+
+    Each item goes to the shard with the fewest outstanding items, at most
+    threads x IN_FLIGHT_PER_THREAD per shard; the rest wait in the parent.
+    If a shard process dies (nonzero exit, or no 'done' message) its
+    outstanding items are reported as failed, and once no shard is left the
+    items still waiting in the parent are too.
+    """
+
+    def __init__(self, processes: int, threads: int, work: Callable, init: Optional[Callable] = None,
+                 init_args: Tuple = (), finalize: Optional[Callable] = None, start_method: str = 'spawn'):
+        self.processes = max(1, int(processes))
+        self.threads = max(1, int(threads))
+        self.ctx = mp.get_context(start_method)
+        self.outbox = self.ctx.Queue()
+        self.inboxes = [self.ctx.Queue() for _ in range(self.processes)]
+        self.procs = [self.ctx.Process(target=_shard_main, name=f"cmdb-shard{i}", daemon=True,
+                                       args=(i, self.threads, init, init_args, work, finalize, self.inboxes[i], self.outbox))
+                      for i in range(self.processes)]
+        self.cap = self.threads * IN_FLIGHT_PER_THREAD
+        self.outstanding: List[Dict[int, Any]] = [dict() for _ in range(self.processes)]
+        self.backlog: List[Tuple[int, Any]] = []
+        self.completed = [0] * self.processes
+        self.shard_stats: List[Any] = [None] * self.processes
+        self.finished = [False] * self.processes
+        self.stopped = [False] * self.processes
+        self.closing = False
+        self.next_token = 0
+        self.last_lost = 0
+
+    def start(self) -> "ShardPool":
+        for p in self.procs:
+            p.start()
+        return self
+
+    def submit(self, item: Any) -> int:
+        token = self.next_token; self.next_token += 1
+        self.backlog.append((token, item))
+        self._dispatch()
+        return token
+
+    def close_input(self):
+        """No more submit() calls; shards exit once their work is done."""
+        self.closing = True
+        self._dispatch()
+
+    def _dispatch(self):
+        per_shard: Dict[int, List[Tuple[int, Any]]] = {}
+        live = [i for i in range(self.processes) if not self.finished[i]]
+        while self.backlog and live:
+            i = min(live, key=lambda s: len(self.outstanding[s]))
+            if len(self.outstanding[i]) >= self.cap:
+                break
+            token, item = self.backlog.pop(0)
+            self.outstanding[i][token] = item
+            per_shard.setdefault(i, []).append((token, item))
+        for i, batch in per_shard.items():
+            self.inboxes[i].put(batch)
+        if self.closing and not self.backlog:
+            for i in live:
+                if not self.stopped[i]:
+                    self.inboxes[i].put(None)
+                    self.stopped[i] = True
+
+    @property
+    def pending(self) -> int:
+        return len(self.backlog) + sum(len(o) for o in self.outstanding)
+
+    @property
+    def done(self) -> bool:
+        return self.closing and all(self.finished) and not self.backlog
+
+    def results(self, timeout: float = 0.2) -> Iterator[Tuple[int, int, Any, bool, Any]]:
+        """(shard, token, item, ok, result-or-error) for whatever finished within
+        `timeout`; call repeatedly until `done`."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                msg = self.outbox.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            yield from self._handle(msg)
+            if time.monotonic() >= deadline:
+                break
+        exited = [idx for idx, p in enumerate(self.procs)
+                  if not self.finished[idx] and not p.is_alive() and p.exitcode is not None]
+        if exited:
+            # A shard sends its last results and 'done' right before exiting:
+            # read everything it left in the queue before calling it lost
+            while True:
+                try:
+                    msg = self.outbox.get(timeout=0.05)
+                except queue.Empty:
+                    break
+                yield from self._handle(msg)
+            for idx in exited:
+                if not self.finished[idx]:
+                    code = self.procs[idx].exitcode
+                    yield from self._lost(idx, f"shard process exited with code {code}" if code
+                                          else "shard process exited without reporting done")
+        self._dispatch()
+        if self.backlog and all(self.finished):
+            # Every shard is gone: nothing will ever take the waiting items
+            stranded, self.backlog = self.backlog, []
+            for token, item in stranded:
+                yield self.last_lost, token, item, False, "no shard process left"
+
+    def _handle(self, msg) -> Iterator[Tuple[int, int, Any, bool, Any]]:
+        kind, idx = msg[0], msg[1]
+        if kind == 'result':
+            _, _, token, ok, value = msg
+            item = self.outstanding[idx].pop(token, None)
+            self.completed[idx] += 1
+            yield idx, token, item, ok, value
+        elif kind == 'done':
+            self.shard_stats[idx] = msg[2]
+            self.finished[idx] = True
+        elif kind == 'fatal':
+            print(f"shard {idx} failed to start:\n{msg[2]}", file=sys.stderr)
+            yield from self._lost(idx, "shard failed to start")
+        self._dispatch()
+
+    def _lost(self, idx: int, reason: str) -> Iterator[Tuple[int, int, Any, bool, Any]]:
+        self.finished[idx] = True
+        self.last_lost = idx
+        lost, self.outstanding[idx] = self.outstanding[idx], {}
+        for token, item in lost.items():
+            yield idx, token, item, False, reason
+
+    def summary(self) -> Dict[str, Any]:
+        return {'processes': self.processes, 'threads_per_process': self.threads,
+                'completed': list(self.completed),
+                'exitcodes': [p.exitcode for p in self.procs]}
+
+    def join(self, timeout: float = 10.0):
+        for p in self.procs:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
@@ -0,0 +1,142 @@
+from typing import Dict, Any, List
+from collections import Counter
+from contextlib import contextmanager
+import json, sys, threading, time
+
+# Histogram bucket upper bounds in seconds (last bucket is open ended)
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _percentile(sorted_vals: List[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, int(round(pct / 100.0 * (len(sorted_vals) - 1)))))
+    return sorted_vals[idx]
+
+def _histogram(vals: List[float]) -> Dict[str, int]:
+    counts = Counter()
+    for v in vals:
+        for b in BUCKETS:
+            if v <= b:
+                counts[f"<={b}s"] += 1
+                break
+        else:
+            counts[f">{BUCKETS[-1]}s"] += 1
+    return {k: counts[k] for k in [f"<={b}s" for b in BUCKETS] + [f">{BUCKETS[-1]}s"] if counts[k]}
+
+class Timings:
+    """Thread-safe wall-clock recorder for run phases and per-host steps."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.phases: Dict[str, float] = {}
+            self.hosts: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            dt = time.perf_counter() - t0
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0.0) + dt
+
+    @contextmanager
+    def step(self, host: str, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(host, name, time.perf_counter() - t0)
+
+    def record(self, host: str, name: str, seconds: float):
+        with self.lock:
+            steps = self.hosts.setdefault(host or '?', {})
+            steps[name] = steps.get(name, 0.0) + seconds
+
+    def merge(self, hosts: Dict[str, Dict[str, float]]):
+        """Add per-host step times recorded elsewhere (e.g. in a shard process)."""
+        with self.lock:
+            for host, steps in hosts.items():
+                mine = self.hosts.setdefault(host, {})
+                for name, v in steps.items():
+                    mine[name] = mine.get(name, 0.0) + v
+
+    def report(self, top_n: int = 25) -> Dict[str, Any]:
+        with self.lock:
+            phases = dict(self.phases)
+            hosts = {h: dict(s) for h, s in self.hosts.items()}
+        per_step: Dict[str, List[float]] = {}
+        for steps in hosts.values():
+            for name, v in steps.items():
+                per_step.setdefault(name, []).append(v)
+        steps_out = {}
+        for name, vals in sorted(per_step.items()):
+            vals.sort()
+            steps_out[name] = {'count': len(vals), 'total_s': round(sum(vals), 3),
+                               'p50_s': round(_percentile(vals, 50), 3), 'p95_s': round(_percentile(vals, 95), 3),
+                               'p99_s': round(_percentile(vals, 99), 3), 'max_s': round(vals[-1], 3),
+                               'histogram': _histogram(vals)}
+        slowest = sorted(hosts.items(), key=lambda kv: kv[1].get('total', sum(kv[1].values())), reverse=True)[:top_n]
+        return {'phases_s': {k: round(v, 3) for k, v in phases.items()},
+                'steps': steps_out,
+                'slowest_hosts': [{'host': h, **{k: round(v, 3) for k, v in s.items()}} for h, s in slowest]}
+
+    def write(self, path: str, top_n: int = 25):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(top_n), f, indent=2)
+
+timings = Timings()
+
+class StackSampler:
+    """Low-overhead sampling profiler covering every thread (cProfile only
+    sees the thread that enabled it, while collection runs in a pool)."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                seen = set(); leaf = True
+                while frame is not None:
+                    code = frame.f_code
+                    key = f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+                    if leaf:
+                        self.self_counts[key] += 1; leaf = False
+                    if key not in seen:
+                        self.total_counts[key] += 1; seen.add(key)
+                    frame = frame.f_back
+                self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def write(self, path: str, top_n: int = 40):
+        n = max(1, self.samples)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"{self.samples} thread samples every {self.interval * 1000:.0f} ms\n\n")
+            f.write("Top by self time (leaf frame):\n")
+            for key, c in self.self_counts.most_common(top_n):
+                f.write(f"  {100.0 * c / n:6.2f}%  {key}\n")
+            f.write("\nTop by cumulative time (frame on stack):\n")
+            for key, c in self.total_counts.most_common(top_n):
+                f.write(f"  {100.0 * c / n:6.2f}%  {key}\n")
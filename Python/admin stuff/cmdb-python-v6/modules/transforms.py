@@ -1,46 +1,134 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Callable, Iterable
+import sys, threading
 
-def apply_transforms(row: Dict[str, Any], transforms: Dict[str, Any]) -> Dict[str, Any]:
-    # Apply Azure tag_map
-    try:
-        if row.get('provider') == 'azure' and transforms.get('azure'):
-            tag_map = transforms['azure'].get('tag_map', {})
-            tags = row.get('tags') or []
-            # tags may be list of "k=v" strings
-            kv = {}
-            for t in tags:
-                if isinstance(t, str) and '=' in t:
-                    k,v = t.split('=',1); kv[k]=v
-            for src_key, dst in tag_map.items():
-                if src_key in kv:
-                    row[dst] = kv[src_key]
-    except Exception:
-        pass
-
-    # vSphere tag_map (if tags list exists)
-    try:
-        if row.get('provider') == 'vsphere' and transforms.get('vsphere'):
-            tag_map = transforms['vsphere'].get('tag_map', {})
-            tags = row.get('tags') or []
-            kv = {}
-            for t in tags:
-                if isinstance(t, str) and '=' in t:
-                    k,v = t.split('=',1); kv[k]=v
-            for src_key, dst in tag_map.items():
-                if src_key in kv:
-                    row[dst] = kv[src_key]
-    except Exception:
-        pass
-
-    # AD attribute_map: map ad attributes to normalized fields
-    try:
-        if row.get('provider') in ('onprem','active_directory') and transforms.get('active_directory'):
-            attr_map = transforms['active_directory'].get('attribute_map', {})
-            for src_attr, dst in attr_map.items():
-                val = row.get(src_attr) or row.get(src_attr.lower()) or None
+# Providers whose rows carry tags as a list of "k=v" strings
+TAG_PROVIDERS = ('azure', 'vsphere')
+# Providers whose rows carry raw AD attributes
+AD_PROVIDERS = ('onprem', 'active_directory')
+
+class TransformPlan:
+    """The `transforms` config compiled once into per-provider steps.
+
+    apply() is a single dict lookup on the row's provider plus one pass over
+    its tags (or mapped attributes). Every rule that writes a field is counted
+    under "<section>.<source>-><field>"; a rule that raises is counted under
+    errors and reported once on stderr instead of being swallowed.
+    """
+
+    def __init__(self, transforms: Dict[str, Any]):
+        transforms = transforms or {}
+        # Counters are per thread, so apply() takes no lock; stats() sums them
+        self.lock = threading.Lock()
+        self._local = threading.local()
+        self._counters: List[Dict[str, Any]] = []
+        self._warned = set()
+        self.steps: Dict[str, Callable[[Dict[str, Any], Dict[str, int]], None]] = {}
+
+        for provider in TAG_PROVIDERS:
+            tag_map = (transforms.get(provider) or {}).get('tag_map') or {}
+            if tag_map:
+                self.steps[provider] = self._tag_step(provider, list(tag_map.items()))
+        attr_map = (transforms.get('active_directory') or {}).get('attribute_map') or {}
+        if attr_map:
+            step = self._attr_step(list(attr_map.items()))
+            for provider in AD_PROVIDERS:
+                self.steps[provider] = step
+
+    @staticmethod
+    def _tag_step(section: str, pairs: List[tuple]) -> Callable[[Dict[str, Any], Dict[str, int]], None]:
+        wanted = {src for src, _ in pairs}
+        rules = [(src, dst, f"{section}.{src}->{dst}") for src, dst in pairs]
+
+        def step(row, fired):
+            hits = {}
+            for t in row.get('tags') or ():
+                if t.__class__ is str:
+                    k, sep, v = t.partition('=')
+                    if k in wanted and sep:
+                        hits[k] = v
+            if hits:
+                for src, dst, name in rules:
+                    if src in hits:
+                        row[dst] = hits[src]; fired[name] = fired.get(name, 0) + 1
+        return step
+
+    @staticmethod
+    def _attr_step(pairs: List[tuple]) -> Callable[[Dict[str, Any], Dict[str, int]], None]:
+        rules = [(src, src.lower(), dst, f"active_directory.{src}->{dst}") for src, dst in pairs]
+
+        def step(row, fired):
+            for src, lower, dst, name in rules:
+                val = row.get(src) or row.get(lower)
                 if val:
-                    row[dst] = val
-    except Exception:
-        pass
+                    row[dst] = val; fired[name] = fired.get(name, 0) + 1
+        return step
+
+    def _counter(self) -> Dict[str, Any]:
+        c = self._new_counter()
+        self._local.counter = c
+        return c
 
-    return row
+    def _new_counter(self) -> Dict[str, Any]:
+        c = {'rows': 0, 'fired': {}, 'errors': {}}
+        with self.lock:
+            self._counters.append(c)
+        return c
+
+    def apply(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        c = getattr(self._local, 'counter', None) or self._counter()
+        c['rows'] += 1
+        return self._run(row, c)
+
+    def apply_many(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Batch form of apply(): one counter lookup for the whole batch."""
+        c = getattr(self._local, 'counter', None) or self._counter()
+        run = self._run
+        out = [run(row, c) for row in rows]
+        c['rows'] += len(out)
+        return out
+
+    def _run(self, row: Dict[str, Any], c: Dict[str, Any]) -> Dict[str, Any]:
+        step = self.steps.get(row.get('provider'))
+        if step is not None:
+            try:
+                step(row, c['fired'])
+            except Exception as e:
+                provider = row.get('provider')
+                c['errors'][provider] = c['errors'].get(provider, 0) + 1
+                with self.lock:
+                    warn = provider not in self._warned
+                    self._warned.add(provider)
+                if warn:
+                    print(f"transforms: {provider} rules failed on {row.get('host')}: {e!r}", file=sys.stderr)
+        return row
+
+    def stats(self) -> Dict[str, Any]:
+        rows = 0; fired: Dict[str, int] = {}; errors: Dict[str, int] = {}
+        with self.lock:
+            counters = list(self._counters)
+        for c in counters:
+            rows += c['rows']
+            for counts, other in ((fired, dict(c['fired'])), (errors, dict(c['errors']))):
+                for k, v in other.items():
+                    counts[k] = counts.get(k, 0) + v
+        return {'rows': rows, 'fired': dict(sorted(fired.items(), key=lambda kv: -kv[1])), 'errors': errors}
+
+    def absorb(self, stats: Dict[str, Any]):
+        """Add the counters of another plan's stats() (e.g. from a shard process)."""
+        c = self._new_counter()
+        c['rows'] = stats.get('rows', 0)
+        c['fired'].update(stats.get('fired') or {}); c['errors'].update(stats.get('errors') or {})
+
+def compile_transforms(transforms: Dict[str, Any]) -> TransformPlan:
+    return TransformPlan(transforms)
+
+_cached = (None, None)
+
+def apply_transforms(row: Dict[str, Any], transforms: Dict[str, Any]) -> Dict[str, Any]:
+    """Compatibility wrapper: compiles `transforms` once per config object."""
+    global _cached
+    src, plan = _cached
+    if src is not transforms or plan is None:
+        plan = compile_transforms(transforms)
+        _cached = (transforms, plan)
+    return plan.apply(row)
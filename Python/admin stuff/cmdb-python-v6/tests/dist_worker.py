@@ -0,0 +1,19 @@
+"""Spool worker for test_distributed.py: a --worker without the real
+collectors. Each target sleeps run['delay'] seconds and comes back as a
+row tagged with this process id."""
+import os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.distributed import run_worker
+
+def collect(run, targets, sink):
+    delay = float(run.get('delay', 0))
+    for t in targets:
+        time.sleep(delay)
+        sink(dict(t, pid=os.getpid(), saw_password='password' in ((run.get('cfg') or {}).get('collect') or {}).get('linux', {})))
+    return {'hosts': len(targets)}
+
+if __name__ == '__main__':
+    opts = dict(zip(sys.argv[1::2], sys.argv[2::2]))
+    run_worker(opts['--spool'], collect, opts.get('--worker-id'), poll=0.05)
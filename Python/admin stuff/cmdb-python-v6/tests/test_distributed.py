@@ -0,0 +1,88 @@
+import json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.distributed import Coordinator, merge_secrets, strip_secrets, _write_json
+
+WORKER = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dist_worker.py')]
+
+def _targets(n):
+    return [{'host': f"host{i:03d}", 'ips': [f"10.0.{i // 250}.{i % 250 + 1}"]} for i in range(n)]
+
+def _drain(coord, timeout=60.0, on_row=None):
+    rows = []
+    deadline = time.monotonic() + timeout
+    while not coord.finished:
+        assert time.monotonic() < deadline, f"not finished: {coord.describe()}"
+        for _, row in coord.poll(0.05):
+            rows.append(row)
+            if on_row:
+                on_row(rows)
+    return rows
+
+def test_local_workers_collect_every_target_once(tmp_path):
+    cfg = {'collect': {'linux': {'username': 'svc', 'password': 'hunter2'}}}
+    coord = Coordinator(str(tmp_path / 'spool'), {'cfg': cfg, 'delay': 0}, {'heartbeat_s': 0.2, 'shards': 6},
+                        WORKER, local_workers=2).start(_targets(50))
+    try:
+        run = json.loads((tmp_path / 'spool' / 'run.json').read_text())
+        assert run['cfg']['collect']['linux'] == {'username': 'svc'}
+        rows = _drain(coord)
+    finally:
+        coord.close()
+    assert sorted(r['host'] for r in rows) == [t['host'] for t in _targets(50)]
+    assert not any(r.get('error') for r in rows)
+    assert not any(r['saw_password'] for r in rows)
+    assert sum(st['hosts'] for st in coord.stats) == 50
+    assert coord.summary()['failed_targets'] == 0
+
+def test_killed_worker_shard_is_redispatched(tmp_path):
+    dcfg = {'heartbeat_s': 0.2, 'heartbeat_timeout_s': 5, 'shards': 4, 'max_restarts': 2}
+    coord = Coordinator(str(tmp_path / 'spool'), {'cfg': {}, 'delay': 0.05}, dcfg, WORKER, local_workers=2).start(_targets(40))
+    victim = coord.procs['local0'].pid
+
+    def kill_first(rows):
+        if coord.procs['local0'].pid == victim and coord.procs['local0'].poll() is None and \
+                any(r['pid'] == victim for r in rows):
+            coord.procs['local0'].kill()
+
+    try:
+        rows = _drain(coord, on_row=kill_first)
+    finally:
+        coord.close()
+    hosts = [r['host'] for r in rows]
+    assert sorted(hosts) == [t['host'] for t in _targets(40)]
+    assert not any(r.get('error') for r in rows)
+    assert coord.redispatched >= 1
+    assert coord.restarts >= 1
+
+def test_liveness_uses_heartbeat_changes_not_worker_clock(tmp_path):
+    coord = Coordinator(str(tmp_path / 'spool'), {'cfg': {}}, {'heartbeat_timeout_s': 0.3}).start(_targets(4))
+    hb = coord.spool.p('workers', 'remote1.json')
+    # A worker clock far behind the coordinator's does not make it look dead
+    _write_json(hb, {'worker': 'remote1', 'ts': 0})
+    assert coord.alive_workers() == ['remote1']
+
+    # Claimed, then silent: the shard goes back to pending
+    name, _ = coord.spool.claim('remote1')
+    coord.poll(0)
+    time.sleep(0.4)
+    coord.poll(0)
+    assert 'remote1' in coord.dead and coord.redispatched == 1
+    assert coord.alive_workers() == []
+
+    # Heartbeating again brings it back
+    _write_json(hb, {'worker': 'remote1', 'ts': 0})
+    assert coord.alive_workers() == ['remote1']
+    assert 'remote1' not in coord.dead
+
+def test_secrets_stripped_and_merged_back():
+    cfg = {'collect': {'windows': {'username': 'a', 'password': 'p'}, 'linux': {'port': 22, 'ssh_password': 'q'}},
+           'discovery': {'azure': {'client_secret': 's', 'subscriptions': ['x']}}, 'targets': [{'token': 't'}]}
+    stripped = strip_secrets(cfg)
+    assert stripped == {'collect': {'windows': {'username': 'a'}, 'linux': {'port': 22}},
+                        'discovery': {'azure': {'subscriptions': ['x']}}, 'targets': [{}]}
+    local = {'collect': {'windows': {'password': 'p2', 'username': 'ignored'}}, 'discovery': {'azure': {'client_secret': 's2'}}}
+    merged = merge_secrets(stripped, local)
+    assert merged['collect']['windows'] == {'username': 'a', 'password': 'p2'}
+    assert merged['discovery']['azure'] == {'subscriptions': ['x'], 'client_secret': 's2'}
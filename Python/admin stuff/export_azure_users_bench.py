@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Mock Microsoft Graph server + request-count benchmark for
+export_azure_users_full_parallel.py.
+
+Serves a synthetic tenant on 127.0.0.1 (users, groups, directory roles,
+memberOf/members paging, $batch and users/groups/directoryRoles delta) and
+runs the exporter's membership code against it in each --membership-mode,
+then a --delta-state initial + nightly run after a few changes. Prints HTTP
+requests, Graph operations (each $batch sub-request counts) and wall time per
+mode (all through one pooled GraphClient; "connections" counts TCP
+connections the mock accepted), and checks that every mode returns the
+same memberships. --throttle answers a fraction of calls with 429 to
+exercise the shared Retry-After pause. RBAC is compared with in-process
+fake ARM clients: per-user filtered listings against prefetch_rbac (ARM
+calls counted, results checked equal).
+
+Usage:
+  python export_azure_users_bench.py --users 5000 --groups 400 --workers 8
+  python export_azure_users_bench.py --subscriptions 40
+  python export_azure_users_bench.py --throttle 0.01 --max-rps 200
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import export_azure_users_full_parallel as exp
+
+PAGE = 100
+
+
+class Tenant:
+    def __init__(self, n_users, n_groups, n_roles, per_user, seed=7):
+        rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.version = 1
+        self.users = {f"u{i:06d}": {"id": f"u{i:06d}", "displayName": f"User {i}",
+                                     "userPrincipalName": f"user{i}@contoso.test", "mail": f"user{i}@contoso.test",
+                                     "_v": 1} for i in range(n_users)}
+        self.groups = {f"g{i:05d}": {"id": f"g{i:05d}", "displayName": f"Group {i}", "members": set()} for i in range(n_groups)}
+        self.roles = {f"r{i:03d}": {"id": f"r{i:03d}", "displayName": f"Role {i}", "members": set()} for i in range(n_roles)}
+        gids = list(self.groups)
+        for uid in self.users:
+            # a few heavy users page past one memberOf page
+            k = per_user * 40 if rnd.random() < 0.01 else rnd.randint(0, per_user * 2)
+            for gid in rnd.sample(gids, min(k, len(gids))):
+                self.groups[gid]["members"].add(uid)
+            if rnd.random() < 0.05:
+                self.roles[rnd.choice(list(self.roles))]["members"].add(uid)
+        self.member_log = []  # (version, kind, owner_id, user_id, removed)
+        self.rename_log = []  # (version, kind, owner_id)
+        self.user_log = []    # (version, user_id, removed, changed properties)
+
+    def member_of(self, uid):
+        out = [{"@odata.type": "#microsoft.graph.group", "id": g["id"], "displayName": g["displayName"]}
+               for g in self.groups.values() if uid in g["members"]]
+        out += [{"@odata.type": "#microsoft.graph.directoryRole", "id": r["id"], "displayName": r["displayName"]}
+                for r in self.roles.values() if uid in r["members"]]
+        return out
+
+    def mutate(self, rnd, renames, membership_changes, removals, group_renames=1):
+        with self.lock:
+            self.version += 1
+            v = self.version
+            uids = list(self.users)
+            for gid in rnd.sample(sorted(g for g in self.groups if self.groups[g]["members"]), group_renames):
+                self.groups[gid]["displayName"] += " (renamed)"
+                self.rename_log.append((v, "groups", gid))
+            for uid in rnd.sample(uids, renames):
+                self.users[uid]["displayName"] += " (renamed)"; self.users[uid]["_v"] = v
+                self.user_log.append((v, uid, False, ("displayName",)))
+            for _ in range(membership_changes):
+                g = self.groups[rnd.choice(list(self.groups))]
+                uid = rnd.choice(uids)
+                removed = uid in g["members"]
+                (g["members"].discard if removed else g["members"].add)(uid)
+                self.member_log.append((v, "groups", g["id"], uid, removed))
+            for uid in rnd.sample(uids, removals):
+                del self.users[uid]
+                for g in list(self.groups.values()) + list(self.roles.values()):
+                    g["members"].discard(uid)
+                self.user_log.append((v, uid, True, ()))
+
+
+def make_handler(tenant, counters, throttle=0.0):
+    rnd = random.Random(11)
+
+    def page(items, rel, qs):
+        skip = int((qs.get("$skiptoken") or ["0"])[0])
+        body = {"value": items[skip:skip + PAGE]}
+        if skip + PAGE < len(items):
+            keep = "&".join(f"{k}={v[0]}" for k, v in qs.items() if k != "$skiptoken")
+            body["@odata.nextLink"] = f"{tenant.base}{rel}?{keep + '&' if keep else ''}$skiptoken={skip + PAGE}"
+        return body
+
+    def delta(kind, rel, qs):
+        token = (qs.get("$deltatoken") or [None])[0]
+        link = lambda: f"{tenant.base}{rel}?$deltatoken={tenant.version}"
+        if token == "latest":
+            return {"value": [], "@odata.deltaLink": link()}
+        if kind == "users":
+            if token is None:
+                items = [{k: v for k, v in u.items() if k != "_v"} for u in tenant.users.values()]
+            else:
+                # Like Graph, an updated user carries only its changed properties
+                since = int(token); seen = {}
+                for v, uid, removed, props in tenant.user_log:
+                    if v > since:
+                        if removed:
+                            seen[uid] = {"id": uid, "@removed": {"reason": "deleted"}}
+                        else:
+                            seen.setdefault(uid, {"id": uid}).update((k, tenant.users[uid][k]) for k in props)
+                items = list(seen.values())
+        else:
+            since = int(token or 0); changed = {}
+            for v, k, oid, uid, removed in tenant.member_log:
+                if v > since and k == kind:
+                    m = {"@odata.type": "#microsoft.graph.user", "id": uid}
+                    if removed: m["@removed"] = "deleted"
+                    changed.setdefault(oid, {"id": oid, "members@delta": []})["members@delta"].append(m)
+            src = tenant.groups if kind == "groups" else tenant.roles
+            for v, k, oid in tenant.rename_log:
+                if v > since and k == kind:
+                    changed.setdefault(oid, {"id": oid})["displayName"] = src[oid]["displayName"]
+            items = list(changed.values())
+        skip = int((qs.get("$skiptoken") or ["0"])[0])
+        body = {"value": items[skip:skip + PAGE]}
+        if skip + PAGE < len(items):
+            tok = f"$deltatoken={token}&" if token else ""
+            body["@odata.nextLink"] = f"{tenant.base}{rel}?{tok}$skiptoken={skip + PAGE}"
+        else:
+            body["@odata.deltaLink"] = link()
+        return body
+
+    def route(method, url):
+        parts = urlsplit(url)
+        path = parts.path if parts.path.startswith("/v1.0") else "/v1.0" + parts.path
+        qs = parse_qs(parts.query)
+        rel = path[len("/v1.0"):]
+        with tenant.lock:
+            m = re.fullmatch(r"/(users|groups|directoryRoles)/delta", rel)
+            if m:
+                counters[f"{m.group(1)}/delta"] += 1
+                return 200, delta(m.group(1), rel, qs)
+            if rel == "/users":
+                counters["users"] += 1
+                return 200, page([{k: v for k, v in u.items() if k != "_v"} for u in tenant.users.values()], rel, qs)
+            m = re.fullmatch(r"/users/([^/]+)", rel)
+            if m:
+                counters["users/{id}"] += 1
+                u = tenant.users.get(m.group(1))
+                return (200, {k: v for k, v in u.items() if k != "_v"}) if u else (404, {"error": {"message": "not found"}})
+            m = re.fullmatch(r"/users/([^/]+)/memberOf", rel)
+            if m:
+                counters["users/memberOf"] += 1
+                if m.group(1) not in tenant.users:
+                    return 404, {"error": {"message": "not found"}}
+                return 200, page(tenant.member_of(m.group(1)), rel, qs)
+            m = re.fullmatch(r"/(groups|directoryRoles)", rel)
+            if m:
+                counters[m.group(1)] += 1
+                src = tenant.groups if m.group(1) == "groups" else tenant.roles
+                return 200, page([{"id": g["id"], "displayName": g["displayName"]} for g in src.values()], rel, qs)
+            m = re.fullmatch(r"/(groups|directoryRoles)/([^/]+)/members", rel)
+            if m:
+                counters[f"{m.group(1)}/members"] += 1
+                src = tenant.groups if m.group(1) == "groups" else tenant.roles
+                return 200, page([{"@odata.type": "#microsoft.graph.user", "id": u} for u in sorted(src[m.group(2)]["members"])], rel, qs)
+        return 404, {"error": {"message": f"no route {rel}"}}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *a):
+            pass
+
+        def setup(self):
+            counters["connections"] += 1
+            super().setup()
+            # Headers and body go out in separate writes; without this, keep-alive
+            # connections stall on Nagle + delayed ACK (~40 ms per response)
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def _throttled(self):
+            if throttle and rnd.random() < throttle:
+                counters["429"] += 1
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return True
+            return False
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            counters["http"] += 1
+            if not self._throttled():
+                self._send(*route("GET", self.path))
+
+        def do_POST(self):
+            counters["http"] += 1
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self._throttled():
+                return
+            if not self.path.endswith("/$batch"):
+                return self._send(404, {})
+            counters["$batch"] += 1
+            out = []
+            for r in body.get("requests", [])[:exp.GRAPH_BATCH_SIZE]:
+                status, rbody = route(r.get("method", "GET"), r["url"])
+                out.append({"id": r["id"], "status": status, "headers": {}, "body": rbody})
+            self._send(200, {"responses": out})
+
+    return Handler
+
+
+class FakeAssignments:
+    """role_assignments operations of one subscription; one call per listing
+    (ARM pages internally, which the SDK hides)."""
+
+    def __init__(self, sub_id, assignments, counters):
+        self.sub_id, self.assignments, self.counters = sub_id, assignments, counters
+
+    def list(self, filter=None):
+        self.counters["arm"] += 1
+        if filter:
+            pid = filter.split("'")[1]
+            return [a for a in self.assignments if a.principal_id == pid]
+        return list(self.assignments)
+
+    def list_for_subscription(self):
+        return self.list()
+
+
+def fake_auth_clients(users, n_subs, counters, seed=3):
+    rnd = random.Random(seed)
+    roles = {f"{i:08d}-0000-0000-0000-000000000000": name for i, name in
+             enumerate(["Owner", "Contributor", "Reader", "User Access Administrator", "Storage Blob Data Reader"])}
+    clients, caches = {}, {}
+    for n in range(n_subs):
+        sid = f"sub-{n:04d}"
+        defs = {f"/subscriptions/{sid}/providers/Microsoft.Authorization/roleDefinitions/{g}": name for g, name in roles.items()}
+        assignments = []
+        for u in users:
+            if rnd.random() < 0.1:
+                rg = f"/subscriptions/{sid}/resourceGroups/rg{rnd.randint(0, 9)}" if rnd.random() < 0.7 else f"/subscriptions/{sid}"
+                assignments.append(SimpleNamespace(principal_id=u["id"], scope=rg,
+                                                   role_definition_id=rnd.choice(list(defs))))
+        clients[sid] = SimpleNamespace(role_assignments=FakeAssignments(sid, assignments, counters),
+                                       config=SimpleNamespace(subscription_id=sid))
+        caches[sid] = defs
+    return clients, caches
+
+
+def rbac_per_user(clients, caches, users, workers):
+    def one(u):
+        return u["id"], sorted({r for sid, ac in clients.items()
+                                for r in exp.fetch_user_role_assignments_for_sub(ac, caches[sid], u["id"])})
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return {uid: roles for uid, roles in ex.map(one, users) if roles}
+
+
+def memberships_per_user(client, users, workers):
+    out = {}
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futs = {ex.submit(exp.fetch_user_groups_and_dir_roles, client, u["id"]): u["id"] for u in users}
+        for fut in as_completed(futs):
+            out[futs[fut]] = fut.result()
+    return out
+
+
+def memberships_batch(client, users, workers):
+    out = {}
+    ids = [u["id"] for u in users]
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futs = [ex.submit(exp.fetch_member_of_batch, client, ids[i:i + exp.GRAPH_BATCH_SIZE])
+                for i in range(0, len(ids), exp.GRAPH_BATCH_SIZE)]
+        for fut in as_completed(futs):
+            out.update(fut.result())
+    return out
+
+
+def run(name, counters, fn):
+    counters.clear()
+    t0 = time.perf_counter()
+    result = fn()
+    dt = time.perf_counter() - t0
+    ops = sum(v for k, v in counters.items() if k not in ("http", "$batch", "connections", "429"))
+    print(f"{name:<28} {counters['http']:>8} HTTP  {ops:>8} Graph ops  {dt:7.2f} s   "
+          + ", ".join(f"{k}={v}" for k, v in sorted(counters.items()) if k != "http"))
+    return result
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--groups", type=int, default=200)
+    ap.add_argument("--roles", type=int, default=10)
+    ap.add_argument("--groups-per-user", type=int, default=4)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--max-rps", type=float, default=0, help="GraphClient rate limit (0 = unlimited)")
+    ap.add_argument("--throttle", type=float, default=0, help="Fraction of Graph calls answered 429 (Retry-After: 1)")
+    ap.add_argument("--subscriptions", type=int, default=10, help="Fake subscriptions for the RBAC comparison")
+    args = ap.parse_args()
+
+    tenant = Tenant(args.users, args.groups, args.roles, args.groups_per_user)
+    counters = Counter()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(tenant, counters, args.throttle))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    tenant.base = f"http://127.0.0.1:{server.server_address[1]}/v1.0"
+    exp.GRAPH_BASE = tenant.base
+
+    print(f"Tenant: {args.users} users, {args.groups} groups, {args.roles} directory roles; {args.workers} workers\n")
+    s = exp.GraphClient(token="mock-token", pool_size=args.workers, max_rps=args.max_rps)
+    users = run("list users", counters, lambda: list(exp.fetch_all_users(s)))
+    per_user = run("memberships per-user", counters, lambda: memberships_per_user(s, users, args.workers))
+    batch = run("memberships batch", counters, lambda: memberships_batch(s, users, args.workers))
+    group_side = run("memberships group-side", counters, lambda: exp.fetch_memberships_group_side(s, args.workers))
+
+    norm = lambda m: {k: v for k, v in m.items() if v[0] or v[1]}
+    assert norm(per_user) == norm(batch) == norm(group_side), "membership modes disagree"
+    print("\nAll membership modes agree.\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        state_path = os.path.join(tmp, "delta.json")
+        changed, _, links, names = run("delta: initial", counters, lambda: exp.plan_delta(s, {}))
+        rows = {u["id"]: {"DisplayName": u["displayName"], "UPN": u["userPrincipalName"], "Email": u["mail"],
+                          "SecurityGroups": "; ".join(per_user[u["id"]][0])} for u in changed}
+        exp.save_delta_state(state_path, {"links": links, "rows": rows, "names": names})
+        renames, moves, removals = max(1, args.users // 100), max(1, args.users // 200), max(1, args.users // 1000)
+        tenant.mutate(random.Random(1), renames, moves, removals)
+        state = exp.load_delta_state(state_path)
+        changed, removed, _, _ = run("delta: nightly", counters, lambda: exp.plan_delta(s, state))
+        current = {uid: {k: v for k, v in u.items() if k != "_v"} for uid, u in tenant.users.items()}
+        assert all(u == current[u["id"]] for u in changed), "delta users differ from the tenant"
+        renamed = {uid for _, _, gid in tenant.rename_log for uid in tenant.groups[gid]["members"]}
+        assert renamed <= {u["id"] for u in changed}, "members of a renamed group were not re-processed"
+        print(f"\nDelta after {renames} renames, 1 group rename, {moves} membership changes, {removals} deletions: "
+              f"{len(changed)} users to re-process, {len(removed)} removed (of {args.users}).")
+    server.shutdown()
+
+    print()
+    clients, caches = fake_auth_clients(users, args.subscriptions, counters)
+    per_user_rbac = run(f"RBAC per-user ({args.subscriptions} subs)", counters,
+                        lambda: rbac_per_user(clients, caches, users, args.workers))
+    prefetched = run(f"RBAC prefetch ({args.subscriptions} subs)", counters,
+                     lambda: exp.prefetch_rbac(clients, caches, workers=args.workers))
+    assert per_user_rbac == prefetched, "RBAC prefetch disagrees with per-user listing"
+    print("\nRBAC prefetch matches per-user listing.")
+
+
+if __name__ == "__main__":
+    main()
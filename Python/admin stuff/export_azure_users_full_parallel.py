@@ -10,8 +10,14 @@ Export all Entra ID (Azure AD) users to CSV with:
 
 Features:
 - Parallelized per-user fetching (bounded thread pool)
-- Resilient Graph calls with retry/backoff
-- Reads role assignments from every subscription the identity can list
+- One pooled, thread-safe Graph client: token refresh before expiry,
+  global rate limit and shared Retry-After backoff
+- Reads role assignments from every subscription the identity can list,
+  once per subscription (plus any --management-group) into a principal index
+- Memberships via Graph $batch (20 users per request) or from the group side
+- Incremental runs with /users/delta (--delta-state)
+- Users stream from the listing through a bounded work queue; rows are
+  written as they complete and --resume continues an interrupted run
 
 Auth: DefaultAzureCredential (SP, Managed Identity, Azure CLI, VS Code, etc.)
 Required for SP auth:
@@ -25,62 +31,241 @@ Permissions:
 
 Usage:
   python export_azure_users_full_parallel.py --out users_full.csv --workers 8
+  python export_azure_users_full_parallel.py --membership-mode group-side
+  python export_azure_users_full_parallel.py --delta-state users_delta.json   # nightly: only changed users
+  python export_azure_users_full_parallel.py --management-group contoso-root
+  python export_azure_users_full_parallel.py --out users_full.csv --resume     # after an interrupted run
 """
 
 import argparse
 import csv
+import json
 import os
 import sys
+import threading
 import time
-from typing import Dict, List, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 
 import requests
+from requests.adapters import HTTPAdapter
 from azure.identity import DefaultAzureCredential
 from azure.mgmt.authorization import AuthorizationManagementClient
 from azure.mgmt.resource.subscriptions import SubscriptionClient
 
 GRAPH_SCOPE = "https://graph.microsoft.com/.default"
 GRAPH_BASE = "https://graph.microsoft.com/v1.0"
+GRAPH_BATCH_SIZE = 20  # Graph $batch limit
+USER_SELECT = "id,displayName,userPrincipalName,mail"
 
 # -------------------- HTTP utils -------------------- #
 
-def _sleep_backoff(attempt: int, retry_after: int = 2):
-    time.sleep(max(retry_after, 2) * (attempt + 1))
+class TokenBucket:
+    """Process-wide request rate limit: `rate` requests/s with bursts up to
+    `burst`. rate <= 0 disables it."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate or 0)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class GraphClient:
+    """Thread-safe Graph HTTP client shared by all workers.
+
+    - One requests.Session whose connection pool holds `pool_size`
+      keep-alive connections (size it to --workers).
+    - The bearer token is refreshed from `credential` shortly before it
+      expires (or after a 401), under a lock, so long runs don't fail
+      halfway. A static `token` (tests, mock servers) is used as is.
+    - Every request takes a slot from a shared TokenBucket, and a 429/5xx
+      Retry-After pauses all threads until it has passed instead of each
+      caller backing off on its own.
+    """
+
+    REFRESH_MARGIN = 300  # seconds before expiry
+
+    def __init__(self, credential=None, token: Optional[str] = None, pool_size: int = 8,
+                 max_rps: float = 0, retries: int = 6):
+        self.credential = credential
+        self.retries = retries
+        self.bucket = TokenBucket(max_rps, burst=max(1.0, max_rps))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size), pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._token = token
+        self._expires = float("inf") if token else 0.0
+        self._pause_until = 0.0
+        self.throttled = 0
+
+    def token(self, force: bool = False) -> str:
+        with self._lock:
+            if force or self._token is None or time.time() > self._expires - self.REFRESH_MARGIN:
+                if self.credential is None:
+                    if self._token is None:
+                        raise RuntimeError("GraphClient needs a credential or a token")
+                else:
+                    t = self.credential.get_token(GRAPH_SCOPE)
+                    self._token, self._expires = t.token, float(t.expires_on)
+            return self._token
+
+    def pause(self, seconds: float):
+        """Hold every thread's next request for `seconds` (Retry-After)."""
+        with self._lock:
+            self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+            self.throttled += 1
+
+    def _wait_turn(self):
+        while True:
+            with self._lock:
+                left = self._pause_until - time.monotonic()
+            if left <= 0:
+                break
+            time.sleep(left)
+        self.bucket.acquire()
+
+    def request(self, method: str, url: str, headers: Optional[dict] = None, **kw) -> requests.Response:
+        """Send with shared pacing; retries 429/5xx after Retry-After and a
+        401 once with a fresh token."""
+        refreshed = False
+        for attempt in range(self.retries):
+            self._wait_turn()
+            h = {"Authorization": f"Bearer {self.token()}"}
+            h.update(headers or {})
+            resp = self.session.request(method, url, headers=h, timeout=(10, 120), **kw)
+            if resp.status_code == 401 and not refreshed and self.credential is not None:
+                refreshed = True
+                self.token(force=True)
+                continue
+            if resp.status_code == 429 or 500 <= resp.status_code < 600:
+                self.pause(_retry_after(resp.headers, attempt))
+                continue
+            return resp
+        return resp
+
+    def get(self, url: str, headers: Optional[dict] = None) -> requests.Response:
+        return self.request("GET", url, headers=headers)
+
+    def post(self, url: str, body: dict) -> requests.Response:
+        return self.request("POST", url, json=body)
+
+def _retry_after(headers, attempt: int) -> float:
+    try:
+        return max(1.0, float(headers.get("Retry-After")))
+    except (TypeError, ValueError):
+        return min(2.0 ** attempt, 60.0)
 
-def graph_get(session: requests.Session, url: str) -> dict:
+def graph_get(client: GraphClient, url: str) -> dict:
     """GET with retry/backoff for Graph."""
-    for attempt in range(6):
-        resp = session.get(url, headers={"ConsistencyLevel": "eventual"})
-        if resp.status_code in (429,) or 500 <= resp.status_code < 600:
-            _sleep_backoff(attempt, int(resp.headers.get("Retry-After", "2")))
-            continue
-        resp.raise_for_status()
-        return resp.json()
+    resp = client.get(url, headers={"ConsistencyLevel": "eventual"})
     resp.raise_for_status()
-    return {}
+    return resp.json()
 
-def graph_paged(session: requests.Session, url: str):
+def graph_post(client: GraphClient, url: str, body: dict) -> dict:
+    """POST with retry/backoff for Graph."""
+    resp = client.post(url, body)
+    resp.raise_for_status()
+    return resp.json()
+
+def graph_paged(client: GraphClient, url: str):
     """Yield items across @odata.nextLink pages."""
     while url:
-        data = graph_get(session, url)
+        data = graph_get(client, url)
         for item in data.get("value", []):
             yield item
         url = data.get("@odata.nextLink")
 
+def _relative(url: str) -> str:
+    """Absolute Graph URL (e.g. a nextLink) -> path for a $batch sub-request."""
+    if url.startswith(GRAPH_BASE):
+        return url[len(GRAPH_BASE):]
+    i = url.find("/v1.0/")
+    return url[i + len("/v1.0"):] if i >= 0 else url
+
+def graph_batch_paged(client: GraphClient, urls: Dict[str, str]) -> Iterator[Tuple[str, List[dict], Optional[str]]]:
+    """Run many paged GETs through $batch, GRAPH_BATCH_SIZE per POST.
+
+    `urls` maps a caller key to a path relative to GRAPH_BASE. Yields
+    (key, items, error) once a key's last page is in. nextLinks and
+    throttled (429/5xx) sub-requests are queued into later batches, so one
+    POST carries pages of many different keys.
+    """
+    pending = deque(urls.items())
+    items: Dict[str, List[dict]] = {k: [] for k in urls}
+    retries: Dict[str, int] = {}
+    while pending:
+        chunk = [pending.popleft() for _ in range(min(GRAPH_BATCH_SIZE, len(pending)))]
+        body = {"requests": [{"id": str(i), "method": "GET", "url": u, "headers": {"ConsistencyLevel": "eventual"}}
+                             for i, (_, u) in enumerate(chunk)]}
+        data = graph_post(client, f"{GRAPH_BASE}/$batch", body)
+        answered = set()
+        retry_after = 0
+        for r in data.get("responses", []):
+            idx = int(r.get("id", -1))
+            if not 0 <= idx < len(chunk):
+                continue
+            answered.add(idx)
+            key, url = chunk[idx]
+            status = int(r.get("status", 500))
+            rbody = r.get("body") or {}
+            if status == 200:
+                items[key].extend(rbody.get("value", []))
+                nxt = rbody.get("@odata.nextLink")
+                if nxt:
+                    pending.append((key, _relative(nxt)))
+                else:
+                    yield key, items.pop(key), None
+            elif status == 429 or status >= 500:
+                retries[key] = retries.get(key, 0) + 1
+                if retries[key] > 6:
+                    items.pop(key, None)
+                    yield key, [], f"HTTP {status} after retries"
+                else:
+                    pending.append((key, url))
+                    retry_after = max(retry_after, _retry_after(r.get("headers") or {}, retries[key]))
+            else:
+                items.pop(key, None)
+                yield key, [], (rbody.get("error") or {}).get("message") or f"HTTP {status}"
+        for idx, (key, url) in enumerate(chunk):
+            if idx not in answered:
+                # Missing from the batch response: counts as a retry as well
+                retries[key] = retries.get(key, 0) + 1
+                if retries[key] > 6:
+                    items.pop(key, None)
+                    yield key, [], "no response after retries"
+                else:
+                    pending.append((key, url))
+        if retry_after:
+            client.pause(retry_after)
+
 # -------------------- Graph: users & memberships -------------------- #
 
-def fetch_all_users(session: requests.Session):
-    url = f"{GRAPH_BASE}/users?$select=id,displayName,userPrincipalName,mail"
-    yield from graph_paged(session, url)
+def fetch_all_users(client: GraphClient):
+    url = f"{GRAPH_BASE}/users?$select={USER_SELECT}"
+    yield from graph_paged(client, url)
 
-def fetch_user_groups_and_dir_roles(token: str, user_id: str) -> Tuple[List[str], List[str]]:
-    """Per-user fetch (separate session per thread for safety)."""
-    s = requests.Session()
-    s.headers.update({"Authorization": f"Bearer {token}"})
+def _split_member_of(objs) -> Tuple[List[str], List[str]]:
+    """memberOf objects -> (group names, directory role names)."""
     groups, dir_roles = set(), set()
-    url = f"{GRAPH_BASE}/users/{user_id}/memberOf?$select=displayName"
-    for obj in graph_paged(s, url):
+    for obj in objs:
         otype = (obj.get("@odata.type") or "").lower()
         name = obj.get("displayName") or ""
         if not name:
@@ -91,6 +276,163 @@ def fetch_user_groups_and_dir_roles(token: str, user_id: str) -> Tuple[List[str]
             dir_roles.add(name)
     return sorted(groups), sorted(dir_roles)
 
+def fetch_user_groups_and_dir_roles(client: GraphClient, user_id: str) -> Tuple[List[str], List[str]]:
+    """Per-user memberOf fetch."""
+    url = f"{GRAPH_BASE}/users/{user_id}/memberOf?$select=displayName"
+    return _split_member_of(graph_paged(client, url))
+
+def fetch_member_of_batch(client: GraphClient, user_ids: List[str]) -> Dict[str, Tuple[List[str], List[str]]]:
+    """memberOf for up to GRAPH_BATCH_SIZE users in one $batch round trip
+    (plus follow-up batches for users with more than one page)."""
+    out: Dict[str, Tuple[List[str], List[str]]] = {}
+    urls = {uid: f"/users/{uid}/memberOf?$select=displayName" for uid in user_ids}
+    for uid, objs, err in graph_batch_paged(client, urls):
+        if err:
+            print(f"Warning: memberOf failed for {uid}: {err}", file=sys.stderr)
+            continue
+        out[uid] = _split_member_of(objs)
+    return out
+
+def fetch_memberships_group_side(client: GraphClient, workers: int = 8) -> Dict[str, Tuple[List[str], List[str]]]:
+    """user id -> (groups, directory roles) built from one members paging
+    pass per group and directory role, batched 20 per request."""
+    owners: Dict[str, Tuple[str, str]] = {}
+    for g in graph_paged(client, f"{GRAPH_BASE}/groups?$select=id,displayName"):
+        if g.get("displayName"):
+            owners[f"g:{g['id']}"] = ("g", g["displayName"])
+    for r in graph_paged(client, f"{GRAPH_BASE}/directoryRoles?$select=id,displayName"):
+        if r.get("displayName"):
+            owners[f"r:{r['id']}"] = ("r", r["displayName"])
+    print(f"Group-side memberships: {sum(1 for k in owners.values() if k[0] == 'g')} groups, "
+          f"{sum(1 for k in owners.values() if k[0] == 'r')} directory roles", file=sys.stderr)
+
+    def run(keys: List[str]):
+        kind = {"g": "groups", "r": "directoryRoles"}
+        urls = {k: f"/{kind[k[0]]}/{k[2:]}/members?$select=id" for k in keys}
+        return list(graph_batch_paged(client, urls))
+
+    groups: Dict[str, Set[str]] = {}
+    roles: Dict[str, Set[str]] = {}
+    keys = list(owners)
+    step = max(GRAPH_BATCH_SIZE, (len(keys) + max(1, workers) - 1) // max(1, workers))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for fut in as_completed([ex.submit(run, keys[i:i + step]) for i in range(0, len(keys), step)]):
+            for key, members, err in fut.result():
+                if err:
+                    print(f"Warning: members failed for {owners[key][1]}: {err}", file=sys.stderr)
+                    continue
+                kind, name = owners[key]
+                target = groups if kind == "g" else roles
+                for m in members:
+                    if (m.get("@odata.type") or "#microsoft.graph.user").lower() == "#microsoft.graph.user":
+                        target.setdefault(m["id"], set()).add(name)
+    return {uid: (sorted(groups.get(uid, ())), sorted(roles.get(uid, ())))
+            for uid in set(groups) | set(roles)}
+
+# -------------------- Graph: delta -------------------- #
+
+def graph_delta(client: GraphClient, url: str) -> Tuple[List[dict], Optional[str]]:
+    """Page a delta query to the end; returns (items, deltaLink)."""
+    items: List[dict] = []
+    while url:
+        data = graph_get(client, url)
+        items.extend(data.get("value", []))
+        if data.get("@odata.deltaLink"):
+            return items, data["@odata.deltaLink"]
+        url = data.get("@odata.nextLink")
+    return items, None
+
+def load_delta_state(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_delta_state(path: str, state: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+MEMBER_KINDS = (("groups", "SecurityGroups"), ("directoryRoles", "DirectoryRoles"))
+
+def fetch_object_names(client: GraphClient) -> Dict[str, Dict[str, str]]:
+    """{"groups": {id: displayName}, "directoryRoles": {...}} for rename detection."""
+    return {kind: {g["id"]: g.get("displayName") or "" for g in graph_paged(client, f"{GRAPH_BASE}/{kind}?$select=id,displayName")}
+            for kind, _ in MEMBER_KINDS}
+
+def plan_delta(client: GraphClient, state: dict) -> Tuple[List[dict], Set[str], dict, dict]:
+    """Users to (re)process, user ids removed since the last run, the new
+    delta links and the group/role names. Without links in `state` this is
+    the full user list.
+
+    Users whose own object did not change but who were added to or removed
+    from a group or directory role (members@delta) are re-processed too, as
+    are cached users holding the old name of a renamed or deleted one.
+    """
+    links = dict(state.get("links") or {})
+    cached = state.get("rows") or {}
+    if not links.get("users"):
+        # Take membership links first so changes made during this run are not lost
+        for kind, _ in MEMBER_KINDS:
+            _, links[kind] = graph_delta(client, f"{GRAPH_BASE}/{kind}/delta?$select=members,displayName&$deltatoken=latest")
+        names = fetch_object_names(client)
+        users, links["users"] = graph_delta(client, f"{GRAPH_BASE}/users/delta?$select={USER_SELECT}")
+        return [u for u in users if "@removed" not in u], set(), links, names
+
+    # States saved before names were tracked read them once here
+    names = {k: dict(v) for k, v in (state.get("names") or fetch_object_names(client)).items()}
+    touched: Set[str] = set()
+    for kind, column in MEMBER_KINDS:
+        if links.get(kind):
+            changes, links[kind] = graph_delta(client, links[kind])
+            known = names.setdefault(kind, {})
+            stale: Set[str] = set()
+            for obj in changes:
+                touched.update(m["id"] for m in obj.get("members@delta", []) if m.get("id"))
+                old = known.get(obj["id"])
+                if "@removed" in obj:
+                    known.pop(obj["id"], None)
+                    stale.add(old)
+                elif "displayName" in obj:
+                    known[obj["id"]] = obj["displayName"] or ""
+                    if old is not None and old != known[obj["id"]]:
+                        stale.add(old)
+            stale.discard(None)
+            if stale:
+                # The cached rows still show the old name: re-read those users' memberships
+                touched.update(uid for uid, row in cached.items()
+                               if stale.intersection((row.get(column) or "").split("; ")))
+    changes, links["users"] = graph_delta(client, links["users"])
+    removed = {u["id"] for u in changes if "@removed" in u}
+    users: Dict[str, dict] = {}
+    wanted = USER_SELECT.split(",")
+    for change in changes:
+        uid = change["id"]
+        if uid in removed:
+            continue
+        # A delta item only carries the properties that changed: lay them over
+        # the cached user, or read the whole user when it is not cached
+        user = _cached_user(uid, cached.get(uid))
+        if user is None and not all(k in change for k in wanted):
+            user = graph_get(client, f"{GRAPH_BASE}/users/{uid}?$select={USER_SELECT}")
+        user = dict(user or {})
+        user.update((k, v) for k, v in change.items() if not k.startswith("@"))
+        users[uid] = user
+    for uid in touched - removed - set(users):
+        user = _cached_user(uid, cached.get(uid))
+        if user:
+            users[uid] = user
+    return list(users.values()), removed, links, names
+
+def _cached_user(uid: str, row: Optional[dict]) -> Optional[dict]:
+    """The user object behind a row saved in the delta state."""
+    if not row:
+        return None
+    return {"id": uid, "displayName": row.get("DisplayName"),
+            "userPrincipalName": row.get("UPN"), "mail": row.get("Email")}
+
 # -------------------- RBAC helpers -------------------- #
 
 def build_role_name_cache(auth_client: AuthorizationManagementClient) -> Dict[str, str]:
@@ -118,34 +460,111 @@ def fetch_user_role_assignments_for_sub(
         roles.add(f"{role_name} @ {scope}")
     return sorted(roles)
 
+def _role_name(role_cache: Dict[str, str], role_def_id: Optional[str]) -> str:
+    if not role_def_id:
+        return "UnknownRole"
+    # Built-in definitions listed at management-group scope come back without
+    # the /subscriptions/<id> prefix; the GUID still matches.
+    return role_cache.get(role_def_id) or role_cache.get(role_def_id.split('/')[-1].lower()) or role_def_id.split('/')[-1]
+
+def list_role_assignments(auth_client: AuthorizationManagementClient, scope: Optional[str] = None):
+    """Every role assignment visible at `scope` (default: the client's
+    subscription), one paged ARM listing instead of one call per principal."""
+    ops = auth_client.role_assignments
+    if scope:
+        return ops.list_for_scope(scope=scope)
+    if hasattr(ops, "list_for_subscription"):
+        return ops.list_for_subscription()
+    return ops.list()  # older azure-mgmt-authorization
+
+def prefetch_rbac(
+    sub_clients: Dict[str, AuthorizationManagementClient],
+    role_caches: Dict[str, Dict[str, str]],
+    management_groups: Optional[List[str]] = None,
+    workers: int = 8,
+) -> Dict[str, List[str]]:
+    """principalId -> sorted 'RoleName @ Scope' across all subscriptions.
+
+    Every subscription is listed, one call chain per subscription in
+    parallel. A management group listing only adds what it returns: an
+    assignment row for a subscription does not mean it returned all of that
+    subscription's assignments, so no subscription is skipped because of it.
+    """
+    names: Dict[str, str] = {}
+    for cache in role_caches.values():
+        for rd_id, rd_name in cache.items():
+            names[rd_id] = rd_name
+            names.setdefault(rd_id.split('/')[-1].lower(), rd_name)
+    index: Dict[str, Set[str]] = {}
+
+    def add(assignments) -> int:
+        n = 0
+        for ra in assignments:
+            if not ra.principal_id:
+                continue
+            index.setdefault(ra.principal_id, set()).add(f"{_role_name(names, ra.role_definition_id)} @ {ra.scope or ''}")
+            n += 1
+        return n
+
+    any_client = next(iter(sub_clients.values()), None)
+    for mg in management_groups or []:
+        if any_client is None:
+            break
+        try:
+            n = add(list_role_assignments(any_client, f"/providers/Microsoft.Management/managementGroups/{mg}"))
+            print(f"RBAC: {n} assignments from management group {mg}", file=sys.stderr)
+        except Exception as e:
+            print(f"Warning: RBAC listing failed for management group {mg}: {e}", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futs = {ex.submit(lambda ac: list(list_role_assignments(ac)), ac): sid for sid, ac in sub_clients.items()}
+        for fut in as_completed(futs):
+            try:
+                add(fut.result())
+            except Exception as e:
+                print(f"Warning: RBAC listing failed for {futs[fut]}: {e}", file=sys.stderr)
+    print(f"RBAC: {len(index)} principals with assignments ({len(sub_clients)} subscription listings, "
+          f"{len(management_groups or [])} management group listings)", file=sys.stderr)
+    return {pid: sorted(roles) for pid, roles in index.items()}
+
 # -------------------- Worker -------------------- #
 
 def process_user(
-    token: str,
+    client: GraphClient,
     user: dict,
     sub_clients: Dict[str, AuthorizationManagementClient],
     role_caches: Dict[str, Dict[str, str]],
+    memberships: Optional[Dict[str, Tuple[List[str], List[str]]]] = None,
+    rbac_index: Optional[Dict[str, List[str]]] = None,
 ) -> dict:
-    """Return CSV row dict for a single user."""
+    """Return CSV row dict for a single user. `memberships` (user id ->
+    (groups, directory roles)) replaces the per-user memberOf call and
+    `rbac_index` (from prefetch_rbac) the per-subscription RBAC calls."""
     user_id = user.get("id")
     display_name = user.get("displayName") or ""
     upn = user.get("userPrincipalName") or ""
     email = user.get("mail") or ""
 
     # Groups + Directory Roles
-    try:
-        groups, dir_roles = fetch_user_groups_and_dir_roles(token, user_id)
-    except Exception as e:
-        groups, dir_roles = [], []
-        print(f"Warning: memberOf failed for {upn}: {e}", file=sys.stderr)
+    if memberships is not None:
+        groups, dir_roles = memberships.get(user_id, ([], []))
+    else:
+        try:
+            groups, dir_roles = fetch_user_groups_and_dir_roles(client, user_id)
+        except Exception as e:
+            # Fail the user rather than export (and cache) it with no groups
+            raise RuntimeError(f"memberOf failed for {upn}: {e}") from e
 
     # RBAC across all subs
     roles_all: List[str] = []
-    for sub_id, ac in sub_clients.items():
-        try:
-            roles_all.extend(fetch_user_role_assignments_for_sub(ac, role_caches[sub_id], user_id))
-        except Exception as e:
-            print(f"Warning: RBAC read failed for {upn} in {sub_id}: {e}", file=sys.stderr)
+    if rbac_index is not None:
+        roles_all = rbac_index.get(user_id, [])
+    else:
+        for sub_id, ac in sub_clients.items():
+            try:
+                roles_all.extend(fetch_user_role_assignments_for_sub(ac, role_caches[sub_id], user_id))
+            except Exception as e:
+                print(f"Warning: RBAC read failed for {upn} in {sub_id}: {e}", file=sys.stderr)
 
     roles_all = sorted(set(roles_all))
     return {
@@ -157,18 +576,160 @@ def process_user(
         "RBACRoles": "; ".join(roles_all),
     }
 
+def process_user_batch(
+    client: GraphClient,
+    users: List[dict],
+    sub_clients: Dict[str, AuthorizationManagementClient],
+    role_caches: Dict[str, Dict[str, str]],
+    rbac_index: Optional[Dict[str, List[str]]] = None,
+) -> List[Tuple[str, dict]]:
+    """memberOf for up to GRAPH_BATCH_SIZE users in one $batch, then RBAC per
+    user. Users whose memberOf failed come back with a None row."""
+    memberships = fetch_member_of_batch(client, [u.get("id") for u in users])
+    return [(u.get("id"), process_user(client, u, sub_clients, role_caches, memberships, rbac_index)
+             if u.get("id") in memberships else None) for u in users]
+
+# -------------------- Streaming output -------------------- #
+
+FIELDNAMES = ["DisplayName", "UPN", "Email", "SecurityGroups", "DirectoryRoles", "RBACRoles"]
+
+class CsvJournal:
+    """CSV writer plus resume journal.
+
+    Rows are appended as soon as a chunk of users completes. After each
+    chunk the CSV is flushed and the chunk's user ids are appended to the
+    journal followed by an "@<csv byte offset>" commit line. Resuming reads
+    the ids up to the last commit line, truncates the CSV to that offset
+    (dropping rows written after it) and skips those users.
+    """
+
+    def __init__(self, out: str, journal: str, resume: bool = False):
+        self.journal_path = journal
+        self.done: Set[str] = set()
+        offset = None
+        if resume and os.path.exists(journal) and os.path.exists(out):
+            pending: List[str] = []
+            with open(journal, encoding="utf-8") as jf:
+                for line in jf:
+                    line = line.rstrip("\n")
+                    if line.startswith("@"):
+                        self.done.update(pending); pending = []
+                        offset = int(line[1:])
+                    elif line:
+                        pending.append(line)
+        if offset is not None:
+            self.f = open(out, "r+", newline="", encoding="utf-8")
+            self.f.truncate(offset); self.f.seek(offset)
+            self.j = open(journal, "a", encoding="utf-8")
+            self.j.write(f"@{offset}\n")
+        else:
+            self.f = open(out, "w", newline="", encoding="utf-8")
+            self.j = open(journal, "w", encoding="utf-8")
+        self.w = csv.DictWriter(self.f, fieldnames=FIELDNAMES)
+        if offset is None:
+            self.w.writeheader()
+            self.f.flush()
+            self.j.write(f"@{self.f.tell()}\n")
+        self.written = 0
+
+    def write(self, pairs: List[Tuple[str, dict]]):
+        for _, row in pairs:
+            self.w.writerow(row)
+        self.f.flush()
+        self.j.write("".join(f"{uid}\n" for uid, _ in pairs) + f"@{self.f.tell()}\n")
+        self.j.flush()
+        self.written += len(pairs)
+
+    def close(self, complete: bool):
+        """Close both files; a complete run no longer needs the journal."""
+        self.f.close(); self.j.close()
+        if complete:
+            os.remove(self.journal_path)
+
+def _chunks(items: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    buf: List[dict] = []
+    for item in items:
+        buf.append(item)
+        if len(buf) >= size:
+            yield buf; buf = []
+    if buf:
+        yield buf
+
+def stream_users(
+    users: Iterable[dict],
+    work,
+    chunk_size: int,
+    workers: int,
+    sink,
+    skip: Optional[Set[str]] = None,
+) -> Tuple[int, int]:
+    """Feed `users` (any iterator, e.g. straight from graph_paged) in chunks
+    to `work(chunk) -> [(user id, row)]` on a thread pool and hand each
+    result to `sink` as it completes. Users that `work` returns with a None
+    row failed and are not passed on. At most 2 x workers chunks are in
+    flight, so the listing only runs ahead of processing by that much.
+    Returns (users processed, failures: failed users plus failed chunks)."""
+    skip = skip or set()
+    todo = (u for u in users if u.get("id") not in skip)
+    limit = max(1, workers) * 2
+    processed = failed = 0
+    inflight = set()
+
+    def drain():
+        nonlocal processed, failed, inflight
+        done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+        for fut in done:
+            try:
+                pairs = fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"Error processing users: {e}", file=sys.stderr)
+                continue
+            ok = [(uid, row) for uid, row in pairs if row is not None]
+            failed += len(pairs) - len(ok)
+            sink(ok)
+            before = processed
+            processed += len(ok)
+            if processed // 1000 != before // 1000:
+                print(f"  processed {processed} users...", file=sys.stderr)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        for chunk in _chunks(todo, chunk_size):
+            inflight.add(ex.submit(work, chunk))
+            if len(inflight) >= limit:
+                drain()
+        while inflight:
+            drain()
+    return processed, failed
+
 # -------------------- main -------------------- #
 
 def main():
     ap = argparse.ArgumentParser(description="Export users with groups, directory roles, and RBAC (all subscriptions) to CSV (parallel).")
     ap.add_argument("--out", "-o", default="azure_users_full.csv", help="Output CSV path")
     ap.add_argument("--workers", "-w", type=int, default=8, help="Max concurrent workers")
+    ap.add_argument("--membership-mode", choices=["batch", "group-side", "per-user"], default="batch",
+                    help="batch: memberOf for 20 users per $batch request; group-side: one members pass per group and "
+                         "directory role; per-user: one memberOf call per user")
+    ap.add_argument("--max-rps", type=float, default=100,
+                    help="Graph requests per second across all workers (0 = unlimited); 429 Retry-After pauses all workers")
+    ap.add_argument("--resume", action="store_true",
+                    help="Continue an interrupted export: keep rows already in --out and skip users in the journal")
+    ap.add_argument("--journal", help="Resume journal of written user ids (default: <out>.journal; removed after a complete run)")
+    ap.add_argument("--delta-state", help="State file for incremental runs via /users/delta (created on first run)")
+    ap.add_argument("--rbac-mode", choices=["prefetch", "per-user"], default="prefetch",
+                    help="prefetch: list all role assignments once per subscription (plus any --management-group) and look "
+                         "users up; per-user: one filtered listing per user per subscription")
+    ap.add_argument("--management-group", action="append", default=[], metavar="ID",
+                    help="With --rbac-mode prefetch, also list assignments at this management group scope "
+                         "(repeatable); every subscription is still listed")
     args = ap.parse_args()
 
     credential = DefaultAzureCredential()
 
-    # Graph token (shared across threads; each thread uses its own Session)
-    token = credential.get_token(GRAPH_SCOPE).token
+    # One Graph client for all threads: pooled keep-alive connections,
+    # token refreshed before expiry, shared rate limit and Retry-After
+    client = GraphClient(credential, pool_size=args.workers, max_rps=args.max_rps)
 
     # Enumerate subscriptions
     sub_client = SubscriptionClient(credential)
@@ -179,40 +740,91 @@ def main():
     # Build per-subscription RBAC clients and role caches
     sub_clients: Dict[str, AuthorizationManagementClient] = {}
     role_caches: Dict[str, Dict[str, str]] = {}
-    for s in subs:
-        sid = s.subscription_id
-        try:
-            ac = AuthorizationManagementClient(credential, sid)
-            sub_clients[sid] = ac
-            role_caches[sid] = build_role_name_cache(ac)
-        except Exception as e:
-            print(f"Warning: init RBAC client failed for {sid}: {e}", file=sys.stderr)
 
-    # Get all users (serial listing)
-    s = requests.Session()
-    s.headers.update({"Authorization": f"Bearer {token}"})
-    users = list(fetch_all_users(s))
-    print(f"Discovered {len(users)} users. Processing with {args.workers} workers...", file=sys.stderr)
+    def init_sub(sid: str):
+        ac = AuthorizationManagementClient(credential, sid)
+        return ac, build_role_name_cache(ac)
 
-    rows: List[dict] = []
     with ThreadPoolExecutor(max_workers=max(1, args.workers)) as ex:
-        futs = [ex.submit(process_user, token, u, sub_clients, role_caches) for u in users]
-        for i, fut in enumerate(as_completed(futs), 1):
+        futs = {ex.submit(init_sub, s.subscription_id): s.subscription_id for s in subs}
+        for fut in as_completed(futs):
+            sid = futs[fut]
             try:
-                rows.append(fut.result())
+                sub_clients[sid], role_caches[sid] = fut.result()
             except Exception as e:
-                print(f"Error processing user #{i}: {e}", file=sys.stderr)
-            if i % 100 == 0:
-                print(f"  processed {i}/{len(users)} users...", file=sys.stderr)
-
-    # Write CSV
-    fieldnames = ["DisplayName", "UPN", "Email", "SecurityGroups", "DirectoryRoles", "RBACRoles"]
-    with open(args.out, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
-        w.writeheader()
-        w.writerows(rows)
-
-    print(f"Wrote {len(rows)} users to {args.out}")
+                print(f"Warning: init RBAC client failed for {sid}: {e}", file=sys.stderr)
+
+    rbac_index = None
+    if args.rbac_mode == "prefetch":
+        rbac_index = prefetch_rbac(sub_clients, role_caches, args.management_group, args.workers)
+
+    if args.delta_state and args.resume:
+        ap.error("--resume cannot be combined with --delta-state (an interrupted delta run re-plans from its saved links)")
+
+    state: dict = {}
+    removed: Set[str] = set()
+    if args.delta_state:
+        # Incremental: only users changed since the stored deltaLink
+        state = load_delta_state(args.delta_state)
+        users, removed, links, names = plan_delta(client, state)
+        print(f"Delta: {len(users)} changed users, {len(removed)} removed"
+              f"{'' if state.get('links') else ' (initial full run)'}.", file=sys.stderr)
+    else:
+        # Stream the listing straight into the work queue
+        users = fetch_all_users(client)
+    print(f"Processing users with {args.workers} workers (memberships: {args.membership_mode})...", file=sys.stderr)
+
+    memberships = None
+    if args.membership_mode == "group-side":
+        memberships = fetch_memberships_group_side(client, args.workers)
+
+    if args.membership_mode == "batch":
+        chunk_size = GRAPH_BATCH_SIZE
+        work = lambda chunk: process_user_batch(client, chunk, sub_clients, role_caches, rbac_index)
+    else:
+        chunk_size = 1
+        work = lambda chunk: [(u.get("id"), process_user(client, u, sub_clients, role_caches, memberships, rbac_index))
+                              for u in chunk]
+
+    out = CsvJournal(args.out, args.journal or args.out + ".journal", resume=args.resume)
+    if out.done:
+        print(f"Resuming: {len(out.done)} users already in {args.out}.", file=sys.stderr)
+    results: Dict[str, dict] = {}
+
+    def sink(pairs: List[Tuple[str, dict]]):
+        out.write(pairs)
+        if args.delta_state:
+            results.update(pairs)
+
+    complete = False
+    try:
+        processed, failed = stream_users(users, work, chunk_size, args.workers, sink, skip=out.done)
+        if args.delta_state:
+            merged = {uid: row for uid, row in (state.get("rows") or {}).items() if uid not in removed}
+            if rbac_index is not None:
+                # The prefetch saw every assignment, so unchanged users get current RBAC for free
+                for uid, row in merged.items():
+                    row["RBACRoles"] = "; ".join(rbac_index.get(uid, []))
+            unchanged = [(uid, row) for uid, row in merged.items() if uid not in results]
+            out.write(unchanged)
+            merged.update(results)
+            if failed:
+                # Keep the old links so the next run picks the failed users up again
+                print(f"Delta state not updated: {failed} users or chunks failed.", file=sys.stderr)
+            else:
+                save_delta_state(args.delta_state, {"links": links, "rows": merged, "names": names})
+        complete = failed == 0
+    finally:
+        out.close(complete)
+
+    total = len(out.done) + out.written
+    print(f"Wrote {total} users to {args.out}")
+    if not complete and args.delta_state:
+        print("Run incomplete; re-run with the same --delta-state to retry the failed users.", file=sys.stderr)
+        sys.exit(1)
+    if not complete:
+        print(f"Run incomplete; re-run with --resume to continue from {args.journal or args.out + '.journal'}.", file=sys.stderr)
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()